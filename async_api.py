@@ -0,0 +1,732 @@
+# coding=utf-8
+"""
+Module containing AsyncExpaApi, the asyncio version of ExpaApi. It requires Python 3 and httpx.
+"""
+import asyncio
+import time
+import weakref
+from collections import deque
+from itertools import islice
+
+import httpx
+
+from . import concurrency, graphql, tools
+from .committees import ROOT_ID
+from .expaApi import BaseExpaApi, APIUnavailableException, CircuitOpenException, logger
+from .instrumentation import redact
+from .jsonstream import project
+from .records import iter_records
+from .singleflight import get_async_single_flight
+
+# One client per event loop, as httpx clients can not be shared between loops
+_clients = weakref.WeakKeyDictionary()
+# How many requests each client has sent, and how many of them opened a new connection
+_client_stats = weakref.WeakKeyDictionary()
+
+
+def get_async_client():
+    """
+    Returns the httpx client shared by all the AsyncExpaApi instances of the running event loop. Its connection pool is configured with the ASYNC_* settings
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        from . import settings
+        limits = httpx.Limits(
+            max_connections=getattr(settings, 'ASYNC_MAX_CONNECTIONS', 100),
+            max_keepalive_connections=getattr(settings, 'ASYNC_MAX_KEEPALIVE_CONNECTIONS', 20),
+        )
+        client = httpx.AsyncClient(limits=limits, timeout=80)
+        _clients[loop] = client
+    return client
+
+
+async def bounded_gather(func, items, limit=8):
+    """
+    The asyncio version of concurrency.bounded_map: awaits func(item) for every item, with at most limit of them running at the same time, and returns a (result, error) tuple per item, in order
+    """
+    semaphore = asyncio.Semaphore(max(limit, 1))
+
+    async def run(item):
+        async with semaphore:
+            try:
+                return await func(item), None
+            except Exception as e:
+                return None, e
+
+    return await asyncio.gather(*[run(item) for item in items])
+
+
+async def close_async_client():
+    """
+    Closes the httpx client shared by the AsyncExpaApi instances of the running event loop, i.e. when an ASGI application shuts down.
+    The next AsyncExpaApi of the loop opens a new one
+    """
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+def _wake(loop, future):
+    """
+    Returns a callback which, from any thread, resolves the future in its event loop
+    """
+    def resolve():
+        if not future.done():
+            future.set_result(None)
+
+    def callback():
+        try:
+            loop.call_soon_threadsafe(resolve)
+        except RuntimeError:
+            # The loop was closed while the coroutine waited
+            pass
+    return callback
+
+
+class throttle(object):
+    """
+    Async context manager which waits, without blocking the event loop, until the rate limiter lets a request to the given URL be sent
+    """
+    def __init__(self, rate_limiter, url):
+        self.budget = rate_limiter.budget_for(url) if rate_limiter is not None else None
+
+    async def __aenter__(self):
+        if self.budget is None:
+            return
+        if getattr(self.budget.backend, 'blocking', True):
+            # The SQLite and Django cache backends do I/O while they update the buckets, so they are used from a separate thread
+            wait = await asyncio.to_thread(self.budget.reserve)
+        else:
+            wait = self.budget.reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        loop = asyncio.get_running_loop()
+        while not self.budget.try_enter():
+            # Waits until a request of the budget finishes, in this or another thread, and tries again
+            released = loop.create_future()
+            self.budget.on_exit(_wake(loop, released))
+            if self.budget.try_enter():
+                return
+            await released
+
+    async def __aexit__(self, *exc_info):
+        if self.budget is not None:
+            self.budget.exit()
+
+
+class RequestTrace(object):
+    """
+    Callback of the trace extension of httpx, which measures the seconds spent opening a connection and until the headers of the answer arrived.
+    finish() gives the response the same 'timings' dict as the ones returned by Transport
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.timings = {'connect': 0.0, 'ttfb': None, 'total': None}
+        self.connected = False
+        self._connecting = None
+
+    async def __call__(self, name, info):
+        if name.endswith('connect_tcp.started'):
+            self._connecting = time.time()
+        elif name.endswith(('connect_tcp.complete', 'start_tls.complete')) and self._connecting is not None:
+            self.connected = True
+            self.timings['connect'] = time.time() - self._connecting
+        elif name.endswith('receive_response_headers.complete'):
+            self.timings['ttfb'] = time.time() - self.started
+
+    def finish(self, response):
+        self.timings['total'] = time.time() - self.started
+        response.timings = self.timings
+        return response
+
+
+class AsyncPaginator(object):
+    """
+    The asyncio version of pagination.Paginator: iterates with async for over all the records of a listing endpoint,
+    requesting its pages as they are needed. Its total_items, total_pages, pages and fetch_all are coroutines.
+    Each page is decoded whole, as explained in AsyncExpaApi.stream_query
+
+    api: The AsyncExpaApi instance used to make the queries
+    routes: The route of the listing, as given to make_query
+    query_params: The filters of the listing. 'page' and 'per_page' are set by the paginator
+    per_page: How many records are requested per page
+    prefetch: How many of the following pages are requested in the background while the current one is being read
+    fields: The fields each record is projected to, as accepted by jsonstream.project. None keeps them whole
+    """
+    def __init__(self, api, routes, query_params=None, per_page=500, prefetch=0, fields=None):
+        self.api = api
+        self.routes = routes
+        self.query_params = dict(query_params or {})
+        self.per_page = per_page
+        self.prefetch = prefetch
+        self.fields = fields
+        self.paging = None
+        self._first_data = None
+
+    def _page_params(self, page):
+        query_params = dict(self.query_params)
+        query_params['page'] = page
+        query_params['per_page'] = self.per_page
+        return query_params
+
+    async def fetch_page(self, page):
+        """
+        Returns the raw response of one of the pages of the listing
+        """
+        return await self.api.make_query(self.routes, self._page_params(page))
+
+    def _project(self, data):
+        return data if self.fields is None else [project(item, self.fields) for item in data]
+
+    async def _page_data(self, page):
+        return self._project((await self.fetch_page(page))['data'])
+
+    async def _first_page(self):
+        if self._first_data is None:
+            response = await self.fetch_page(1)
+            self.paging = response['paging']
+            self._first_data = self._project(response['data'])
+        data, self._first_data = self._first_data, None
+        return data
+
+    async def load(self):
+        """
+        Requests the first page, if it has not been requested yet, and returns the paging block of the listing
+        """
+        if self.paging is None:
+            self._first_data = await self._first_page()
+        return self.paging
+
+    async def total_items(self):
+        return (await self.load())['total_items']
+
+    async def total_pages(self):
+        paging = await self.load()
+        if paging.get('total_pages') is not None:
+            return paging['total_pages']
+        return -(-paging['total_items'] // self.per_page)
+
+    async def pages(self):
+        """
+        An async generator with the list of records of every page, in order
+        """
+        data = await self._first_page()
+        remaining = iter(range(2, await self.total_pages() + 1))
+        yield data
+        if not self.prefetch:
+            for page in remaining:
+                yield await self._page_data(page)
+            return
+        pending = deque(asyncio.ensure_future(self._page_data(page)) for page in islice(remaining, self.prefetch))
+        try:
+            while pending:
+                data = await pending.popleft()
+                pending.extend(asyncio.ensure_future(self._page_data(page)) for page in islice(remaining, 1))
+                yield data
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def fetch_all(self, max_workers=8):
+        """
+        Returns a list with all the records of the listing, in order. Once the first page tells how many pages there are, the rest of them are requested at the same time, at most max_workers at once.
+        If any page fails, its error is raised.
+        """
+        items = list(await self._first_page())
+        for data, error in await bounded_gather(self._page_data, range(2, await self.total_pages() + 1), max_workers):
+            if error is not None:
+                raise error
+            items.extend(data)
+        return items
+
+    async def _records(self):
+        async for data in self.pages():
+            for item in data:
+                yield item
+
+    def __aiter__(self):
+        return self._records()
+
+
+class AsyncExpaApi(BaseExpaApi):
+    """
+    The asyncio version of ExpaApi, for ASGI deployments. Its query methods are coroutines
+    with the same names, arguments and results as the ones of ExpaApi, and all instances
+    in an event loop share one httpx connection pool. Waiting between retries does not block
+    the event loop, so a single worker can keep hundreds of requests in flight.
+    Logging in is still done with requests, in a separate thread, and only when the token
+    cache has no valid token for the account.
+    The only method of ExpaApi it does not have is stream_query, as explained there; listings
+    requested with stream=True are still read a page at a time, and paginate returns an AsyncPaginator.
+    """
+
+    def __init__(self, account=None, fail_attempts=1, fail_interval=10, pwd=None, token_cache=None, max_workers=None, response_cache=None, client=None):
+        """
+        Takes the same arguments as BaseExpaApi, plus:
+        client: The httpx.AsyncClient used to send the requests. By default, the one shared by the running event loop is used.
+        """
+        super(AsyncExpaApi, self).__init__(account, fail_attempts, fail_interval, pwd, token_cache, max_workers, response_cache)
+        self._client = client
+        self.flights = get_async_single_flight()
+        # Only used to log in and for its rate limiter
+        from .auth import Authenticator
+        from .transport import get_transport
+        self.transport = get_transport()
+        self.authenticator = Authenticator(self.transport)
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_async_client()
+        return self._client
+
+    async def get_token(self):
+        """
+        Returns the access token of this instance's account, logging in in a separate thread if needed
+        """
+        token = self.token_cache.peek(self.account)
+        if token is not None:
+            return token
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.token_cache.get_token, self.account, self._login)
+
+    async def graphql_query(self, data):
+        baseUrl = self.API_URL + "/graphql?access_token=" + await self.get_token()
+        breaker = self.breakers['graphql']
+        self._check_breaker(breaker)
+        started = time.time()
+        try:
+            async with throttle(self.transport.rate_limiter, baseUrl):
+                trace = RequestTrace()
+                response = trace.finish(await self.client.post(baseUrl, json=data, extensions={'trace': trace}))
+            self._count_request(trace)
+        except Exception as e:
+            breaker.record_failure()
+            self._instrument('post', baseUrl, started=started, error=repr(e))
+            raise
+        self._record_status(breaker, response.status_code)
+        self._instrument('post', baseUrl, response, started, error=None if response.status_code == 200 else "The GraphQL request has failed with error code %s" % response.status_code)
+        return response
+
+    async def get_recent_registered_with_alignment(self, page=1, perPage=100):
+        data = self._recent_registered_query(page, perPage)
+        response = (await self.graphql_query(data)).json()['data']['allPeople']['data']
+        return response
+
+    async def get_lc_alignment(self, person_id):
+        return self._parse_lc_alignment((await self.graphql_query(self._lc_alignment_query(person_id))).json())
+
+    async def get_people(self, person_ids, fields=None, chunk_size=None):
+        chunks = self._people_chunks(person_ids, chunk_size)
+
+        async def lookup(chunk):
+            return self._graphql_payload(await self.graphql_query(graphql.people_query(chunk, fields)))
+        people = {}
+        for chunk, (payload, error) in zip(chunks, await bounded_gather(lookup, chunks, self.max_workers)):
+            if error is not None:
+                raise error
+            people.update(zip(chunk, graphql.parse_people(payload, len(chunk))))
+        return people
+
+    async def get_lc_alignments(self, person_ids, chunk_size=None):
+        people = await self.get_people(person_ids, ['id', {'lc_alignment': ['keywords']}], chunk_size)
+        return dict((person_id, self._alignment_keywords(person)) for person_id, person in people.items())
+
+    async def iter_all_people(self, fields=None, filters=None, per_page=100, sort='-created_at', q=None):
+        """
+        An async generator with all the people of allPeople that match the given filters
+        """
+        page = 1
+        while True:
+            payload = self._graphql_payload(await self.graphql_query(graphql.all_people_query(fields, page, per_page, filters, q, sort)))
+            people, paging = graphql.parse_all_people(payload)
+            for person in people:
+                yield person
+            if not people or page >= (paging.get('total_pages') or 0):
+                return
+            page += 1
+
+    async def make_query(self, routes, query_params=None, version='v2', method='get'):
+        """
+        The same as ExpaApi.make_query, including its use of the response cache and the sharing of identical queries between coroutines
+        """
+        if method != "get":
+            return await self._send_query(routes, query_params, version, method)
+        started = time.time()
+        key = self.response_cache.make_key(self.account, version, routes, query_params)
+        found, data = await self._cache_call(self.response_cache.get, key)
+        if found:
+            self._instrument('get', self._route_url(routes, version), started=started, cache='hit')
+            return data
+        sent = []
+
+        def fetch():
+            sent.append(True)
+            return self._fetch_query(key, routes, query_params, version)
+        data = await self.flights.do(key, fetch)
+        if not sent:
+            self._instrument('get', self._route_url(routes, version), started=started, cache='coalesced')
+        return data
+
+    async def _fetch_query(self, key, routes, query_params, version):
+        started = time.time()
+        try:
+            data = await self._send_query(routes, query_params, version, cache='miss')
+        except CircuitOpenException:
+            found, data = await self._cache_call(self.response_cache.get_stale, key) if self.serve_stale else (False, None)
+            if found:
+                self._instrument('get', self._route_url(routes, version), started=started, cache='stale')
+                return data
+            raise
+        await self._cache_call(self.response_cache.set, key, data, self.response_cache.ttl_for(routes, query_params))
+        return data
+
+    async def _cache_call(self, func, *args):
+        """
+        Calls a method of the response cache, from a separate thread if it may block on I/O, so the event loop keeps running
+        """
+        if getattr(self.response_cache, 'blocking', True):
+            return await asyncio.to_thread(func, *args)
+        return func(*args)
+
+    def connection_stats(self):
+        """
+        Returns how many requests the httpx client of this instance has sent, and how many of them opened a new connection or reused one. Unless the instance was given a client of its own, they include the requests of every other instance of its event loop
+        """
+        return dict(_client_stats.get(self.client) or {'requests': 0, 'connections_opened': 0, 'connections_reused': 0})
+
+    def _count_request(self, trace):
+        stats = _client_stats.get(self.client)
+        if stats is None:
+            stats = _client_stats[self.client] = {'requests': 0, 'connections_opened': 0, 'connections_reused': 0}
+        stats['requests'] += 1
+        stats['connections_opened' if trace.connected else 'connections_reused'] += 1
+
+    def cache_stats(self):
+        return self.response_cache.stats()
+
+    def coalescing_stats(self):
+        return self.flights.stats()
+
+    def retry_stats(self):
+        return self.retry_policy.stats()
+
+    def rate_limit_stats(self):
+        if self.transport.rate_limiter is None:
+            return {}
+        return self.transport.rate_limiter.stats()
+
+    async def _send_query(self, routes, query_params=None, version='v2', method='get', cache=None):
+        # The token is awaited, so the URL is never built with the token property, which would log in blocking the event loop
+        token = await self.get_token()
+        if method == "get":
+            query = self._buildQuery(routes, query_params, version, token)
+        else:
+            query = self._buildQuery(routes, None, version, token)
+        started = time.time()
+        breaker = self._breaker_for(routes)
+        policy = self.retry_policy
+        policy.record_request()
+        attempt = 0
+        token_renewed = False
+        while True:
+            self._check_breaker(breaker)
+            response = None
+            try:
+                async with throttle(self.transport.rate_limiter, query):
+                    trace = RequestTrace()
+                    if method == "get":
+                        response = await self.client.get(query, timeout=80, extensions={'trace': trace})
+                    elif method == "patch":
+                        response = await self.client.patch(query, json=query_params, timeout=20, extensions={'trace': trace})
+                    trace.finish(response)
+                self._count_request(trace)
+                self._record_status(breaker, response.status_code)
+                if response.status_code == 200:
+                    data = response.json()
+                    self._instrument(method, query, response, started, attempt, cache)
+                    return data
+                elif response.status_code == 401 and not token_renewed:
+                    # The cached token stopped working before its expiration; it is discarded and the request is retried once with a new one
+                    token_renewed = True
+                    # Only discarded if it is still the cached one, so concurrent 401s do not throw away the token the first of them renewed
+                    self.token_cache.invalidate(self.account, token)
+                    token = await self.get_token()
+                    query = self._buildQuery(routes, query_params if method == "get" else None, version, token)
+                    continue
+                retry = policy.should_retry(response.status_code)
+                error_message = "The request has failed with error code %s and error message %s" % (response.status_code, response.text)
+            except Exception as e:
+                if response is None:
+                    breaker.record_failure()
+                retry = policy.should_retry()
+                error_message = "The request has failed because of an exception: %r" % e
+            attempt += 1
+            if not retry or not policy.take_retry(attempt):
+                break
+            logger.debug("Retrying %s after attempt %d: %s", redact(query), attempt, error_message)
+            delay = policy.delay(attempt, response)
+            policy.record_sleep(delay)
+            await asyncio.sleep(delay)
+        self._instrument(method, query, response, started, attempt - 1, cache, error_message)
+        raise APIUnavailableException(response, error_message)
+
+    def stream_query(self, routes, query_params=None, fields=None, key='data', version='v2'):
+        """
+        Not available in AsyncExpaApi: jsonstream decodes the records as it pulls the chunks of a response from a plain iterator,
+        and pulling them from an httpx stream would need awaiting in the middle of a record. Listings are read a page at a time instead
+        """
+        raise NotImplementedError("AsyncExpaApi can not stream single records; use paginate or stream=True, which read a page at a time")
+
+    def paginate(self, routes, query_params=None, per_page=None, prefetch=None, fields=None):
+        """
+        Returns an AsyncPaginator over all the records of a listing endpoint, with the same arguments as ExpaApi.paginate except streaming
+        """
+        return AsyncPaginator(
+            self, routes, query_params,
+            per_page=per_page if per_page is not None else self.page_size,
+            prefetch=prefetch if prefetch is not None else self.prefetch,
+            fields=fields)
+
+    async def _paginate(self, routes, query_params, stream=False, fields=None):
+        """
+        Returns the total number of records of a listing, and either a list with all of them or, if stream is True, an async iterator over them.
+        In the first case, the pages after the first one are requested at the same time, at most max_workers at once.
+        fields: The fields each record is projected to, as accepted by jsonstream.project. The pages are still decoded whole
+        """
+        paginator = self.paginate(routes, query_params, fields=fields)
+        total = await paginator.total_items()
+        if stream:
+            return total, paginator
+        return total, await paginator.fetch_all(self.max_workers)
+
+    async def getPerson(self, person_id):
+        return await self.make_query(['people', person_id])
+
+    async def update_person(self, person_id, new_data):
+        return await self.make_query(['people', person_id], {"person": new_data}, method="patch")
+
+    async def getOpportunity(self, opID):
+        return await self.make_query(['opportunities', opID])
+
+    async def get_application(self, app_ID):
+        return await self.make_query(['applications', app_ID])
+
+    async def test(self, **kwargs):
+        logger.debug("%r", self)
+        return kwargs['testArg']
+
+    async def getManagedEPs(self, expaID):
+        return await self.make_query(['people.json'], {'filters[managers][]': [expaID]})
+
+    async def getOPManagersData(self, opID):
+        opportunity = await self.make_query(['opportunities', opID])
+        return [tools.getContactData(manager) for manager in opportunity["managers"]]
+
+    async def _load_committee(self, committee_id):
+        return self.committees.add_committee(await self.make_query(['committees', '%d.json' % int(committee_id)]))
+
+    async def _suboffices(self, committee_id):
+        if not self.committees.is_loaded(committee_id):
+            await self._load_committee(committee_id)
+        return [self.committees.get(child) for child in self.committees.children(committee_id)]
+
+    async def load_committee_tree(self, root=ROOT_ID, depth=3, retries=1):
+        """
+        The same as ExpaApi.load_committee_tree, which runs CommitteeIndex.build, requesting the committees of each level at the same time
+        """
+        index = self.committees
+        level = [root]
+        for _ in range(depth):
+            pending = [committee_id for committee_id in level if not index.is_loaded(committee_id)]
+            for attempt in range(retries + 1):
+                results = await bounded_gather(self._load_committee, pending, self.max_workers)
+                errors = [(committee_id, error) for committee_id, (node, error) in zip(pending, results) if error is not None]
+                pending = [committee_id for committee_id, error in errors]
+                if not pending:
+                    break
+            index._report_failures(errors)
+            level = [child for committee_id in level for child in index.children(committee_id)]
+        return index
+
+    async def getRegions(self):
+        return await self._suboffices(ROOT_ID)
+
+    async def getMCs(self, region):
+        return await self._suboffices(region)
+
+    async def getSuboffices(self, subofficeID):
+        return await self._suboffices(subofficeID)
+
+    async def getCountryEBs(self, mcID):
+        lcs = await self._suboffices(mcID)
+        boards = await bounded_gather(lambda lc: self._eb_positions(str(lc['id'])), lcs, self.max_workers)
+        people = [person for positions, error in boards if error is None for person in self._eb_people(positions)]
+        results = iter(await bounded_gather(self._contact_data, people, self.max_workers))
+        ans = []
+        for lc, (positions, error) in zip(lcs, boards):
+            newLC = {'nombre':lc['full_name'], 'expaID':lc['id']}
+            if error is None:
+                newLC['cargos'] = self._eb_contact_list(positions, results)
+            else:
+                newLC['cargos'] = []
+                newLC['error'] = concurrency.error_message(error)
+            ans.append(newLC)
+        return ans
+
+    async def getLCEBContactList(self, lcID):
+        positions = await self._eb_positions(lcID)
+        results = await bounded_gather(self._contact_data, self._eb_people(positions), self.max_workers)
+        return self._eb_contact_list(positions, iter(results))
+
+    async def _eb_positions(self, lcID):
+        data = await self.make_query(['committees', str(lcID), 'terms.json'])
+        for term in data['data']:
+            if term['short_name'] == '2017':
+                return self._eb_team_positions(await self.make_query(['committees', str(lcID), 'terms', str(term['id']) + '.json']))
+        return []
+
+    async def _contact_data(self, person):
+        return tools.getContactData(await self.make_query(['people', str(person['id']) + '.json']))
+
+    async def _fetch_analytics(self, officeID, program, start_date, end_date=None):
+        query_args = self._stats_query_args(officeID, program, start_date, end_date)
+        return (await self.make_query(['applications', 'analyze.json'], query_args))['analytics']
+
+    async def _fetch_stats(self, officeID, program, start_date, end_date=None):
+        return self._parse_stats(await self._fetch_analytics(officeID, program, start_date, end_date))
+
+    async def get_stats(self, officeID, program, start_date, end_date=None):
+        try:
+            return await self._fetch_stats(officeID, program, start_date, end_date)
+        except APIUnavailableException:
+            return self._stats_error()
+
+    async def get_stats_matrix(self, cells, records=False):
+        keys, pending = self._stats_matrix_keys(cells)
+        calls = self._stats_batch_plan(pending)
+        results = await bounded_gather(lambda call: self._fetch_analytics(*call[:4]), calls, self.max_workers)
+        answers, missing = self._stats_batch_answers(calls, results)
+        answers.update(zip(missing, await bounded_gather(lambda key: self._fetch_stats(*key[1:]), missing, self.max_workers)))
+        return self._stats_matrix_result(keys, pending, [answers[key] for key in pending], records)
+
+    async def get_past_stats(self, days, program, officeID):
+        start_date, end_date = self._past_range(days)
+        return await self.get_stats(officeID, program, start_date, end_date)
+
+    async def getMonthStats(self, month, year, program, officeID):
+        start_date, end_date = self._month_range(month, year)
+        return await self.get_stats(officeID, program, start_date, end_date)
+
+    async def getWeekStats(self, week, year, program, lc=1395):
+        start_date, end_date = self._week_range(week, year)
+        return await self.get_stats(lc, program, start_date, end_date)
+
+    async def getCurrentYearStats(self, program, officeID=1395):
+        start_date, end_date = self._year_start_range(1)
+        return await self.get_stats(officeID, program, start_date, end_date)
+
+    async def getCountryCurrentYearStats(self, program, lc):
+        start_date, end_date = self._year_start_range(2)
+        return await self.getCountryStats(program, lc, start_date, end_date)
+
+    async def getCurrentMCYearStats(self, program, office_id):
+        start_date, end_date = self._year_start_range(8)
+        return await self.get_stats(office_id, program, start_date, end_date)
+
+    async def getCountryCurrentMCYearStats(self, program, mc=1551):
+        data = await self.make_query(['applications', 'analyze.json'], self._country_mc_year_args(program, mc))
+        return self._parse_country_mc_year(mc, data)
+
+    async def get_performance_series(self, offices, programs, periods):
+        from .performance import PerformanceSeries
+        stats = await self.get_stats_matrix(self._performance_cells(offices, programs, periods), records=True)
+        return PerformanceSeries.from_stats(stats, offices, programs, periods)
+
+    async def getLCWeeklyPerformance(self, lc=1395):
+        series = await self.get_performance_series([lc], self.weeklyPrograms, self._current_weeks())
+        return dict((program, self._program_performance(series, lc, program, 'weekly')) for program in self.weeklyPrograms)
+
+    async def getProgramWeeklyPerformance(self, program, office=1395):
+        series = await self.get_performance_series([office], [program], self._current_weeks())
+        return self._program_performance(series, office, program, 'weekly')
+
+    async def getProgramMonthlyPerformance(self, program, office=1395):
+        series = await self.get_performance_series([office], [program], self._current_months())
+        return self._program_performance(series, office, program, 'monthly')
+
+    async def getLCYearlyPerformance(self, year, lc=1395):
+        periods = [self._month_range(i, year) for i in range(1, 13)]
+        series = await self.get_performance_series([lc], self.yearlyPrograms, periods)
+        return self._yearly_performance(series, lc)
+
+    async def getCountryStats(self, program, officeID, start_date, end_date):
+        queryArgs = self._country_stats_query_args(program, officeID, start_date, end_date)
+        mcData = (await self.make_query(['applications', 'analyze.json'], queryArgs))['analytics']
+        return self._parse_country_stats(officeID, mcData)
+
+    async def get_national_stats(self, mcID, programs, start_date, end_date=None, records=False):
+        offices = [mcID] + [lc['id'] for lc in await self.getSuboffices(mcID)]
+        cells = [(office, program, start_date, end_date) for program in programs for office in offices]
+        stats = await self.get_stats_matrix(cells, records)
+        return dict((program, dict((office, stats[(office, program, start_date, end_date)]) for office in offices)) for program in programs)
+
+    async def _people_listing(self, query_args, stream):
+        total, items = await self._paginate(['people.json'], query_args, stream)
+        return {'total': total, 'eps': items}
+
+    async def getUncontactedEPs(self, officeID, stream=False):
+        return await self._people_listing(self._uncontacted_args(officeID), stream)
+
+    async def get_matchable_EPs(self, officeID, stream=False):
+        return await self._people_listing(self._matchable_args(officeID), stream)
+
+    async def getWeekRegistered(self, officeID, week=None, year=None, stream=False):
+        return await self._people_listing(self._week_people_args('registered', officeID, week, year), stream)
+
+    async def getWeekContacted(self, officeID, week=None, year=None, stream=False):
+        return await self._people_listing(self._week_people_args('contacted_at', officeID, week, year), stream)
+
+    async def get_companies(self, officeID, program, start_date, end_date, stream=False):
+        total, items = await self._paginate(['organisations.json'], self._companies_args(program, start_date, end_date), stream)
+        return {'total': total, 'items': items}
+
+    async def get_past_interactions(self, interaction, days, officeID, today=True, program='ogx', filters=None, stream=False):
+        start_date, end_date = self._past_range(days, today)
+        return await self.get_interactions(interaction, officeID, program, start_date, end_date, filters, stream)
+
+    async def get_interactions(self, interaction, officeID, program, start_date, end_date=None, filters=None, stream=False, fields=None, records=False):
+        routes, query_args = self._interaction_query(interaction, officeID, program, start_date, end_date, filters)
+        if not records:
+            total, items = await self._paginate(routes, query_args, stream, fields)
+            return {'total': total, 'items': items}
+        record_class = self._interaction_record(routes)
+        total, items = await self._paginate(routes, query_args, stream, record_class.payload_fields(fields))
+        if not stream:
+            return {'total': total, 'items': list(iter_records(items, record_class, fields))}
+
+        async def records_of(items):
+            async for item in items:
+                yield record_class.from_payload(item, fields)
+        return {'total': total, 'items': records_of(items)}
+
+    async def get_person_interactions(self, interaction, officeID, program, start_date, end_date, filters, stream=False):
+        query_args = self._person_interactions_args(interaction, officeID, program, start_date, end_date, filters)
+        total, items = await self._paginate(['people.json'], query_args, stream)
+        return {'total': total, 'items': items}
+
+    async def get_application_interactions(self, interaction, officeID, program, start_date, end_date, filters, stream=False):
+        query_args = self._application_interactions_args(interaction, officeID, program, start_date, end_date, filters)
+        total, items = await self._paginate(['applications.json'], query_args, stream)
+        return {'total': total, 'items': items}
+
+    async def e2e_analytics(self, home_office_id, host_office_id, program, start_date, end_date=None):
+        query_args = self._e2e_query_args(home_office_id, host_office_id, program, start_date, end_date)
+        try:
+            return self._parse_e2e((await self.make_query(['applications', 'analyze.json'], query_args))['analytics'])
+        except APIUnavailableException:
+            return self._e2e_error()
+
+    async def lda_report(self, id, id_type, *args, **kwargs):
+        return await self.make_query(['ldm', 'report'], {id_type: id})
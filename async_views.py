@@ -0,0 +1,71 @@
+# coding=utf-8
+"""
+Async class based views, equivalent to the ones in views.py, for ASGI deployments. They use AsyncExpaApi, so waiting for EXPA does not block the worker
+"""
+import json
+from django.http import HttpResponse
+from django.shortcuts import render
+from django.views.generic import View
+
+
+def get_api():
+    """
+    Returns a new AsyncExpaApi. httpx and the async client are only imported when the first async view is served
+    """
+    from .async_api import AsyncExpaApi
+    return AsyncExpaApi()
+
+
+class AsyncTemplateView(View):
+    """Equivalente asíncrono de TemplateView: renderiza template_name con el contexto que devuelve get_context_data, que es una corrutina"""
+    template_name = None
+
+    async def get_context_data(self, **kwargs):
+        return kwargs
+
+    async def get(self, request, *args, **kwargs):
+        context = await self.get_context_data(**kwargs)
+        return render(request, self.template_name, context)
+
+
+class GetTokenView(View):
+    async def get(self, request):
+        api = get_api()
+        return HttpResponse(await api.get_token())
+
+
+class GetOpportunityView(View):
+    async def get(self, request, opID):
+        api = get_api()
+        return HttpResponse(json.dumps(await api.getOpportunity(opID)), content_type='application/json')
+
+
+class GetOPManagersDataView(AsyncTemplateView):
+    """Class based view que permite ver los datos de contacto de todos los managers de una oportunidad cuya ID entra como parámetro dentro de la URL"""
+    template_name = "yellowPlatform/opmanagers.html"
+
+    async def get_context_data(self, **kwargs):
+        api = get_api()
+        context = await super(GetOPManagersDataView, self).get_context_data(**kwargs)
+        context["managers"] = await api.getOPManagersData(context["opID"])
+        return context
+
+
+class GetYearlyPerformance(AsyncTemplateView):
+    template_name = "django_expa/monthlyPerformance.html"
+
+    async def get_context_data(self, **kwargs):
+        api = get_api()
+        context = await super(GetYearlyPerformance, self).get_context_data(**kwargs)
+        context['programs'] = await api.getLCYearlyPerformance(2015)
+        return context
+
+
+class GetCountryEBs(AsyncTemplateView):
+    template_name = "django_expa/contactList.html"
+
+    async def get_context_data(self, **kwargs):
+        api = get_api()
+        context = await super(GetCountryEBs, self).get_context_data(**kwargs)
+        context['lcs'] = await api.getCountryEBs(int(context['mcID']))
+        return context
@@ -0,0 +1,147 @@
+# coding=utf-8
+"""
+Module containing the login against EXPA, which obtains the access tokens of the accounts
+"""
+from __future__ import unicode_literals
+import re
+import threading
+import time
+
+try:
+    from html import unescape
+except ImportError:
+    # Python 2
+    from HTMLParser import HTMLParser
+    unescape = HTMLParser().unescape
+
+try:
+    from urllib.parse import urljoin
+except ImportError:
+    from urlparse import urljoin
+
+# The hidden input of the login form which holds its CSRF token, whatever the order of its attributes
+_TOKEN_INPUT = re.compile(r'<input\b[^>]*\bname\s*=\s*["\']authenticity_token["\'][^>]*>', re.IGNORECASE)
+_VALUE = re.compile(r'\bvalue\s*=\s*(?:"([^"]*)"|\'([^\']*)\')', re.IGNORECASE)
+# Longest tag kept between chunks while it has not been closed
+_MAX_TAG = 4096
+
+
+def find_authenticity_token(chunks):
+    """
+    Looks for the authenticity_token of the login form in the chunks of text of the login page, as they arrive,
+    and stops reading them as soon as it is found. Only the end of the last chunk, which may hold the beginning
+    of a tag, is kept between them. Returns None if the page has no such token.
+    """
+    buffer = ''
+    for chunk in chunks:
+        buffer += chunk
+        match = _TOKEN_INPUT.search(buffer)
+        if match is not None:
+            value = _VALUE.search(match.group(0))
+            if value is None:
+                return None
+            return unescape(value.group(1) if value.group(1) is not None else value.group(2))
+        start = buffer.rfind('<')
+        buffer = buffer[start:] if start != -1 and len(buffer) - start <= _MAX_TAG else ''
+    return None
+
+
+class Authenticator(object):
+    """
+    Logs accounts into EXPA through the pooled connections of a Transport. The login page is streamed and
+    only read up to its authenticity_token, and the redirects that follow the sign in are only followed until
+    one of them sets the expa_token cookie. Every login uses its own cookies, so several accounts can log in
+    at the same time. The time spent logging in is kept apart from the one of the API requests.
+
+    transport: The Transport whose connections are used
+    max_redirects: How many redirects are followed after signing in, looking for the token
+    """
+    def __init__(self, transport, max_redirects=5):
+        self.transport = transport
+        self.max_redirects = max_redirects
+        self._lock = threading.Lock()
+        self.logins = 0
+        self.failures = 0
+        self.page_seconds = 0.0
+        self.sign_in_seconds = 0.0
+        self.last_seconds = None
+
+    def authenticity_token(self, session, login_page_url):
+        """
+        Returns the CSRF token of the login form, or None if the login page does not have it
+        """
+        response = self.transport.get(login_page_url, session=session, stream=True)
+        try:
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            return find_authenticity_token(response.iter_content(chunk_size=2048, decode_unicode=True))
+        finally:
+            response.close()
+
+    def sign_in(self, session, auth_url, params):
+        """
+        Posts the login form and follows its redirects until one of them sets the expa_token cookie.
+        Returns that cookie, or None, and the last response received
+        """
+        response = self.transport.post(auth_url, session=session, data=params, allow_redirects=False)
+        for _ in range(self.max_redirects + 1):
+            for cookie in response.cookies:
+                if cookie.name == 'expa_token':
+                    # The redirects are streamed, so the connection only goes back to the pool once the response is closed
+                    response.close()
+                    return cookie, response
+            location = response.headers.get('Location')
+            if not response.is_redirect or not location:
+                break
+            response.close()
+            response = self.transport.get(urljoin(response.url, location), session=session, allow_redirects=False, stream=True)
+        response.close()
+        return None, response
+
+    def login(self, email, password, login_page_url, auth_url):
+        """
+        Logs an account in. Returns the expa_token cookie, or None if EXPA did not set it, and the last response received.
+        Raises a DjangoEXPAException if the login page has no authenticity_token
+        """
+        from .expaApi import DjangoEXPAException
+        # Its own cookies, but the connection pool of the transport. Closing it would close the pool too
+        session = self.transport.new_session()
+        started = time.time()
+        page_done = None
+        cookie = None
+        try:
+            token = self.authenticity_token(session, login_page_url)
+            if token is None:
+                raise DjangoEXPAException("The login page has no authenticity_token")
+            page_done = time.time()
+            cookie, response = self.sign_in(session, auth_url, {
+                'user[email]': email,
+                'user[password]': password,
+                'authenticity_token': token,
+            })
+        finally:
+            finished = time.time()
+            with self._lock:
+                self.logins += 1
+                if cookie is None:
+                    self.failures += 1
+                self.last_seconds = finished - started
+                if page_done is None:
+                    self.page_seconds += finished - started
+                else:
+                    self.page_seconds += page_done - started
+                    self.sign_in_seconds += finished - page_done
+        return cookie, response
+
+    def stats(self):
+        """
+        Returns how many logins have been attempted, how many of them did not obtain a token, and the seconds spent on the login page and on signing in
+        """
+        with self._lock:
+            return {
+                'logins': self.logins,
+                'failures': self.failures,
+                'page_seconds': self.page_seconds,
+                'sign_in_seconds': self.sign_in_seconds,
+                'last_seconds': self.last_seconds,
+            }
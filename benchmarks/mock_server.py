@@ -0,0 +1,338 @@
+# coding=utf-8
+"""
+A local stand-in for the EXPA hosts (login page, AUTH_URL, GIS API v2 and GraphQL), which
+answers with responses built from the recorded fixtures of the fixtures directory.
+
+It can be started on its own with ``python -m django_expa.benchmarks.mock_server``, or from
+Python with MockGISServer(...).start(), and ExpaApi is pointed at it with use_mock_server().
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import copy
+import io
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+
+from ..committees import ROOT_ID
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+TOKEN = 'benchmark-access-token'
+
+
+def load_fixture(name):
+    with io.open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        if name.endswith('.json'):
+            return json.load(f)
+        return f.read()
+
+
+class CommitteeTree(object):
+    """
+    A synthetic office tree: AI, its regions, their MCs and their LCs. The first MC is always 1589, so it can be used in the examples of the benchmarks.
+    """
+    def __init__(self, regions=2, mcs_per_region=2, lcs_per_mc=10):
+        self.committees = {ROOT_ID: {'id': ROOT_ID, 'name': 'AI', 'full_name': 'AIESEC INTERNATIONAL', 'tag': 'AI', 'parent': None, 'children': []}}
+        mc_ids = [1589] + [3000 + i for i in range(1, regions * mcs_per_region)]
+        for r in range(regions):
+            region_id = 2000 + r
+            self._add(region_id, 'Region %d' % r, 'Region', ROOT_ID)
+            for m in range(mcs_per_region):
+                mc_id = mc_ids[r * mcs_per_region + m]
+                self._add(mc_id, 'MC %d' % mc_id, 'MC', region_id)
+                for l in range(lcs_per_mc):
+                    self._add(mc_id * 100 + l, 'LC %d' % (mc_id * 100 + l), 'LC', mc_id)
+
+    def _add(self, committee_id, name, tag, parent_id):
+        self.committees[committee_id] = {'id': committee_id, 'name': name, 'full_name': name, 'tag': tag, 'parent': parent_id, 'children': []}
+        self.committees[parent_id]['children'].append(committee_id)
+
+    def summary(self, committee_id):
+        committee = self.committees[committee_id]
+        return {'id': committee_id, 'name': committee['name'], 'full_name': committee['full_name'], 'tag': committee['tag']}
+
+    def detail(self, committee_id):
+        committee = self.committees[committee_id]
+        answer = self.summary(committee_id)
+        parent = committee['parent']
+        answer['parent'] = self.summary(parent) if parent is not None else None
+        answer['suboffices'] = [self.summary(child) for child in committee['children']]
+        return answer
+
+    def children(self, committee_id):
+        committee = self.committees.get(committee_id)
+        return committee['children'] if committee is not None else []
+
+
+class MockGISServer(ThreadingMixIn, HTTPServer):
+    """
+    latency: Seconds every answer is delayed
+    error_rate: Fraction of the API requests answered with a 503
+    pages: How many pages every listing (people.json, applications.json...) has, whatever per_page is asked for
+    listing_size: If given, how many records every listing has instead, so the number of pages depends on per_page, as in EXPA
+    chunked: Whether the JSON answers are sent with chunked transfer encoding, without a Content-Length, in chunks of chunk_size bytes
+    login_redirects: How many redirects the login goes through before the one which sets the token cookie
+    """
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.05, error_rate=0.0, pages=3, regions=2, mcs_per_region=2, lcs_per_mc=10, seed=0, chunked=False, chunk_size=1024, listing_size=None, login_redirects=0):
+        HTTPServer.__init__(self, ('127.0.0.1', port), MockGISHandler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.pages = pages
+        self.listing_size = listing_size
+        self.chunked = chunked
+        self.chunk_size = chunk_size
+        self.login_redirects = login_redirects
+        self.tree = CommitteeTree(regions, mcs_per_region, lcs_per_mc)
+        self.random = random.Random(seed)
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.fixtures = dict((name, load_fixture(name)) for name in os.listdir(FIXTURES_DIR))
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:%d' % self.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+            return self.random.random() < self.error_rate
+
+    def fixture(self, name, **changes):
+        data = copy.deepcopy(self.fixtures[name])
+        data.update(changes)
+        return data
+
+    # Builders of the answers of each route
+
+    def person(self, person_id):
+        person = self.fixture('person.json', id=person_id, full_name='Persona %d' % person_id, email='persona%d@example.org' % person_id)
+        person['home_lc'] = {'id': 158900 + person_id % 10, 'name': 'LC'}
+        return person
+
+    def application(self, application_id):
+        application = self.fixture('application.json', id=application_id)
+        application['person'] = {'id': application_id, 'full_name': 'Persona %d' % application_id, 'home_lc': {'id': 158900 + application_id % 10}}
+        return application
+
+    def listing(self, builder, query):
+        page = int(query.get('page', ['1'])[0])
+        per_page = int(query.get('per_page', ['25'])[0])
+        if self.listing_size is None:
+            total_items, total_pages = self.pages * per_page, self.pages
+        else:
+            total_items, total_pages = self.listing_size, -(-self.listing_size // per_page)
+        first = (page - 1) * per_page
+        data = [builder(first + i + 1) for i in range(max(min(per_page, total_items - first), 0))]
+        return {'data': data, 'paging': {'total_items': total_items, 'total_pages': total_pages, 'current_page': page}}
+
+    def analytics(self, office_id, query):
+        start_date = query.get('start_date', ['2017-01-01'])[0]
+        seed = office_id + int(start_date[5:7] or 1)
+
+        def numbers(seed):
+            data = self.fixture('analytics.json')
+            for index, key in enumerate(('total_applications', 'total_matched', 'total_an_accepted', 'total_approvals', 'total_realized', 'total_completed')):
+                value = (seed * (7 - index)) % 97
+                data[key]['doc_count'] = value
+            data['total_applications']['applicants']['value'] = data['total_applications']['doc_count'] // 2
+            data['total_matched']['unique_profiles']['value'] = data['total_matched']['doc_count']
+            return data
+        data = numbers(seed)
+        children = self.tree.children(office_id)
+        if children:
+            data['children'] = {'buckets': [dict(numbers(child + int(start_date[5:7] or 1)), key=child) for child in children]}
+        return {'analytics': data}
+
+    def rest(self, route, query):
+        """
+        Returns the status and the answer of a GIS API v2 route, such as 'people.json' or 'committees/1589.json'
+        """
+        if query.get('access_token', [None])[0] != TOKEN:
+            return 401, {'error': 'invalid access token'}
+        match = re.match(r'^committees/(\d+)(\.json)?$', route)
+        if match:
+            committee_id = int(match.group(1))
+            if committee_id not in self.tree.committees:
+                return 404, {'error': 'not found'}
+            return 200, self.tree.detail(committee_id)
+        if re.match(r'^committees/\d+/terms\.json$', route):
+            return 200, {'data': [{'id': 1, 'short_name': '2017'}], 'paging': {'total_items': 1, 'total_pages': 1}}
+        match = re.match(r'^committees/(\d+)/terms/\d+\.json$', route)
+        if match:
+            term = self.fixture('term.json')
+            for index, position in enumerate(term['teams'][0]['positions']):
+                if position['person'] is not None:
+                    position['person'] = {'id': int(match.group(1)) * 10 + index}
+            return 200, term
+        if route == 'applications/analyze.json':
+            office = query.get('basic[home_office_id]') or query.get('entity_to_entity[person_committee]') or ['0']
+            return 200, self.analytics(int(office[0]), query)
+        if route == 'people.json':
+            return 200, self.listing(self.person, query)
+        if route in ('applications.json', 'organisations.json'):
+            return 200, self.listing(self.application, query)
+        match = re.match(r'^people/(\d+)(\.json)?$', route)
+        if match:
+            return 200, self.person(int(match.group(1)))
+        match = re.match(r'^applications/(\d+)(\.json)?$', route)
+        if match:
+            return 200, self.application(int(match.group(1)))
+        match = re.match(r'^opportunities/(\d+)(\.json)?$', route)
+        if match:
+            return 200, self.fixture('opportunity.json', id=int(match.group(1)))
+        return 404, {'error': 'not found'}
+
+    def graphql(self, document):
+        query = document.get('query', '')
+        variables = document.get('variables') or {}
+        if 'allPeople' in query:
+            per_page = variables.get('perPage') or 25
+            listing = self.listing(self.person, {'page': [variables.get('page') or 1], 'per_page': [per_page]})
+            return {'data': {'allPeople': {'data': listing['data'], 'paging': listing['paging']}}}
+        data = {}
+        for alias, variable in re.findall(r'(\w+)\s*:\s*getPerson\(id:\s*\$(\w+)\)', query):
+            data[alias] = self.person(int(variables[variable]))
+        if not data and 'getPerson' in query:
+            data['getPerson'] = self.person(int(variables.get('id', 0)))
+        return {'data': data}
+
+
+class MockGISHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json', headers=None):
+        if not isinstance(body, bytes):
+            if not isinstance(body, type('')):
+                body = json.dumps(body)
+            body = body.encode('utf-8')
+        chunked = self.server.chunked and content_type == 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or []):
+            self.send_header(name, value)
+        self.end_headers()
+        if not chunked:
+            self.wfile.write(body)
+            return
+        for start in range(0, len(body), self.server.chunk_size):
+            chunk = body[start:start + self.server.chunk_size]
+            self.wfile.write(('%x\r\n' % len(chunk)).encode('ascii') + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def _handle(self, method):
+        server = self.server
+        url = urlparse(self.path)
+        body = self._body()
+        if server.latency:
+            time.sleep(server.latency)
+        failed = server.count_request()
+        if url.path in ('', '/') and method == 'GET':
+            return self._send(200, server.fixtures['login.html'], 'text/html; charset=utf-8')
+        if url.path == '/users/sign_in' and method == 'POST' and server.login_redirects:
+            return self._send(302, '', 'text/html', [('Location', '/users/redirect/%d' % server.login_redirects)])
+        match = re.match(r'^/users/redirect/(\d+)$', url.path)
+        if match and method == 'GET' and int(match.group(1)) > 1:
+            return self._send(302, '', 'text/html', [('Location', '/users/redirect/%d' % (int(match.group(1)) - 1))])
+        if (url.path == '/users/sign_in' and method == 'POST') or (match and method == 'GET'):
+            # EXPA answers the login with a redirect which carries the token in a cookie
+            return self._send(302, '', 'text/html', [
+                ('Location', '/'),
+                ('Set-Cookie', 'expa_token=%s; path=/; max-age=7200' % TOKEN)])
+        if failed:
+            return self._send(503, {'error': 'Service Unavailable'}, headers=[('Retry-After', '0')])
+        query = parse_qs(url.query)
+        if url.path == '/graphql' and method == 'POST':
+            if query.get('access_token', [None])[0] != TOKEN:
+                return self._send(401, {'error': 'invalid access token'})
+            return self._send(200, server.graphql(json.loads(body.decode('utf-8') or '{}')))
+        match = re.match(r'^/v\d/(.+)$', url.path)
+        if match:
+            if method == 'PATCH':
+                return self._send(200, {'id': 0})
+            status, answer = server.rest(match.group(1), query)
+            return self._send(status, answer)
+        return self._send(404, {'error': 'not found'})
+
+    def do_GET(self):
+        self._handle('GET')
+
+    def do_POST(self):
+        self._handle('POST')
+
+    def do_PATCH(self):
+        self._handle('PATCH')
+
+
+@contextmanager
+def use_mock_server(server, api_class=None):
+    """
+    Points every ExpaApi (or the given subclass of BaseExpaApi) to the mock server while the block runs
+    """
+    if api_class is None:
+        from ..expaApi import BaseExpaApi as api_class
+    names = ('API_URL', 'LOGIN_PAGE_URL', 'AUTH_URL')
+    previous = dict((name, getattr(api_class, name)) for name in names)
+    api_class.API_URL = server.url
+    api_class.LOGIN_PAGE_URL = server.url + '/'
+    api_class.AUTH_URL = server.url + '/users/sign_in'
+    try:
+        yield server
+    finally:
+        for name, value in previous.items():
+            setattr(api_class, name, value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runs a local stand-in of the EXPA hosts')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds every answer is delayed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of the API requests answered with a 503')
+    parser.add_argument('--pages', type=int, default=3, help='How many pages every listing has')
+    args = parser.parse_args()
+    server = MockGISServer(args.port, args.latency, args.error_rate, args.pages)
+    print('Mock GIS API listening on %s' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,190 @@
+# coding=utf-8
+"""
+Times the main entry points of ExpaApi, and the views built on them, against the mock GIS API server.
+
+    python -m django_expa.benchmarks.run [--iterations 20] [--latency 0.05] [--label my-change]
+
+Every run prints the latency percentiles and the throughput of each scenario, compares them with the
+last run of the same scenario stored in the results file, and appends its own results to it.
+The process-wide caches are emptied before every iteration, unless --warm is given.
+Without DJANGO_SETTINGS_MODULE, Django is configured with an in-memory database; django_expa/settings.py must exist, as for any other use of the module.
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import io
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+
+
+def setup_django():
+    import django
+    from django.conf import settings
+    if not settings.configured and 'DJANGO_SETTINGS_MODULE' not in os.environ:
+        settings.configure(
+            DEBUG=False,
+            ALLOWED_HOSTS=['testserver'],
+            INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'django_expa'],
+            DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+            ROOT_URLCONF='django_expa.urls',
+            TEMPLATES=[{'BACKEND': 'django.template.backends.django.DjangoTemplates', 'APP_DIRS': True}],
+        )
+        django.setup()
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+    else:
+        django.setup()
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile of a list of numbers
+    """
+    ordered = sorted(values)
+    index = max(int(round(fraction * len(ordered) + 0.5)) - 1, 0)
+    return ordered[min(index, len(ordered) - 1)]
+
+
+def summarize(latencies, wall_time, server_requests):
+    count = len(latencies)
+    return {
+        'iterations': count,
+        'mean': sum(latencies) / count,
+        'p50': percentile(latencies, 0.5),
+        'p90': percentile(latencies, 0.9),
+        'p99': percentile(latencies, 0.99),
+        'max': max(latencies),
+        'throughput': count / wall_time if wall_time else 0.0,
+        'requests_per_iteration': float(server_requests) / count,
+    }
+
+
+def reset_caches():
+    from ..cache import get_response_cache
+    from ..committees import get_committee_index
+    get_response_cache().clear()
+    get_committee_index().clear()
+
+
+def scenarios(mc_id, lc_id):
+    """
+    Returns the benchmarked entry points, as (name, function) pairs. Each function takes an ExpaApi and a Django test client
+    """
+    return [
+        ('getCountryEBs', lambda api, client: api.getCountryEBs(mc_id)),
+        ('getLCYearlyPerformance', lambda api, client: api.getLCYearlyPerformance(2015, lc_id)),
+        ('get_interactions', lambda api, client: api.get_interactions('registered', mc_id, 'ogx', '2017-01-01', '2017-01-31')),
+        ('get_application_interactions', lambda api, client: api.get_interactions('approved', mc_id, 'ogv', '2017-01-01', '2017-01-31')),
+        ('get_national_stats', lambda api, client: api.get_national_stats(mc_id, ['ogv', 'igv'], '2017-01-01', '2017-01-31')),
+        ('view:yearly_performance', lambda api, client: client.get('/performance/2015')),
+        ('view:op_managers', lambda api, client: client.get('/opportunity/5/managers')),
+    ]
+
+
+def run_scenario(func, api, client, server, iterations, concurrency, warm):
+    latencies = []
+    lock = threading.Lock()
+    requests_before = server.requests
+
+    def worker(count):
+        for _ in range(count):
+            if not warm:
+                reset_caches()
+            start = time.time()
+            func(api, client)
+            elapsed = time.time() - start
+            with lock:
+                latencies.append(elapsed)
+    start = time.time()
+    if concurrency <= 1:
+        worker(iterations)
+    else:
+        threads = [threading.Thread(target=worker, args=(iterations // concurrency + (1 if i < iterations % concurrency else 0),)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return summarize(latencies, time.time() - start, server.requests - requests_before)
+
+
+def previous_results(path):
+    """
+    Returns the last stored result of every scenario
+    """
+    last = {}
+    if not os.path.exists(path):
+        return last
+    with io.open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                for name, result in record['scenarios'].items():
+                    last[name] = result
+    return last
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks ExpaApi against a local mock of the GIS API')
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=1, help='How many threads run the iterations of a scenario at the same time')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the mock server waits before every answer')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of the API requests the mock server answers with a 503')
+    parser.add_argument('--pages', type=int, default=3, help='How many pages every listing has')
+    parser.add_argument('--lcs', type=int, default=10, help='How many LCs every MC has')
+    parser.add_argument('--warm', action='store_true', help='Keep the caches between iterations')
+    parser.add_argument('--no-rate-limit', action='store_true', help='Send the requests without going through the rate limiter')
+    parser.add_argument('--only', action='append', help='Run only the scenarios with these names')
+    parser.add_argument('--label', default='', help='A name for this run in the results file')
+    parser.add_argument('--output', default=RESULTS_FILE, help='JSON lines file where the results are appended')
+    args = parser.parse_args(argv)
+
+    setup_django()
+    from django.test import Client
+    from .. import settings
+    from ..expaApi import ExpaApi
+    from .mock_server import MockGISServer, use_mock_server
+
+    if args.no_rate_limit:
+        settings.RATE_LIMIT_BACKEND = None
+    server = MockGISServer(latency=args.latency, error_rate=args.error_rate, pages=args.pages, lcs_per_mc=args.lcs).start()
+    mc_id = 1589
+    results = {}
+    try:
+        with use_mock_server(server):
+            # Logs the default account in, so the views find its token in the cache
+            api = ExpaApi(settings.DEFAULT_ACCOUNT, pwd='benchmark', fail_attempts=3, fail_interval=0.01)
+            client = Client()
+            last = previous_results(args.output)
+            print('%-30s %8s %8s %8s %8s %10s %9s' % ('scenario', 'mean', 'p50', 'p90', 'p99', 'ops/s', 'req/op'))
+            for name, func in scenarios(mc_id, mc_id * 100):
+                if args.only and name not in args.only:
+                    continue
+                result = run_scenario(func, api, client, server, args.iterations, args.concurrency, args.warm)
+                results[name] = result
+                line = '%-30s %7.1fms %7.1fms %7.1fms %7.1fms %10.2f %9.1f' % (
+                    name, result['mean'] * 1000, result['p50'] * 1000, result['p90'] * 1000, result['p99'] * 1000,
+                    result['throughput'], result['requests_per_iteration'])
+                if name in last:
+                    line += '   p50 %+.0f%%' % ((result['p50'] / last[name]['p50'] - 1) * 100 if last[name]['p50'] else 0)
+                print(line)
+    finally:
+        server.stop()
+    record = {
+        'timestamp': datetime.now().isoformat(),
+        'label': args.label,
+        'options': {'iterations': args.iterations, 'concurrency': args.concurrency, 'latency': args.latency,
+                    'error_rate': args.error_rate, 'pages': args.pages, 'lcs': args.lcs, 'warm': args.warm,
+                    'rate_limit': not args.no_rate_limit},
+        'scenarios': results,
+    }
+    with io.open(args.output, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record) + '\n')
+    return record
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+# coding=utf-8
+"""
+Measures what importing django_expa costs a process that has already set Django up, as every web worker and management command has.
+
+    python -m django_expa.benchmarks.startup [--repeat 5] [--budget-ms 30] [--budget-mb 5]
+
+Each module is imported in a fresh interpreter, several times, and the best import time is kept, together with the
+resident memory the import added and the heavy dependencies it loaded. The command exits with status 1 when a module
+goes over its time or memory budget, or loads a heavy dependency it does not need, so it can guard the startup path in CI.
+"""
+from __future__ import unicode_literals, print_function
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+# Modules imported by a Django process that uses django_expa, in the order it would import them, with the
+# longest time in milliseconds and the most megabytes of resident memory each one may take to be imported
+MODULES = [
+    ('django_expa.models', 5, 1),
+    ('django_expa.expaApi', 30, 5),
+    ('django_expa.views', 30, 5),
+    ('django_expa.urls', 30, 5),
+    ('django_expa.sync', 5, 1),
+    ('django_expa.async_api', 100, 10),
+]
+# Dependencies that should only be loaded when they are needed
+HEAVY = ['bs4', 'future', 'requests', 'urllib3', 'httpx', 'sqlite3', 'concurrent.futures', 'asyncio', 'numpy']
+# The heavy dependencies a module may load anyway, because it can not be imported without them
+ALLOWED = {'django_expa.async_api': ['httpx', 'asyncio']}
+
+CHILD = r'''
+import json, sys, time
+
+def rss():
+    try:
+        with open('/proc/self/statm') as f:
+            import os
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError):
+        import resource
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return usage if sys.platform == 'darwin' else usage * 1024
+
+import django
+from django.conf import settings
+if 'DJANGO_SETTINGS_MODULE' not in __import__('os').environ:
+    settings.configure(
+        INSTALLED_APPS=['django.contrib.contenttypes', 'django.contrib.auth', 'django_expa'],
+        DATABASES={'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}},
+        ROOT_URLCONF='django_expa.urls',
+    )
+django.setup()
+heavy = %(heavy)r
+before = set(name for name in heavy if name in sys.modules)
+memory = rss()
+start = time.time()
+__import__(%(module)r)
+seconds = time.time() - start
+print(json.dumps({
+    'seconds': seconds,
+    'rss': rss() - memory,
+    'loaded': [name for name in heavy if name in sys.modules and name not in before],
+}))
+'''
+
+
+def measure(module, repeat, python=sys.executable):
+    """
+    Imports a module in repeat fresh interpreters. Returns the best import time, the largest memory increase and the heavy dependencies loaded
+    """
+    best = None
+    for _ in range(repeat):
+        output = subprocess.check_output([python, '-c', CHILD % {'module': module, 'heavy': HEAVY}], env=os.environ.copy())
+        result = json.loads(output.decode('utf-8').strip().splitlines()[-1])
+        if best is None:
+            best = result
+        else:
+            best['seconds'] = min(best['seconds'], result['seconds'])
+            best['rss'] = max(best['rss'], result['rss'])
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures the import time and memory of the django_expa modules')
+    parser.add_argument('--budget-ms', type=float, help='The longest any module may take to be imported, instead of the budget of each one')
+    parser.add_argument('--budget-mb', type=float, help='The most resident memory importing any module may add, instead of the budget of each one')
+    parser.add_argument('--repeat', type=int, default=5, help='How many times each module is imported')
+    parser.add_argument('--only', action='append', help='Measure only these modules')
+    args = parser.parse_args(argv)
+
+    over = []
+    print('%-26s %9s %9s %14s  %s' % ('module', 'import', 'rss', 'budget', 'heavy dependencies loaded'))
+    for module, budget_ms, budget_mb in MODULES:
+        if args.only and module not in args.only:
+            continue
+        budget_ms = args.budget_ms if args.budget_ms is not None else budget_ms
+        budget_mb = args.budget_mb if args.budget_mb is not None else budget_mb
+        result = measure(module, args.repeat)
+        milliseconds = result['seconds'] * 1000
+        megabytes = result['rss'] / (1024.0 * 1024)
+        unexpected = [name for name in result['loaded'] if name not in ALLOWED.get(module, [])]
+        flag = ''
+        if milliseconds > budget_ms or megabytes > budget_mb or unexpected:
+            over.append(module)
+            flag = '  OVER BUDGET'
+        print('%-26s %7.1fms %7.1fMB %6.0fms/%4.1fMB  %s%s' % (module, milliseconds, megabytes, budget_ms, budget_mb, ', '.join(result['loaded']) or '-', flag))
+    if over:
+        print('Over budget: %s' % ', '.join(over))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
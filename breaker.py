@@ -0,0 +1,137 @@
+# coding=utf-8
+"""
+Module containing the circuit breakers which stop ExpaApi from waiting on EXPA while it is down
+"""
+from __future__ import unicode_literals
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+# Each family of GIS API endpoints fails independently of the others
+FAMILIES = ('auth', 'rest', 'analytics', 'graphql')
+
+
+class CircuitBreaker(object):
+    """
+    Tracks the health of a family of endpoints:
+
+    - closed: requests are sent normally. After failure_threshold consecutive failures, it opens.
+    - open: requests are rejected right away, without being sent. After recovery_timeout seconds, it becomes half-open.
+    - half-open: up to half_open_calls requests are let through as probes. If one of them works the breaker closes again; if one fails, it opens again.
+
+    Every allowed request must be followed by a call to record_success or record_failure.
+    Functions added with add_listener are called as listener(breaker, old_state, new_state) on every state change.
+    """
+    def __init__(self, name, failure_threshold=5, recovery_timeout=30, half_open_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_calls = half_open_calls
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = None
+        self._probes = 0
+        self._listeners = []
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.transitions = 0
+
+    def add_listener(self, listener):
+        self._listeners.append(listener)
+
+    def _set_state(self, state):
+        # Must be called holding the lock; returns the change to notify once it is released
+        old_state = self._state
+        if old_state == state:
+            return None
+        self._state = state
+        self.transitions += 1
+        if state == OPEN:
+            self._opened_at = time.time()
+        self._probes = 0
+        return old_state, state
+
+    def _notify(self, change):
+        if change is None:
+            return
+        for listener in list(self._listeners):
+            listener(self, change[0], change[1])
+
+    @property
+    def state(self):
+        with self._lock:
+            change = self._check_timeout()
+            state = self._state
+        self._notify(change)
+        return state
+
+    def _check_timeout(self):
+        if self._state == OPEN and time.time() - self._opened_at >= self.recovery_timeout:
+            return self._set_state(HALF_OPEN)
+        return None
+
+    def allow_request(self):
+        """
+        Returns whether a request may be sent now
+        """
+        with self._lock:
+            change = self._check_timeout()
+            if self._state == CLOSED:
+                allowed = True
+            elif self._state == HALF_OPEN and self._probes < self.half_open_calls:
+                self._probes += 1
+                allowed = True
+            else:
+                self.rejected += 1
+                allowed = False
+        self._notify(change)
+        return allowed
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            change = self._set_state(CLOSED)
+        self._notify(change)
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            change = None
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                change = self._set_state(OPEN)
+        self._notify(change)
+
+    def retry_after(self):
+        """
+        Returns how many seconds remain until the breaker lets a probe through, or 0 if it is not open
+        """
+        with self._lock:
+            if self._state != OPEN:
+                return 0
+            return max(self._opened_at + self.recovery_timeout - time.time(), 0)
+
+    def stats(self):
+        return {'state': self.state, 'failures': self._failures, 'rejected': self.rejected, 'transitions': self.transitions}
+
+
+_default_breakers = None
+_default_breakers_lock = threading.Lock()
+
+
+def get_circuit_breakers():
+    """
+    Returns a dict with the process-wide circuit breaker of every family of endpoints, built from the CIRCUIT_BREAKER_* settings the first time it is used
+    """
+    global _default_breakers
+    with _default_breakers_lock:
+        if _default_breakers is None:
+            from . import settings
+            _default_breakers = dict((family, CircuitBreaker(
+                family,
+                failure_threshold=getattr(settings, 'CIRCUIT_BREAKER_FAILURES', 5),
+                recovery_timeout=getattr(settings, 'CIRCUIT_BREAKER_RECOVERY', 30),
+            )) for family in FAMILIES)
+        return _default_breakers
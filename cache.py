@@ -0,0 +1,176 @@
+# coding=utf-8
+"""
+Module containing the cache of GIS API responses shared by all ExpaApi instances
+"""
+from __future__ import unicode_literals
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+# How many seconds the responses of each route are kept, checked in order against the
+# route joined by '/'. None means forever, 0 means the route is not cached.
+DEFAULT_TTLS = [
+    (r'^committees/', 3 * 60 * 60),
+    (r'^applications/analyze\.json$', 60),
+    (r'^(people|applications|organisations)\.json$', 30),
+    (r'^opportunities/', 10 * 60),
+    (r'^people/', 5 * 60),
+    (r'^applications/', 60),
+]
+
+
+class ResponseCache(object):
+    """
+    Keeps the responses of GET queries for a time that depends on their route. The most
+    recently used max_entries responses are kept in memory and, if a Django cache alias is
+    given, they are also kept there so they can be shared between processes.
+    Analytics of periods that have already finished are kept forever, as they cannot change.
+    Expired responses stay in memory until they are evicted, so they can still be served by get_stale.
+    If a DiskStore is given, the responses kept forever are also written to it, so they survive restarts.
+    The cached responses are shared, so they must not be modified by their users.
+    """
+    key_prefix = 'django_expa:response:'
+
+    def __init__(self, max_entries=1000, ttls=None, alias=None, disk=None):
+        self.max_entries = max_entries
+        self.ttls = [(re.compile(pattern), ttl) for pattern, ttl in (ttls if ttls is not None else DEFAULT_TTLS)]
+        self.alias = alias
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def blocking(self):
+        """
+        Whether get and set may block on I/O, as they do when a Django cache alias or a DiskStore is used
+        """
+        return self.alias is not None or self.disk is not None
+
+    def _backend(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def make_key(self, account, version, routes, query_params=None):
+        """
+        Builds the key of a query from its route and parameters, leaving the access token out
+        """
+        params = sorted(
+            (key, value) for key, value in (query_params or {}).items()
+            if key != 'access_token')
+        return json.dumps([account, version, [str(route) for route in routes], params], default=str)
+
+    def ttl_for(self, routes, query_params=None):
+        """
+        Returns for how long a response of the given query should be kept; None means forever and 0 means it should not be kept
+        """
+        route = '/'.join(str(r) for r in routes)
+        query_params = query_params or {}
+        if route == 'applications/analyze.json':
+            end_date = query_params.get('end_date')
+            if end_date and end_date < datetime.now().strftime('%Y-%m-%d'):
+                return None
+        for pattern, ttl in self.ttls:
+            if pattern.search(route):
+                return ttl
+        return 0
+
+    def get(self, key):
+        """
+        Returns a (found, response) tuple
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, data = entry
+                if expires_at is None or expires_at > now:
+                    self._entries[key] = self._entries.pop(key)
+                    self.hits += 1
+                    return True, data
+        if self.alias is not None:
+            entry = self._backend().get(self.key_prefix + hashlib.sha1(key.encode('utf-8')).hexdigest())
+            if entry is not None:
+                self._remember(key, entry[0], entry[1])
+                with self._lock:
+                    self.hits += 1
+                return True, entry[1]
+        if self.disk is not None:
+            found, data = self.disk.get(key)
+            if found:
+                self._remember(key, None, data)
+                with self._lock:
+                    self.hits += 1
+                return True, data
+        with self._lock:
+            self.misses += 1
+        return False, None
+
+    def get_stale(self, key):
+        """
+        Returns a (found, response) tuple like get, but also finds the responses kept in memory which have already expired, as long as they have not been evicted. It is used to keep answering while EXPA is down.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            self.stale_hits += 1
+            return True, entry[1]
+
+    def set(self, key, data, ttl):
+        if ttl == 0:
+            return
+        expires_at = None if ttl is None else time.time() + ttl
+        self._remember(key, expires_at, data)
+        if self.alias is not None:
+            self._backend().set(self.key_prefix + hashlib.sha1(key.encode('utf-8')).hexdigest(), (expires_at, data), ttl)
+        if ttl is None and self.disk is not None:
+            self.disk.set(key, data)
+
+    def _remember(self, key, expires_at, data):
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (expires_at, data)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        stats = {'hits': self.hits, 'misses': self.misses, 'stale_hits': self.stale_hits, 'entries': len(self._entries)}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats()
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Returns the process-wide response cache, built from the RESPONSE_CACHE_* settings the first time it is used
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            from . import settings
+            from .diskstore import DiskStore
+            path = getattr(settings, 'RESPONSE_DISK_CACHE_PATH', None)
+            _default_cache = ResponseCache(
+                max_entries=getattr(settings, 'RESPONSE_CACHE_ENTRIES', 1000),
+                ttls=getattr(settings, 'RESPONSE_CACHE_TTLS', None),
+                alias=getattr(settings, 'RESPONSE_CACHE_ALIAS', None),
+                disk=DiskStore(path, getattr(settings, 'RESPONSE_DISK_CACHE_MAX_BYTES', 512 * 1024 * 1024)) if path else None,
+            )
+        return _default_cache
@@ -0,0 +1,220 @@
+# coding=utf-8
+"""
+Module containing the local index of AIESEC's office tree (AI -> regions -> MCs -> LCs)
+"""
+from __future__ import unicode_literals
+import collections
+import json
+import logging
+import threading
+import time
+from . import concurrency
+
+# EXPA id of AIESEC INTERNATIONAL; all regions appear as its suboffices
+ROOT_ID = 1626
+
+logger = logging.getLogger(__name__)
+
+
+class CommitteeIndex(object):
+    """
+    Keeps the committees that have been seen in the GIS API, so the office tree can be
+    walked without making new requests. Each committee is stored as the summary the API
+    gives of it inside the 'suboffices' of its parent, together with the ids of its parent
+    and, once it has been loaded, of its suboffices.
+
+    max_age: After how many seconds the suboffices of a committee are requested again
+    """
+    def __init__(self, max_age=24 * 60 * 60):
+        self.max_age = max_age
+        self._nodes = {}
+        self._names = {}
+        self._lock = threading.RLock()
+
+    def _node(self, committee_id):
+        committee_id = int(committee_id)
+        if committee_id not in self._nodes:
+            self._nodes[committee_id] = {'summary': {'id': committee_id}, 'parent': None, 'children': None, 'loaded_at': None}
+        return self._nodes[committee_id]
+
+    def add(self, summary, parent_id=None):
+        """
+        Stores the summary of a committee, as it appears in the 'suboffices' of its parent
+        """
+        with self._lock:
+            node = self._node(summary['id'])
+            node['summary'] = summary
+            if parent_id is not None:
+                node['parent'] = int(parent_id)
+            for key in ('name', 'full_name'):
+                if summary.get(key):
+                    self._names[summary[key].lower()] = int(summary['id'])
+            return node
+
+    def add_committee(self, committee):
+        """
+        Stores a committee as returned by committees/<id>.json, including its parent and suboffices
+        """
+        with self._lock:
+            parent = committee.get('parent')
+            parent_id = parent['id'] if isinstance(parent, dict) else parent
+            summary = dict((key, value) for key, value in committee.items() if key not in ('suboffices', 'parent'))
+            node = self.add(summary, parent_id)
+            children = []
+            for suboffice in committee.get('suboffices') or []:
+                self.add(suboffice, committee['id'])
+                children.append(int(suboffice['id']))
+            for child_id in node['children'] or []:
+                # Suboffices that are no longer there are detached from this committee
+                if child_id not in children and self._nodes[child_id]['parent'] == int(committee['id']):
+                    self._nodes[child_id]['parent'] = None
+            node['children'] = children
+            node['loaded_at'] = time.time()
+            return node
+
+    def is_loaded(self, committee_id):
+        node = self._nodes.get(int(committee_id))
+        return node is not None and node['loaded_at'] is not None and time.time() - node['loaded_at'] < self.max_age
+
+    def load(self, api, committee_id):
+        """
+        Requests a committee to the GIS API, using the given ExpaApi instance, and stores it with its suboffices
+        """
+        return self.add_committee(api.make_query(['committees', '%d.json' % int(committee_id)]))
+
+    def build(self, api, root=ROOT_ID, depth=3, retries=1):
+        """
+        Loads the tree under a committee, level by level, requesting the committees of each level in parallel.
+        depth: How many levels are loaded under the root. With the default values, AI, its regions and their MCs are loaded, so the LCs of every MC are known.
+        retries: How many more times the committees whose request failed are requested. The ones that still fail are logged and left
+        unloaded, keeping the suboffices known from before if any, so they are requested again by the next build or lookup.
+        """
+        level = [root]
+        for _ in range(depth):
+            pending = [committee_id for committee_id in level if not self.is_loaded(committee_id)]
+            for attempt in range(retries + 1):
+                results = concurrency.bounded_map(lambda committee_id: self.load(api, committee_id), pending, api.max_workers)
+                errors = [(committee_id, error) for committee_id, (node, error) in zip(pending, results) if error is not None]
+                pending = [committee_id for committee_id, error in errors]
+                if not pending:
+                    break
+            self._report_failures(errors)
+            level = [child for committee_id in level for child in self.children(committee_id)]
+        return self
+
+    def _report_failures(self, errors):
+        """
+        Logs the (committee id, exception) pairs of the committees that build could not load
+        """
+        for committee_id, error in errors:
+            logger.warning("The committee %s could not be loaded into the committee index: %s", committee_id, concurrency.error_message(error))
+
+    def refresh(self, api, committee_id):
+        """
+        Requests a committee again, updating its data and its list of suboffices
+        """
+        return self.load(api, committee_id)
+
+    def suboffices(self, api, committee_id):
+        """
+        Returns the summaries of the suboffices of a committee, in the same format as the 'suboffices' of committees/<id>.json. The committee is only requested if it has not been loaded yet, or if it was loaded more than max_age seconds ago.
+        """
+        if not self.is_loaded(committee_id):
+            self.load(api, committee_id)
+        with self._lock:
+            return [self._nodes[child]['summary'] for child in self.children(committee_id)]
+
+    def get(self, committee_id):
+        """
+        Returns the summary of a committee, or None if it is not in the index
+        """
+        node = self._nodes.get(int(committee_id))
+        return node['summary'] if node is not None else None
+
+    def name(self, committee_id):
+        summary = self.get(committee_id)
+        if summary is None:
+            return None
+        return summary.get('full_name') or summary.get('name')
+
+    def find(self, name):
+        """
+        Returns the id of the committee with the given name or full name, or None if it is not in the index
+        """
+        return self._names.get(name.lower())
+
+    def parent(self, committee_id):
+        node = self._nodes.get(int(committee_id))
+        return node['parent'] if node is not None else None
+
+    def children(self, committee_id):
+        node = self._nodes.get(int(committee_id))
+        if node is None or node['children'] is None:
+            return []
+        return list(node['children'])
+
+    def ancestors(self, committee_id):
+        """
+        Returns the ids of the committees above the given one, starting from its parent
+        """
+        ancestors = []
+        parent = self.parent(committee_id)
+        while parent is not None and parent not in ancestors:
+            ancestors.append(parent)
+            parent = self.parent(parent)
+        return ancestors
+
+    def descendants(self, committee_id):
+        """
+        Returns the ids of all the known committees below the given one
+        """
+        descendants = []
+        with self._lock:
+            pending = collections.deque(self.children(committee_id))
+            while pending:
+                child = pending.popleft()
+                descendants.append(child)
+                pending.extend(self.children(child))
+        return descendants
+
+    def clear(self):
+        with self._lock:
+            self._nodes.clear()
+            self._names.clear()
+
+    def to_dict(self):
+        with self._lock:
+            return {'nodes': [
+                {'id': committee_id, 'summary': node['summary'], 'parent': node['parent'], 'children': node['children'], 'loaded_at': node['loaded_at']}
+                for committee_id, node in self._nodes.items()]}
+
+    @classmethod
+    def from_dict(cls, data, max_age=24 * 60 * 60):
+        index = cls(max_age)
+        for node in data['nodes']:
+            index.add(node['summary'], node['parent'])
+            index._node(node['id']).update(children=node['children'], loaded_at=node['loaded_at'])
+        return index
+
+    def dumps(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def loads(cls, data, max_age=24 * 60 * 60):
+        return cls.from_dict(json.loads(data), max_age)
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_committee_index():
+    """
+    Returns the process-wide committee index
+    """
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            from . import settings
+            _default_index = CommitteeIndex(getattr(settings, 'COMMITTEE_INDEX_MAX_AGE', 24 * 60 * 60))
+        return _default_index
@@ -0,0 +1,36 @@
+# coding=utf-8
+"""
+Utilities for running several GIS API calls at the same time
+"""
+from __future__ import unicode_literals
+from concurrent.futures import ThreadPoolExecutor
+
+
+def error_message(error):
+    """
+    Returns a readable description of an exception raised by one of the tasks
+    """
+    return getattr(error, 'error_message', None) or repr(error)
+
+
+def bounded_map(func, items, max_workers=8):
+    """
+    Calls func on each one of the items, using at most max_workers threads at the same time.
+    A failure in one of the calls does not stop the others.
+
+    returns: A list with a (result, error) tuple per item, in the same order as the items. error is None if the call worked, and the raised exception otherwise.
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    def run(item):
+        try:
+            return func(item), None
+        except Exception as e:
+            return None, e
+
+    if max_workers <= 1 or len(items) == 1:
+        return [run(item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(run, items))
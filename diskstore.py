@@ -0,0 +1,168 @@
+# coding=utf-8
+"""
+Module containing the on-disk store of GIS API responses that can never change, such as the analytics of closed periods
+"""
+from __future__ import unicode_literals
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+
+class DiskStore(object):
+    """
+    Keeps responses in a directory, so they survive restarts and are shared by every process
+    that uses it. Each response is stored once, as a JSON file named after the hash of its
+    contents, and a SQLite index maps the keys of the queries to those files and keeps the
+    total size of the files. Nothing is read until it is asked for, and then the file of the
+    response is loaded whole.
+    When the files take more than max_bytes, the least recently used keys are dropped,
+    together with the files no other key points to. Reading a key only records when it was
+    used if that was more than touch_interval seconds ago, so most reads never take the write
+    lock of the index, and eviction tells apart how recently keys were used to that precision.
+    Files are only written and removed while holding the write lock of the index, so no process
+    removes a file that another one has just pointed a key to.
+
+    path: The directory where the index and the files are kept. It is created if it does not exist
+    max_bytes: How many bytes the files may take in total
+    touch_interval: How many seconds may pass before a read records again that a key was used
+    """
+    def __init__(self, path, max_bytes=512 * 1024 * 1024, touch_interval=60):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.touch_interval = touch_interval
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._ready = False
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            with self._lock:
+                if not self._ready:
+                    if not os.path.isdir(os.path.join(self.path, 'objects')):
+                        os.makedirs(os.path.join(self.path, 'objects'))
+                    setup = sqlite3.connect(os.path.join(self.path, 'index.sqlite3'), timeout=10)
+                    with setup:
+                        setup.execute('BEGIN IMMEDIATE')
+                        setup.execute('CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, digest TEXT, size INTEGER, used_at REAL)')
+                        setup.execute('CREATE INDEX IF NOT EXISTS entries_used_at ON entries (used_at)')
+                        setup.execute('CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest)')
+                        setup.execute('CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER)')
+                        setup.execute('CREATE TABLE IF NOT EXISTS totals (name TEXT PRIMARY KEY, value INTEGER)')
+                        if setup.execute("SELECT 1 FROM totals WHERE name = 'bytes'").fetchone() is None:
+                            # The sizes of the files of a store made before they were tracked are added up once
+                            setup.execute('INSERT OR IGNORE INTO objects (digest, size) SELECT digest, MAX(size) FROM entries GROUP BY digest')
+                            setup.execute("INSERT INTO totals (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM objects")
+                    setup.close()
+                    self._ready = True
+            connection = sqlite3.connect(os.path.join(self.path, 'index.sqlite3'), timeout=10)
+            self._local.connection = connection
+        return connection
+
+    def _file(self, digest):
+        return os.path.join(self.path, 'objects', digest[:2], digest[2:] + '.json')
+
+    def _key(self, key):
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns a (found, response) tuple
+        """
+        connection = self._connection()
+        key = self._key(key)
+        row = connection.execute('SELECT digest, used_at FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is not None:
+            try:
+                with io.open(self._file(row[0]), 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (IOError, OSError, ValueError):
+                # The file was removed by hand, or is damaged
+                with connection:
+                    connection.execute('BEGIN IMMEDIATE')
+                    self._drop(connection, key)
+            else:
+                now = time.time()
+                if now - row[1] >= self.touch_interval:
+                    with connection:
+                        connection.execute('UPDATE entries SET used_at = ? WHERE key = ?', (now, key))
+                self.hits += 1
+                return True, data
+        self.misses += 1
+        return False, None
+
+    def set(self, key, data):
+        connection = self._connection()
+        content = json.dumps(data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+        digest = hashlib.sha1(content).hexdigest()
+        key = self._key(key)
+        with connection:
+            connection.execute('BEGIN IMMEDIATE')
+            row = connection.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+            if row is not None and row[0] != digest:
+                self._drop(connection, key)
+            if connection.execute('SELECT 1 FROM objects WHERE digest = ?', (digest,)).fetchone() is None:
+                connection.execute('INSERT INTO objects (digest, size) VALUES (?, ?)', (digest, len(content)))
+                connection.execute("UPDATE totals SET value = value + ? WHERE name = 'bytes'", (len(content),))
+            filename = self._file(digest)
+            if not os.path.exists(filename):
+                self._write(filename, content)
+            connection.execute('INSERT OR REPLACE INTO entries (key, digest, size, used_at) VALUES (?, ?, ?, ?)', (key, digest, len(content), time.time()))
+            self._evict(connection)
+
+    def _write(self, filename, content):
+        directory = os.path.dirname(filename)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                pass
+        # Written to a temporary file first, so no reader ever sees half of it
+        fd, temporary = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        os.rename(temporary, filename)
+
+    def _drop(self, connection, key):
+        """
+        Removes a key and, if no other key points to it, its file. Returns how many bytes were freed.
+        It must be called inside a transaction which holds the write lock of the index
+        """
+        row = connection.execute('SELECT digest FROM entries WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            return 0
+        digest = row[0]
+        connection.execute('DELETE FROM entries WHERE key = ?', (key,))
+        if connection.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone() is not None:
+            return 0
+        row = connection.execute('SELECT size FROM objects WHERE digest = ?', (digest,)).fetchone()
+        size = row[0] if row is not None else 0
+        connection.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+        connection.execute("UPDATE totals SET value = value - ? WHERE name = 'bytes'", (size,))
+        try:
+            os.remove(self._file(digest))
+        except OSError:
+            pass
+        return size
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT value FROM totals WHERE name = 'bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, in connection.execute('SELECT key FROM entries ORDER BY used_at').fetchall():
+            total -= self._drop(connection, key)
+            if total <= self.max_bytes:
+                return
+
+    def stats(self):
+        connection = self._connection()
+        entries = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        size = connection.execute("SELECT value FROM totals WHERE name = 'bytes'").fetchone()[0]
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
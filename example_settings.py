@@ -2,3 +2,36 @@
 from __future__ import unicode_literals
 
 DEFAULT_ACCOUNT = 'immanager@aiesec.org.pa' #The account that will be used, by default, to use the API. Its password should be saved in the database, using the admin interface
+TOKEN_CACHE_BACKEND = 'memory' #Where access tokens are kept between ExpaApi instances: 'memory' (this process only), 'cache' (the Django cache named in TOKEN_CACHE_ALIAS) or 'database' (the AccessToken table)
+TOKEN_CACHE_ALIAS = 'default'
+HTTP_POOL_CONNECTIONS = 10 #How many hosts keep a pool of open connections
+HTTP_POOL_MAXSIZE = 10 #How many connections are kept open to each host. Should be at least the number of threads that make requests at the same time
+HTTP_POOL_BLOCK = False #If True, requests wait for a free connection instead of opening one that will not be kept
+HTTP_KEEP_ALIVE = True
+HTTP_GZIP = True
+MAX_IN_FLIGHT_REQUESTS = 10 #How many requests the whole process may have waiting for EXPA at the same time, whatever ExpaApi or transport sends them
+FANOUT_WORKERS = 8 #How many threads methods like getCountryEBs use to make independent requests in parallel. The default burst and in-flight cap of every RATE_LIMITS budget are raised to at least this number
+LISTING_PAGE_SIZE = 500 #How many records are requested per page from listings such as people.json or applications.json
+LISTING_PREFETCH = 0 #How many pages of a streamed listing are requested in the background ahead of the one being read
+RESPONSE_CACHE_ENTRIES = 1000 #How many GIS API responses are kept in memory, evicting the least recently used ones
+RESPONSE_CACHE_ALIAS = None #If set, the Django cache with this name also keeps the responses, so they are shared between processes
+RESPONSE_CACHE_TTLS = None #A list of (route regex, seconds) pairs to replace cache.DEFAULT_TTLS. None means forever, and 0 means never cached
+COMMITTEE_INDEX_MAX_AGE = 24*60*60 #After how many seconds the suboffices of a committee in the local office tree index are requested again
+ASYNC_MAX_CONNECTIONS = 100 #How many connections the httpx client shared by the AsyncExpaApi instances of an event loop may open
+ASYNC_MAX_KEEPALIVE_CONNECTIONS = 20 #How many of them are kept open between requests
+RETRY_MAX_DELAY = 60 #The longest time, in seconds, an ExpaApi instance waits before retrying a failed request
+RETRY_BUDGET = 10 #How many retries an ExpaApi instance may have saved up. Every request adds RETRY_BUDGET_RATIO retries to it, and every retry spends one
+RETRY_BUDGET_RATIO = 0.2
+RATE_LIMIT_BACKEND = 'memory' #Where the rate limiter keeps its buckets: 'memory' (per process), 'sqlite' (shared by the processes which use the same RATE_LIMIT_PATH file), 'cache' (the Django cache RATE_LIMIT_ALIAS) or None to disable it
+RATE_LIMIT_PATH = 'django_expa_ratelimit.sqlite3'
+RATE_LIMIT_ALIAS = 'default'
+RATE_LIMITS = {} #Overrides of ratelimit.DEFAULT_LIMITS, i.e. {'analytics': {'rate': 1}}. Budgets: analytics, listing, graphql and default. Their rates (10 to 20 requests per second) are what caps the parallel methods once their burst is spent, i.e. about 2.5 seconds for the 51 requests of getCountryEBs
+CIRCUIT_BREAKER_FAILURES = 5 #After how many consecutive failures the requests to a family of EXPA endpoints (auth, rest, analytics, graphql) stop being sent
+CIRCUIT_BREAKER_RECOVERY = 30 #After how many seconds a request is let through again to check whether they have recovered
+SERVE_STALE_WHILE_OPEN = True #Whether expired responses still in the response cache are returned while the endpoints are failing
+SYNC_INITIAL_DAYS = 30 #How many days back the first local synchronization of an office and interaction goes (see sync.py and the expa_sync command)
+SYNC_BATCH_SIZE = 500 #How many people or applications are written to the database at once
+GRAPHQL_BATCH_SIZE = 50 #How many people are looked up with a single GraphQL request by get_people and get_lc_alignments
+RESPONSE_DISK_CACHE_PATH = None #Directory where the responses that can never change, such as the analytics of closed periods, are kept between restarts. None disables it
+RESPONSE_DISK_CACHE_MAX_BYTES = 512*1024*1024 #How much space they may take before the least recently used ones are deleted
+INSTRUMENTATION_HOOKS = ['logging'] #Hooks which receive an event for every call to EXPA: 'logging' (the django_expa.requests logger), 'metrics' (instrumentation.get_metrics().render() gives them in the Prometheus format), 'signal' (signals.expa_request) or the dotted path of a function
@@ -1,24 +1,33 @@
 # coding=utf-8
 """
 Module containing the ExpaApi class
+Importing it is cheap: requests, the settings file and the models are only loaded when an instance needs them
 """
-from __future__ import unicode_literals, print_function
-import json
-import requests
+from __future__ import unicode_literals
+import logging
 import time
-import urllib
 import base64
 import calendar
 from datetime import datetime, timedelta
-from bs4 import BeautifulSoup
-from . import tools, settings, models
-
-from future.standard_library import install_aliases
-install_aliases()
-
-from urllib.parse import urlparse, urlencode, unquote
-from requests.packages.urllib3.exceptions import InsecureRequestWarning
-requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+from . import tools, tokens, concurrency, graphql
+from .auth import Authenticator
+from .pagination import Paginator
+from .cache import get_response_cache
+from .committees import get_committee_index, ROOT_ID
+from .retry import RetryPolicy
+from .breaker import get_circuit_breakers
+from .singleflight import get_single_flight
+from .instrumentation import get_instrumentation, request_event, response_size, redact
+from .jsonstream import stream_response
+from .records import Person, Application, StatsCell, iter_records
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    # Python 2
+    from urllib import urlencode
+
+logger = logging.getLogger(__name__)
 
 
 class APIUnavailableException(Exception):
@@ -30,6 +39,15 @@ class APIUnavailableException(Exception):
         self.error_message = error_message
 
 
+class CircuitOpenException(APIUnavailableException):
+    """
+        This error is raised, without sending any request, while the circuit breaker of the EXPA endpoints being queried is open because they have been failing.
+    """
+    def __init__(self, breaker):
+        super(CircuitOpenException, self).__init__(None, "The %s endpoints of EXPA are failing; no requests will be sent to them for %.1f seconds" % (breaker.name, breaker.retry_after()))
+        self.breaker = breaker
+
+
 class DjangoEXPAException(Exception):
     """
         This error is raised whenever the EXPA API is not working as expected.
@@ -38,16 +56,16 @@ class DjangoEXPAException(Exception):
         self.error_message = error_message
 
 
-class ExpaApi(object):
+class BaseExpaApi(object):
     """
-    This class is meant to encapsulate and facilitate the development of
-    methods that extract information from the GIS API. Whenever a new object of
-    this class is created, it generates a new access token which will be used
-    for all method calls.
-    As such tokens expire two hours after being obtained, it is recommended to
-    generate a new ExpaApi object if your scripts take too long to complete.
+    Everything ExpaApi and AsyncExpaApi have in common: their configuration, the
+    access token handling, and the methods which build the GIS API queries and
+    read their responses without sending any request.
     """
 
+    # Hosts of EXPA; they can be changed in a subclass or an instance, i.e. to point to a local mock server
+    API_URL = "https://gis-api.aiesec.org"
+    LOGIN_PAGE_URL = "https://experience-v2.aiesec.org"
     AUTH_URL = "https://auth.aiesec.org/users/sign_in"
     # AUTH_URL = "https://experience.aiesec.org"
     # This dict takes the first letter of a program to decide whether this
@@ -58,9 +76,16 @@ class ExpaApi(object):
     # volunteer or a global internship program
     programDict = {
         'gv': 1, 'gt': 2, 'get': [2, 5],
-        'gx': [1, 2, 5], 'cx': [1, 2, 5], 'ge': 5}
+        'gx': [1, 2, 5], 'cx': [1, 2, 5], 'ge': 5,
+        # Names of the programs before the 2015 rebranding
+        'gcdp': 1, 'gip': 2}
+    # The keys of the performance methods, and the get_stats values they are taken from
+    performanceKeys = {'MA': 'accepted', 'RE': 'realized'}
+    # The programs of getLCWeeklyPerformance and getLCYearlyPerformance
+    weeklyPrograms = ['igv', 'iget', 'ogv', 'oget']
+    yearlyPrograms = ['igcdp', 'igip', 'ogcdp', 'ogip']
 
-    def __init__(self, account=None, fail_attempts=1, fail_interval=10, pwd=None):
+    def __init__(self, account=None, fail_attempts=1, fail_interval=10, pwd=None, token_cache=None, max_workers=None, response_cache=None):
         """
         Default method initialization.
         params?
@@ -68,110 +93,843 @@ class ExpaApi(object):
         the database, the expa API will try to use this account to authenticate
         and obtain the auth token. Otherwise it will use the default account in
         the settings file
-        fail_attempts: Defines how many times will this instance try to redo a failed request before failing and throwing an EXPA error.
-        fail_interval: Defines the time this instance will wait before trying to redo a failed request.
+        fail_attempts: Defines how many times will this instance try a request before failing and throwing an EXPA error. Only network errors, 408, 429 and 5xx answers are retried.
+        fail_interval: Defines the longest time this instance will wait before the first retry of a failed request. The wait is random, and its limit doubles with every retry, up to RETRY_MAX_DELAY seconds; a Retry-After header sent by the API takes precedence.
+        token_cache: The TokenCache used to store the access tokens. By default, the one shared by the whole process is used.
+        response_cache: The ResponseCache which keeps the responses of GET queries. By default, the one shared by the whole process is used.
+        max_workers: How many independent requests the methods that make several of them, such as getCountryEBs, send at the same time. The total number of requests in flight is also limited by the transport.
+        """
+        from . import settings
+        self._pwd = pwd if account else None
+        if account is None:
+            account = settings.DEFAULT_ACCOUNT
+        self.account = account
+        self.token_cache = token_cache if token_cache is not None else tokens.get_token_cache()
+        self.response_cache = response_cache if response_cache is not None else get_response_cache()
+        # Index of the office tree, shared by the whole process
+        self.committees = get_committee_index()
+        self.fail_attempts = fail_attempts
+        self.fail_interval = fail_interval
+        # Circuit breakers of every family of endpoints, shared by the whole process
+        self.breakers = get_circuit_breakers()
+        self.serve_stale = getattr(settings, 'SERVE_STALE_WHILE_OPEN', True)
+        self.retry_policy = RetryPolicy(
+            fail_attempts, fail_interval,
+            max_delay=getattr(settings, 'RETRY_MAX_DELAY', 60),
+            budget_ratio=getattr(settings, 'RETRY_BUDGET_RATIO', 0.2),
+            max_budget=getattr(settings, 'RETRY_BUDGET', 10),
+        )
+        self.max_workers = max_workers if max_workers is not None else getattr(settings, 'FANOUT_WORKERS', 8)
+        self.page_size = getattr(settings, 'LISTING_PAGE_SIZE', 500)
+        self.prefetch = getattr(settings, 'LISTING_PREFETCH', 0)
+        self.graphql_batch_size = getattr(settings, 'GRAPHQL_BATCH_SIZE', 50)
+        # Hooks which receive an event for every call to EXPA, shared by the whole process
+        self.instrumentation = get_instrumentation()
+
+    @property
+    def token(self):
+        """
+        The access token of this instance's account. It is taken from the token cache, which only logs in again when it is about to expire
+        """
+        return self.token_cache.get_token(self.account, self._login)
+
+    def _login(self):
+        """
+        Authenticates against EXPA and returns a tuple with the new access token and the unix timestamp of its expiration, if EXPA reports it
+        """
+        if self._pwd:
+            password = base64.b64encode(self._pwd.encode())
+        else:
+            from .models import LoginData
+            password = LoginData.objects.get(email=self.account).password
+        breaker = self.breakers['auth']
+        self._check_breaker(breaker)
+        started = time.time()
+        try:
+            cookie, response = self.authenticator.login(self.account, base64.b64decode(password).decode('utf-8'), self.LOGIN_PAGE_URL, self.AUTH_URL)
+        except Exception as e:
+            breaker.record_failure()
+            self._instrument('post', self.AUTH_URL, started=started, error=getattr(e, 'error_message', None) or repr(e))
+            raise
+        self._record_status(breaker, response.status_code)
+        if cookie is not None:
+            self._instrument('post', self.AUTH_URL, response, started)
+            return cookie.value, cookie.expires
+        error_message = "Error obtaining the authentication token"
+        self._instrument('post', self.AUTH_URL, response, started, error="%s; the sign in was answered with code %s" % (error_message, response.status_code))
+        raise DjangoEXPAException(error_message)
+
+    def login_stats(self):
+        """
+        Returns how many times this instance has logged in, and how long it took, apart from the time spent on API requests
+        """
+        return self.authenticator.stats()
+
+    def _instrument(self, method, url, response=None, started=None, retries=0, cache=None, error=None, timings=None, size=None):
+        """
+        Reports a call to EXPA to the instrumentation hooks. Its total time is measured since started, which includes its retries, and its other times are taken from the timings of the response
+        size: The bytes of the body, if they were counted as it was read. By default, they are taken from the response
+        """
+        if not self.instrumentation.enabled:
+            return
+        if timings is None:
+            timings = getattr(response, 'timings', None) or {}
+        self.instrumentation.emit(request_event(
+            method, url,
+            status=response.status_code if response is not None else None,
+            size=size if size is not None or response is None else response_size(response),
+            connect=timings.get('connect'),
+            ttfb=timings.get('ttfb'),
+            total=time.time() - started if started is not None else timings.get('total'),
+            retries=retries, cache=cache, error=error))
+
+    def _route_url(self, routes, version='v2'):
+        """
+        Returns the URL of a GIS API route without its query string, which is enough to report a query that was not sent
+        """
+        return "{api_url}/{version}/{routes}".format(api_url=self.API_URL, version=version, routes="/".join(str(route) for route in routes))
+
+    def _breaker_for(self, routes):
+        """
+        Returns the circuit breaker of the family of endpoints a REST query belongs to
+        """
+        if '/'.join(str(route) for route in routes) == 'applications/analyze.json':
+            return self.breakers['analytics']
+        return self.breakers['rest']
+
+    def _check_breaker(self, breaker):
+        """
+        Raises a CircuitOpenException if the breaker does not let requests through right now
+        """
+        if not breaker.allow_request():
+            raise CircuitOpenException(breaker)
+
+    def _record_status(self, breaker, status):
+        """
+        Reports the answer of a request to its breaker. Only the answers that would be retried count as failures; any other one shows that EXPA is up
+        """
+        if self.retry_policy.should_retry(status):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def breaker_stats(self):
+        """
+        Returns the state of the circuit breaker of every family of endpoints, and how many requests each one has rejected
+        """
+        return dict((family, breaker.stats()) for family, breaker in self.breakers.items())
+
+    def _buildQuery(self, routes, queryParams=None, version='v2', token=None):
+        """
+        Builds a well-formed GIS API query
+
+        version: The version of the API being used. Can be v1 or v2.
+        routes: A list of the URI path to the required API REST resource.
+        queryParams: A dictionary of query parameters, for GET requests
+        token: The access token of the query. By default, the one of the token property, which may log in
+        """
+        if queryParams is None:
+            queryParams = {}
+        baseUrl = "{api_url}/{version}/{routes}?{params}"
+        queryParams['access_token'] = token if token is not None else self.token
+        return baseUrl.format(api_url=self.API_URL, version=version, routes="/".join(routes), params=urlencode(queryParams, True))
+
+    def _lc_alignment_query(self, person_id):
+        return {"query":"query DetailsQuery($id: ID) {getPerson(id: $id) {...PersonalDetails_personalDetails}}fragment PersonalDetails_personalDetails on Person {id first_name last_name middle_names full_name lc_alignment {keywords id}}","variables":{"id":str(person_id)}}
+
+    def _parse_lc_alignment(self, response):
+        return self._alignment_keywords(response['data']['getPerson'])
+
+    def _alignment_keywords(self, person):
+        alignment = person['lc_alignment'] if person is not None else None
+        if alignment is None:
+            return 'Unknown'
+        else:
+            return alignment['keywords']
+
+    def _recent_registered_query(self, page, perPage):
+        return graphql.all_people_query(['id', {'lc_alignment': ['keywords']}], page, perPage, filters={"is_pop_user": False})
+
+    def _people_chunks(self, person_ids, chunk_size=None):
+        """
+        Splits a list of person ids into the chunks that are looked up with a single GraphQL document each
+        """
+        person_ids = list(person_ids)
+        size = chunk_size or self.graphql_batch_size
+        return [person_ids[i:i + size] for i in range(0, len(person_ids), size)]
+
+    def _graphql_payload(self, response):
+        """
+        Decodes a GraphQL response, raising an APIUnavailableException if it failed without returning any data
+        """
+        if response.status_code != 200:
+            raise APIUnavailableException(response, "The GraphQL request has failed with error code %s" % response.status_code)
+        payload = response.json()
+        if payload.get('data') is None:
+            raise APIUnavailableException(response, "; ".join(graphql.errors(payload)) or "The GraphQL response has no data")
+        return payload
+
+    def _stats_query_args(self, officeID, program, start_date, end_date=None):
+        query_args = {
+            'basic[home_office_id]': officeID,
+            'basic[type]': self.ioDict[program[0].lower()],
+            'programmes[]': self.programDict[program[1:].lower()],
+            'start_date': start_date,
+        }
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        query_args['end_date'] = end_date
+        return query_args
+
+    def _parse_stats(self, response):
+        """
+        Reads the stats returned by get_stats from the 'analytics' of an applications/analyze.json response
+        """
+        return StatsCell.from_payload(response).to_dict()
+
+    def _stats_error(self):
+        return StatsCell().to_dict()
+
+    def _stats_matrix_keys(self, cells):
+        """
+        Normalizes the cells given to get_stats_matrix. Returns the key of each cell, and the keys to be queried, each of them once
+        """
+        today = datetime.now().strftime('%Y-%m-%d')
+        keys = {}
+        for cell in cells:
+            officeID, program, start_date, end_date = cell
+            keys[cell] = (self.account, str(officeID), program.lower(), start_date, end_date or today)
+        return keys, list(set(keys.values()))
+
+    def _stats_matrix_result(self, keys, pending, results, records=False):
+        """
+        Builds the answer of get_stats_matrix from the (data, error) results of the pending keys.
+        The stats are kept as StatsCells, and turned into dicts unless records is True
+        """
+        stats = {}
+        for key, (data, error) in zip(pending, results):
+            stats[key] = StatsCell() if error is not None else StatsCell.from_stats(data)
+        if records:
+            return {cell: stats[key] for cell, key in keys.items()}
+        return {cell: stats[key].to_dict() for cell, key in keys.items()}
+
+    def _stats_batch_plan(self, pending):
+        """
+        Groups the keys of get_stats_matrix which still have to be queried into the fewest analyze.json calls: offices of the same program and period whose parent is known in the committee index are answered by a single call for their parent, as its 'children' buckets hold the stats of each of them. The parent itself, if it was asked for, is answered by the same call.
+        Returns a list of (officeID, program, start_date, end_date, keys) tuples, one per call.
+        """
+        groups = {}
+        for key in pending:
+            groups.setdefault(key[2:], []).append(key)
+        calls = []
+        for (program, start_date, end_date), keys in groups.items():
+            own = dict((key[1], key) for key in keys)
+            by_parent = {}
+            for key in keys:
+                parent = self.committees.parent(key[1])
+                if parent is not None:
+                    by_parent.setdefault(str(parent), []).append(key)
+            handled = set()
+            # Parents with more children asked for go first, so they are the ones that take their parent's key if it was also asked for
+            for parent, children in sorted(by_parent.items(), key=lambda item: -len(item[1])):
+                batch = [key for key in children if key not in handled]
+                if parent in own and own[parent] not in handled:
+                    batch.append(own[parent])
+                if len(batch) > 1:
+                    calls.append((parent, program, start_date, end_date, batch))
+                    handled.update(batch)
+            calls.extend((key[1], program, start_date, end_date, [key]) for key in keys if key not in handled)
+        return calls
+
+    def _stats_batch_answers(self, calls, results):
+        """
+        Splits the (analytics, error) results of the calls planned by _stats_batch_plan into a (stats, error) tuple per key.
+        Returns them together with the keys that were missing from the children buckets of their call, which must be queried on their own.
+        """
+        answers = {}
+        missing = []
+        for (officeID, program, start_date, end_date, keys), (analytics, error) in zip(calls, results):
+            if error is not None:
+                answers.update((key, (None, error)) for key in keys)
+                continue
+            buckets = dict((str(bucket['key']), bucket) for bucket in (analytics.get('children') or {}).get('buckets', []))
+            for key in keys:
+                data = analytics if key[1] == officeID else buckets.get(key[1])
+                try:
+                    answers[key] = (self._parse_stats(data), None)
+                except (KeyError, TypeError):
+                    missing.append(key)
+        return answers, missing
+
+    def _eb_team_positions(self, term):
+        """
+        Returns the positions of the executive board in the answer of committees/<id>/terms/<id>.json, or an empty list if it has none
+        """
+        for team in term['teams']:
+            if team["team_type"] == "eb":
+                return team['positions']
+        return []
+
+    def _eb_people(self, positions):
+        return [position['person'] for position in positions if position['person'] is not None]
+
+    def _eb_contact_list(self, positions, results):
+        """
+        Builds the answer of getLCEBContactList from the positions of a board, taking from the results iterator the (contact data, error) of each position held by someone
+        """
+        ans = []
+        for position in positions:
+            person = {}
+            if position['person'] is not None:
+                data, error = next(results)
+                if error is None:
+                    person = data
+                else:
+                    person['error'] = concurrency.error_message(error)
+            person['cargo'] = position['name']
+            ans.append(person)
+        return ans
+
+    def _month_range(self, month, year):
+        """
+        Returns the first and last dates of a month, in "%Y-%m-%d" format
+        """
+        start_date = '%d-%02d-01' % (year, month)
+        end_date = '%d-%02d-%02d' % (year, month, calendar.monthrange(year, month)[1])
+        return start_date, end_date
+
+    def _week_range(self, week, year):
+        """
+        Returns the first and last dates of a week of a year, in "%Y-%m-%d" format. Week 1 starts on the first monday of the year, and week 0 is made of the days before it
+        """
+        if week == 0:
+            start_date = "%d-01-01" % year
+        else:
+            start_date = datetime.strptime('%d %d 1' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
+        end_date = datetime.strptime('%d %d 0' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
+        return start_date, end_date
+
+    def _current_weeks(self):
+        """
+        Returns the ranges of the weeks of the current year, up to the current one
+        """
+        now = datetime.now()
+        year = int(now.strftime('%Y'))
+        return [self._week_range(week, year) for week in range(int(now.strftime('%W')) + 1)]
+
+    def _current_months(self):
+        """
+        Returns the ranges of the months of the current year, up to the current one
+        """
+        now = datetime.now()
+        year = int(now.strftime('%Y'))
+        return [self._month_range(month, year) for month in range(1, int(now.strftime('%m')) + 1)]
+
+    def _performance_cells(self, offices, programs, periods):
+        """
+        Returns the cells of get_stats_matrix needed to build a PerformanceSeries
+        """
+        return [(office, program, start_date, end_date) for office in offices for program in programs for start_date, end_date in periods]
+
+    def _program_performance(self, series, office, program, name):
+        """
+        Builds the answer of getProgramWeeklyPerformance and getProgramMonthlyPerformance from a PerformanceSeries. As the periods are consecutive, they stop at the first one whose stats could not be obtained
+        """
+        series = series.head(series.complete_periods(office, program))
+        totals = series.total()
+        return {
+            'totals': dict((metric + 'TOTAL', int(totals.get(office, program, metric=key)[0])) for metric, key in self.performanceKeys.items()),
+            name: dict((metric, series.tolist(office, program, key)) for metric, key in self.performanceKeys.items()),
+        }
+
+    def _yearly_performance(self, series, lc):
+        """
+        Builds the answer of getLCYearlyPerformance from a PerformanceSeries of its twelve months. The months whose stats could not be obtained are "EXPA ERROR"
+        """
+        return dict((program, dict((metric, series.tolist(lc, program, key, StatsCell.ERROR)) for metric, key in self.performanceKeys.items()))
+                    for program in series.programs)
+
+    def _country_stats_query_args(self, program, officeID, start_date, end_date):
+        return {
+            'basic[home_office_id]':officeID,
+            'basic[type]':self.ioDict[program[0].lower()],
+            'end_date':end_date,
+            'programmes[]':self.programDict[program[1:].lower()],
+            'start_date':start_date
+        }
+
+    def _parse_country_stats(self, officeID, mcData):
+        lcData = mcData['children']['buckets']
+        response = {
+            officeID:{
+                'name': self.committees.name(officeID),
+                'approved': mcData['total_approvals']['doc_count'],
+                'realized': mcData['total_realized']['doc_count'],
+                'completed': mcData['total_completed']['doc_count'],
+            }
+        }
+        for lc in lcData:
+            #Guarda la respuesta en un diccionario cuya llave es el office_id del LC, y cuyo valor son los approved y las realizaciones
+            #El nombre se toma del índice de comités, sin hacer consultas; es None si el LC no ha sido cargado
+            response[lc['key']] = {
+                'name': self.committees.name(lc['key']),
+                'approved': lc['total_approvals']['doc_count'],
+                'realized': lc['total_realized']['doc_count'],
+                'completed': mcData['total_completed']['doc_count'],
+            }
+        return response
+
+    def _past_range(self, days, today=True):
+        now = datetime.now()
+        start_date = (now - timedelta(days=days)).strftime('%Y-%m-%d')
+        if not today:
+            now = now - timedelta(days=1)
+        end_date = now.strftime('%Y-%m-%d')
+        return start_date, end_date
+
+    def _year_start_range(self, month, rollover=None):
+        """
+        Returns the range from the first day of the given month up to today, in "%Y-%m-%d" format. The month is the one of this year from the
+        rollover month on, which by default is that same month, and the one of last year before it
+        """
+        now = datetime.now()
+        year = int(now.strftime('%Y'))
+        if int(now.strftime('%m')) < (rollover or month):
+            year -= 1
+        return "%d-%02d-01" % (year, month), now.strftime('%Y-%m-%d')
+
+    def _uncontacted_args(self, officeID):
+        return {
+            'filters[contacted]': 'false',
+            'filters[registered[from]]':'2016-01-01',
+            'filters[home_committee]':officeID,
+        }
+
+    def _matchable_args(self, officeID):
+        return {
+            'filters[interviewed]': 'true',
+            'filters[home_committee]':officeID,
+            'filters[statuses][]':['open', 'applied'],
+        }
+
+    def _week_people_args(self, date_filter, officeID, week=None, year=None):
+        """
+        Returns the filters of the people of an office whose date_filter, such as 'registered' or 'contacted_at', falls in a week of a year. If no week or year are given, the current week is used
+        """
+        if week == None or year == None:
+            now = datetime.now()
+            week = int(now.strftime('%W'))
+            year = int(now.strftime('%Y'))
+        weekStart, weekEnd = self._week_range(week, year)
+        return {
+            'filters[%s[from]]' % date_filter:weekStart,
+            'filters[%s[to]]' % date_filter:weekEnd,
+            'filters[home_committee]':officeID,
+        }
+
+    def _country_mc_year_args(self, program, mc):
+        startDate, endDate = self._year_start_range(7, rollover=6)
+        return {
+            'basic[home_office_id]':mc,
+            'basic[type]':self.ioDict[program[0].lower()],
+            'end_date':endDate,
+            'programmes[]':self.programDict[program[1:].lower()],
+            'start_date':startDate
+        }
+
+    def _parse_country_mc_year(self, mc, data):
+        try:
+            mcData = data['analytics']
+            lcData = mcData['children']['buckets']
+            response = {}
+            for lc in lcData:
+                response[lc['key']] = {
+                    'applications': lc['total_applications']['doc_count'],
+                    'accepted': lc['total_matched']['doc_count'],
+                    'approved': lc['total_approvals']['doc_count'],
+                    'realized': lc['total_realized']['doc_count'],
+                    'completed': lc['total_completed']['doc_count'],
+		}
+            response[mc] = {
+                    'applications': mcData['total_applications']['doc_count'],
+                    'accepted': mcData['total_matched']['doc_count'],
+                    'approved': mcData['total_approvals']['doc_count'],
+                    'realized': mcData['total_realized']['doc_count'],
+                    'completed': mcData['total_completed']['doc_count'],
+                }
+
+        except KeyError as e:
+            logger.error("Error de llave %s en la respuesta de EXPA: %r", e, data)
+            raise e
+        return response
+
+    def _companies_args(self, program, start_date, end_date):
+        query_args = {
+            'filters[registered[from]]':start_date,
+            'filters[registered[to]]':end_date,
+        }
+        if program is not None:
+            query_args['filters[programmes][]']=self.programDict[program],
+        return query_args
+
+    def _interaction_query(self, interaction, officeID, program, start_date, end_date=None, filters=None):
+        """
+        Returns the route and query arguments of the listing used by get_interactions
+        """
+        inter_dict = {
+            'registered': 'person',
+            'contacted': 'person',
+            'applied': 'application',
+            'accepted': 'application',
+            'an_signed': 'application',
+            'approved': 'application',
+            'realized': 'application',
+            'finished': 'application',
+            }
+
+        interaction_type = inter_dict[interaction]
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+
+        if interaction_type == 'person':
+            return ['people.json'], self._person_interactions_args(interaction, officeID, program, start_date, end_date, filters)
+        elif interaction_type == 'application':
+            return ['applications.json'], self._application_interactions_args(interaction, officeID, program, start_date, end_date, filters)
+
+    def _interaction_record(self, routes):
+        """
+        Returns the record type of the items of the listing used by get_interactions
+        """
+        return Person if routes == ['people.json'] else Application
+
+    def _person_interactions_args(self, interaction, officeID, program, start_date, end_date, filters):
+        if not filters:
+            filters = {}
+        inter_dict = {
+            'registered': 'registered',
+            'contacted': 'contacted_at',
+            }
+        query_args = {
+            'filters[%s[from]]' % inter_dict[interaction]:start_date,
+            'filters[%s[to]]' % inter_dict[interaction]:end_date,
+            'filters[home_committee]':officeID,
+        }
+        query_args.update(filters)
+        return query_args
+
+    def _application_interactions_args(self, interaction, officeID, program, start_date, end_date, filters):
+        if not filters:
+            filters = {}
+        inter_dict = {
+            'applied': 'created_at',
+            'accepted': 'date_matched',
+            'an_signed': 'date_an_signed',
+            'approved': 'date_approved',
+            'realized': 'date_realized',
+            'finished': 'experience_end_date',
+            }
+        query_args = {
+            'filters[%s[from]]' % inter_dict[interaction]: start_date,
+            'filters[%s[to]]' % inter_dict[interaction]: end_date,
+            'filters[programmes][]': self.programDict[program[1:]],
+        }
+        query_args.update(filters)
+        if program[0] == 'o':
+            query_args['filters[for]'] = 'people'
+            query_args['filters[person_committee]'] = officeID
+        elif program[0] == 'i':
+            query_args['filters[opportunity_committee]'] = officeID
+        return query_args
+
+    def _e2e_query_args(self, home_office_id, host_office_id, program, start_date, end_date=None):
+        query_args = {
+            'entity_to_entity[person_committee]': home_office_id,
+            'entity_to_entity[opportunity_committee]': host_office_id,
+            'programmes[]': self.programDict[program[1:].lower()],
+            'start_date': start_date,
+        }
+        if end_date is None:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        query_args['end_date'] = end_date
+        return query_args
+
+    def _parse_e2e(self, response):
+        return {
+            'applications': response['total_applications']['doc_count'],
+            'applied': response['total_applications']['applicants']['value'],
+            'acceptances': response['total_matched']['doc_count'],
+            'accepted': response['total_matched']['unique_profiles']['value'],
+            'approved': response['total_approvals']['doc_count'],
+            'realized': response['total_realized']['doc_count'],
+            'finished': response['total_finished']['doc_count'],
+            'completed': response['total_completed']['doc_count'],
+        }
+
+    def _e2e_error(self):
+        return {
+            'applications': "EXPA ERROR",
+            'applied': "EXPA ERROR",
+            'acceptances': "EXPA ERROR",
+            'accepted': "EXPA ERROR",
+            'approved':" EXPA ERROR",
+            'realized': "EXPA ERROR",
+            'finished': "EXPA ERROR",
+            'completed': "EXPA ERROR",
+        }
+
+
+class ExpaApi(BaseExpaApi):
+    """
+    This class is meant to encapsulate and facilitate the development of
+    methods that extract information from the GIS API. Access tokens are kept
+    in a cache shared by all instances, so a new object only authenticates
+    against EXPA when there is no valid token for its account.
+    As such tokens expire two hours after being obtained, the cache renews
+    them shortly before that happens.
+    """
+
+    def __init__(self, account=None, fail_attempts=1, fail_interval=10, pwd=None, token_cache=None, transport=None, max_workers=None, response_cache=None):
+        """
+        Takes the same arguments as BaseExpaApi, plus:
+        transport: The Transport through which all requests are sent. By default, the one shared by the whole process, transport.get_transport(); pass another one, i.e. Transport.from_settings(), to give an instance connections of its own.
+        """
+        super(ExpaApi, self).__init__(account, fail_attempts, fail_interval, pwd, token_cache, max_workers, response_cache)
+        if transport is None:
+            from .transport import get_transport
+            transport = get_transport()
+        self.transport = transport
+        self.authenticator = Authenticator(self.transport)
+        self.flights = get_single_flight()
+        # Makes sure there is a valid token from the start, as it used to be
+        self.token
+
+    def connection_stats(self):
+        """
+        Returns how many requests this instance's transport has sent, and how many of them opened a new connection or reused one. Unless the instance was given a transport of its own, they include the requests of every other instance
+        """
+        return self.transport.stats()
+
+    def graphql_query(self, data):
+        baseUrl = self.API_URL + "/graphql?access_token=" + self.token
+        breaker = self.breakers['graphql']
+        self._check_breaker(breaker)
+        started = time.time()
+        try:
+            response = self.transport.post(baseUrl, json=data)
+        except Exception as e:
+            breaker.record_failure()
+            self._instrument('post', baseUrl, started=started, error=repr(e))
+            raise
+        self._record_status(breaker, response.status_code)
+        self._instrument('post', baseUrl, response, started, error=None if response.status_code == 200 else "The GraphQL request has failed with error code %s" % response.status_code)
+        return response
+
+    def get_recent_registered_with_alignment(self, page=1, perPage=100):
+        data = self._recent_registered_query(page, perPage)
+        response = self.graphql_query(data).json()['data']['allPeople']['data']
+        return response
+
+    def get_lc_alignment(self, person_id):
+        return self._parse_lc_alignment(self.graphql_query(self._lc_alignment_query(person_id)).json())
+
+    def get_people(self, person_ids, fields=None, chunk_size=None):
+        """
+        Looks up many people through GraphQL, with one request for every chunk_size of them (GRAPHQL_BATCH_SIZE by default), sent in parallel.
+        fields: The fields of each person to request, as accepted by graphql.selection. By default, graphql.PERSON_FIELDS
+        returns: A dict whose keys are the given ids and whose values are the people, or None for those which were not found
+        """
+        chunks = self._people_chunks(person_ids, chunk_size)
+        results = concurrency.bounded_map(lambda chunk: self._graphql_payload(self.graphql_query(graphql.people_query(chunk, fields))), chunks, self.max_workers)
+        people = {}
+        for chunk, (payload, error) in zip(chunks, results):
+            if error is not None:
+                raise error
+            people.update(zip(chunk, graphql.parse_people(payload, len(chunk))))
+        return people
+
+    def get_lc_alignments(self, person_ids, chunk_size=None):
+        """
+        The same as get_lc_alignment for many people, with one request for every chunk of them
+        returns: A dict whose keys are the given ids and whose values are their LC alignment keywords, or 'Unknown'
+        """
+        people = self.get_people(person_ids, ['id', {'lc_alignment': ['keywords']}], chunk_size)
+        return dict((person_id, self._alignment_keywords(person)) for person_id, person in people.items())
+
+    def iter_all_people(self, fields=None, filters=None, per_page=100, sort='-created_at', q=None):
+        """
+        Yields all the people of allPeople that match the given filters, requesting its pages one after the other
+        fields: The fields of each person to request, as accepted by graphql.selection
+        """
+        page = 1
+        while True:
+            payload = self._graphql_payload(self.graphql_query(graphql.all_people_query(fields, page, per_page, filters, q, sort)))
+            people, paging = graphql.parse_all_people(payload)
+            for person in people:
+                yield person
+            if not people or page >= (paging.get('total_pages') or 0):
+                return
+            page += 1
+
+    def make_query(self, routes, query_params=None, version='v2', method='get'):
+        """
+        This method both builds a query and executes it using the requests module. If it doesn't work because of EXPA issues, it will retry it as allowed by the 'retry_policy' attribute, up to 'fail_attempts' tries in total, before raising an APIUnavailableException
+        The responses of GET queries are kept in the response cache for a time that depends on their route, so they must not be modified.
+        While the circuit breaker of the route is open, no request is sent: the last response in the cache is returned even if it has expired or, if there is none, a CircuitOpenException is raised right away.
+        If an identical GET query of the same account is already being sent by another thread, no new request is sent either: its response is shared.
+        """
+        if method != "get":
+            return self._send_query(routes, query_params, version, method)
+        started = time.time()
+        key = self.response_cache.make_key(self.account, version, routes, query_params)
+        found, data = self.response_cache.get(key)
+        if found:
+            self._instrument('get', self._route_url(routes, version), started=started, cache='hit')
+            return data
+        sent = []
+
+        def fetch():
+            sent.append(True)
+            return self._fetch_query(key, routes, query_params, version)
+        data = self.flights.do(key, fetch)
+        if not sent:
+            self._instrument('get', self._route_url(routes, version), started=started, cache='coalesced')
+        return data
+
+    def _fetch_query(self, key, routes, query_params, version):
         """
-        if account and pwd:
-            password = base64.b64encode(pwd.encode())
-        else:
-            if account is None:
-                account = settings.DEFAULT_ACCOUNT
-            password = models.LoginData.objects.get(email=account).password
-        params = {
-            'user[email]': account,
-            'user[password]': base64.b64decode(password).decode('utf-8'),
-            }
-        s = requests.Session()
-        token_response = s.get("https://experience-v2.aiesec.org").text
-        soup = BeautifulSoup(token_response, 'html.parser')
-        token = soup.find("form").find(attrs={'name': 'authenticity_token'}).attrs['value']  # name="authenticity_token").value
-        params['authenticity_token'] = token
-        response = s.post(self.AUTH_URL, data=params)
+        Sends a GET query whose response is not in the cache, and stores its response there
+        """
+        started = time.time()
         try:
+            data = self._send_query(routes, query_params, version, cache='miss')
+        except CircuitOpenException:
+            found, data = self.response_cache.get_stale(key) if self.serve_stale else (False, None)
+            if found:
+                self._instrument('get', self._route_url(routes, version), started=started, cache='stale')
+                return data
+            raise
+        self.response_cache.set(key, data, self.response_cache.ttl_for(routes, query_params))
+        return data
 
-            self.token = response.history[-1].cookies['expa_token']
-            print(self.token)
-        except KeyError:
-            print(response.history[-1].cookies)
-            raise DjangoEXPAException("Error obtaining the authentication token")
-        self.fail_attempts = fail_attempts
-        self.fail_interval = fail_interval
-
-    def graphql_query(self, data):
-        baseUrl = "https://gis-api.aiesec.org/graphql?access_token=" + self.token
-        return requests.post(baseUrl, json=data)
+    def cache_stats(self):
+        """
+        Returns the hits and misses of the response cache used by this instance
+        """
+        return self.response_cache.stats()
 
-    def get_recent_registered_with_alignment(self, page=1, perPage=100):
-        data = {
-            "query":"query PeopleIndexQuery($id: Boolean! $lc_alignment: Boolean! $page: Int $perPage: Int $filters: PeopleFilter $q: String $sort: String) { allPeople(page: $page, per_page: $perPage, q: $q, filters: $filters, sort: $sort) {   ...PeopleList_list }} fragment PeopleList_list on PersonList { data {id @include(if: $id) lc_alignment @include(if: $lc_alignment) { keywords }  } paging { total_pages current_page total_items}}",
-            "variables":{"id":True,"lc_alignment":True,"page":page,"perPage":perPage,"filters":{"is_pop_user":False},"q":None,"sort":"-created_at"}
-        }
-        response = self.graphql_query(data).json()['data']['allPeople']['data']
-        return response
+    def coalescing_stats(self):
+        """
+        Returns how many GET queries missed the response cache, and how many of them did not need a request because an identical one was already being sent
+        """
+        return self.flights.stats()
 
-    def get_lc_alignment(self, person_id):
-        data = {"query":"query DetailsQuery($id: ID) {getPerson(id: $id) {...PersonalDetails_personalDetails}}fragment PersonalDetails_personalDetails on Person {id first_name last_name middle_names full_name lc_alignment {keywords id}}","variables":{"id":str(person_id)}}
-        response = self.graphql_query(data).json()['data']['getPerson']['lc_alignment']
-        if response is None:
-            return 'Unknown'
-        else:
-            return response['keywords']
-        
+    def retry_stats(self):
+        """
+        Returns how many requests this instance has sent, how many times it has retried them and for how many seconds it has waited to do so
+        """
+        return self.retry_policy.stats()
 
-    def _buildQuery(self, routes, queryParams=None, version='v2'):
+    def rate_limit_stats(self):
         """
-        Builds a well-formed GIS API query
+        Returns, for every budget of the rate limiter, how many requests have gone through it, how many of them had to wait and for how many seconds in total
+        """
+        if self.transport.rate_limiter is None:
+            return {}
+        return self.transport.rate_limiter.stats()
 
-        version: The version of the API being used. Can be v1 or v2.
-        routes: A list of the URI path to the required API REST resource.
-        queryParams: A dictionary of query parameters, for GET requests
+    def stream_query(self, routes, query_params=None, fields=None, key='data', version='v2'):
         """
-        if queryParams is None:
-            queryParams = {}
-        baseUrl = "https://gis-api.aiesec.org/{version}/{routes}?{params}"
-        queryParams['access_token'] = self.token
-        return baseUrl.format(version=version, routes="/".join(routes), params=urlencode(queryParams, True))
+        Sends a GET query and returns a jsonstream.JSONArrayStream, which decodes the records of the 'key' array of its response one by one as they arrive, projected to the given fields, so only one of them is held in memory at a time. The other keys of the response, such as 'paging', are read with its get method.
+        The response is neither cached nor shared with identical queries. The query is retried as in make_query until its headers arrive; an error while reading its body is raised by the iteration.
+        fields: The fields each record is projected to, as accepted by jsonstream.project. None keeps them whole
+        """
+        return self._send_query(routes, query_params, version, stream_key=key, fields=fields)
 
-    def make_query(self, routes, query_params=None, version='v2', method='get'):
+    def _send_query(self, routes, query_params=None, version='v2', method='get', cache=None, stream_key=None, fields=None):
         """
-        This method both builds a query and executes it using the requests module. If it doesn't work because of EXPA issues, it will retry an amount of times equal to the 'fail_attempts' attribute before raising an APIUnavailableException
+        Sends a query to the GIS API, retrying it as explained in make_query, and reports it to the instrumentation hooks
+        cache: How the response cache was involved, for the instrumentation hooks
+        stream_key, fields: If stream_key is given, a JSONArrayStream over that array of the response is returned, as explained in stream_query
         """
+        # The token the query is built with, so a 401 only discards it if no other request has renewed it already
+        token = self.token
         if method == "get":
-            query = self._buildQuery(routes, query_params, version)
+            query = self._buildQuery(routes, query_params, version, token)
         else:
-            query = self._buildQuery(routes, None, version)
-        print(query)
-        fail_attempts = self.fail_attempts
-        # Tries the request until it works
-        while fail_attempts > 0:
+            query = self._buildQuery(routes, None, version, token)
+        started = time.time()
+        breaker = self._breaker_for(routes)
+        policy = self.retry_policy
+        policy.record_request()
+        attempt = 0
+        token_renewed = False
+        # Tries the request until it works, or until the retry policy or the circuit breaker give up
+        while True:
+            self._check_breaker(breaker)
+            response = None
             try:
                 if method == "get":
-                    response = requests.get(query, timeout=80)
+                    response = self.transport.get(query, timeout=80, stream=stream_key is not None)
                 elif method == "patch":
-                    print(query_params)
-                    response = requests.patch(query, json=query_params, timeout=20)
-                if response.status_code == 200:  # TODO: Check if the answer is a 200
+                    response = self.transport.patch(query, json=query_params, timeout=20)
+                self._record_status(breaker, response.status_code)
+                if response.status_code == 200:
+                    if stream_key is not None:
+                        # The call is reported once its body has been read and the response closed, with the bytes it had
+                        return stream_response(response, stream_key, fields, on_close=lambda size, retries=attempt: self._instrument(method, query, response, started, retries, cache, size=size))
                     data = response.json()
+                    self._instrument(method, query, response, started, attempt, cache)
                     return data  # This returns the method and avoids it reaching the end stage and raising an APIUnavailableException.
-                else:  # TODO: Check if the answer is a service unavailable, back end server at capacity
-                    fail_attempts = fail_attempts - 1
-                    error_message = "The request has failed with error code %s and error message %s. Remaining attempts: %s" % (response.status_code, response.text, fail_attempts)
-                    print(error_message)
-                    if fail_attempts > 0:
-                        time.sleep(self.fail_interval)
+                elif response.status_code == 401 and not token_renewed:
+                    # The cached token stopped working before its expiration; it is discarded and the request is retried once with a new one
+                    token_renewed = True
+                    response.close()
+                    self.token_cache.invalidate(self.account, token)
+                    token = self.token
+                    query = self._buildQuery(routes, query_params if method == "get" else None, version, token)
+                    continue
+                retry = policy.should_retry(response.status_code)
+                error_message = "The request has failed with error code %s and error message %s" % (response.status_code, response.text)
             except Exception as e:
-                fail_attempts = fail_attempts - 1
-                error_message = "The request has failed because of an exception"
-                print(error_message)
-                print(e)
-                if fail_attempts > 0:
-                    time.sleep(self.fail_interval)
-                print(error_message)
-                if fail_attempts > 0:
-                    time.sleep(self.fail_interval)
+                if response is None:
+                    breaker.record_failure()
+                retry = policy.should_retry()
+                error_message = "The request has failed because of an exception: %r" % e
+            attempt += 1
+            if not retry or not policy.take_retry(attempt):
+                break
+            logger.debug("Retrying %s after attempt %d: %s", redact(query), attempt, error_message)
+            policy.sleep(attempt, response)
 
+        self._instrument(method, query, response, started, attempt - 1, cache, error_message)
         raise APIUnavailableException(response, error_message)
 
+    def paginate(self, routes, query_params=None, per_page=None, prefetch=None, fields=None, streaming=False):
+        """
+        Returns a Paginator which yields, one by one, all the records of a listing endpoint such as people.json or applications.json, requesting its pages as they are needed
+        per_page: How many records are requested per page. By default, the LISTING_PAGE_SIZE setting
+        prefetch: How many of the following pages are requested in the background while the current one is being read. By default, the LISTING_PREFETCH setting
+        fields: The fields each record is projected to, as accepted by jsonstream.project. None keeps them whole
+        streaming: Whether the records of each page are decoded one by one as they arrive, with stream_query, instead of the whole page at once
+        """
+        return Paginator(
+            self, routes, query_params,
+            per_page=per_page if per_page is not None else self.page_size,
+            prefetch=prefetch if prefetch is not None else self.prefetch,
+            fields=fields, streaming=streaming)
+
+    def _paginate(self, routes, query_params, stream=False, fields=None):
+        """
+        Returns the total number of records of a listing, and either all of its records or, if stream is True, an iterator over them which decodes them one by one as the pages arrive.
+        When all records are returned, the pages after the first one are requested in parallel, using up to max_workers threads.
+        fields: The fields each record is projected to, as accepted by jsonstream.project. None keeps them whole
+        """
+        paginator = self.paginate(routes, query_params, fields=fields, streaming=stream)
+        total = paginator.total_items
+        if stream:
+            return total, paginator
+        return total, paginator.fetch_all(self.max_workers)
+
     def getPerson(self, person_id):
         """
         Returns the bare JSON data of a person, as obtained from the API
@@ -191,8 +949,7 @@ class ExpaApi(object):
         """
         Returns the bare JSON data of an opportunity, as obtained from the GIS API.
         """
-        response = requests.get(self._buildQuery(['opportunities', opID]))
-        return response
+        return self.make_query(['opportunities', opID])
 
     def get_application(self, app_ID):
         """
@@ -205,7 +962,7 @@ class ExpaApi(object):
         """
         Test method. Has one keyword argument, 'testArg', to be used when necessary
         """
-        print(self)
+        logger.debug("%r", self)
         return kwargs['testArg']
 
     def getManagedEPs(self, expaID):
@@ -218,40 +975,46 @@ class ExpaApi(object):
     def getCountryEBs(self, mcID):
         """
         Este método busca dentro de todas las oficinas locales de un MC a los VPs de cada una de ellas para el término 2016
+        Los LCs se consultan en paralelo; si alguno falla, su entrada queda con la lista de cargos vacía y la descripción del error en 'error', sin afectar a los demás
         """
-        response = requests.get(self._buildQuery(['committees', '%s.json' % mcID])).text
-        lcs = json.loads(response)['suboffices']
+        lcs = self.committees.suboffices(self, mcID)
+        boards = concurrency.bounded_map(lambda lc: self._eb_positions(str(lc['id'])), lcs, self.max_workers)
+        # The contact data of the people of every board is queried with a single pool, not one per LC
+        people = [person for positions, error in boards if error is None for person in self._eb_people(positions)]
+        results = iter(concurrency.bounded_map(self._contact_data, people, self.max_workers))
         ans = []
-        for lc in lcs:
+        for lc, (positions, error) in zip(lcs, boards):
             newLC = {'nombre':lc['full_name'], 'expaID':lc['id']}
-            data = self.getLCEBContactList(str(lc['id']))
-            newLC['cargos'] = data
+            if error is None:
+                newLC['cargos'] = self._eb_contact_list(positions, results)
+            else:
+                newLC['cargos'] = []
+                newLC['error'] = concurrency.error_message(error)
             ans.append(newLC)
         return ans
 
     def getLCEBContactList(self, lcID):
         """
         Este método retorna un diccionario con las personas que conforman la junta ejecutiva del LC cuya ID entra como parámetro, para el periodo 2016
+        Los datos de contacto de cada persona se consultan en paralelo; si alguno falla, ese cargo incluye la descripción del error en 'error'
+        """
+        positions = self._eb_positions(lcID)
+        results = concurrency.bounded_map(self._contact_data, self._eb_people(positions), self.max_workers)
+        return self._eb_contact_list(positions, iter(results))
+
+    def _eb_positions(self, lcID):
+        """
+        Returns the positions of the executive board of an LC for the 2017 term, or an empty list if it has none
         """
-        ans = []
         data = self.make_query(['committees', str(lcID), 'terms.json'])
-        #recorre todos los periodos hasta encontrar el del 2016
+        #recorre todos los periodos hasta encontrar el del 2017
         for term in data['data']:
             if term['short_name'] == '2017':
-                info = requests.get(self._buildQuery(['committees', str(lcID), 'terms', str(term['id']) + '.json'])).text
-                info = json.loads(info)
-                #recorre todos los equipos del periodo hasta encontrar el de la EB
-                for team in info['teams']:
-                    if team["team_type"] == "eb":
-                        for position in team['positions']:
-                            person = {}
-                            if position['person'] is not None:
-                                person = tools.getContactData(self.make_query(['people', str(position['person']['id']) + '.json']))
-                            person['cargo'] = position['name']
-                            ans.append(person)
-                        break
-                break
-        return ans
+                return self._eb_team_positions(self.make_query(['committees', str(lcID), 'terms', str(term['id']) + '.json']))
+        return []
+
+    def _contact_data(self, person):
+        return tools.getContactData(self.make_query(['people', str(person['id']) + '.json']))
 
     def getOPManagersData(self, opID):
         """
@@ -265,39 +1028,44 @@ class ExpaApi(object):
             managers.append(tools.getContactData(manager))
         return managers
 
+    def _fetch_analytics(self, officeID, program, start_date, end_date=None):
+        """
+        Returns the 'analytics' of the applications/analyze.json response for an office, program and period
+        """
+        query_args = self._stats_query_args(officeID, program, start_date, end_date)
+        return self.make_query(['applications', 'analyze.json'], query_args)['analytics']
+
+    def _fetch_stats(self, officeID, program, start_date, end_date=None):
+        """
+        Queries the analytics of an office, program and period, as returned by get_stats. Unlike it, it raises an APIUnavailableException if EXPA fails.
+        """
+        return self._parse_stats(self._fetch_analytics(officeID, program, start_date, end_date))
+
     def get_stats(self, officeID, program, start_date, end_date=None):
         """
         Este método extrae las estadísticas, para una oficina dada y un periodo de tiempo dado. Es un método maestro, y todos los otros métodos que obtengan dichas estadísticas deberían llamar a este.
         """
-        query_args = {
-            'basic[home_office_id]': officeID,
-            'basic[type]': self.ioDict[program[0].lower()],
-            'programmes[]': self.programDict[program[1:].lower()],
-            'start_date': start_date,
-        }
-        if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        query_args['end_date'] = end_date
         try:
-            response = self.make_query(['applications', 'analyze.json'], query_args)['analytics']
-            return {
-                'applications': response['total_applications']['doc_count'],
-                'applicants': response['total_applications']['applicants']['value'],
-                'accepted': response['total_matched']['unique_profiles']['value'],
-                'approved': response['total_approvals']['doc_count'],
-                'realized': response['total_realized']['doc_count'],
-                'completed': response['total_completed']['doc_count'],
-            }
+            return self._fetch_stats(officeID, program, start_date, end_date)
         except APIUnavailableException:
-            return {
-                'applications': "EXPA ERROR",
-                'applicants': "EXPA ERROR",
-                'accepted': "EXPA ERROR",
-                'approved':" EXPA ERROR",
-                'realized': "EXPA ERROR",
-                'completed': "EXPA ERROR",
-            }
+            return self._stats_error()
 
+    def get_stats_matrix(self, cells, records=False):
+        """
+        Extrae las estadísticas de muchas celdas (oficina, programa, periodo) a la vez, equivalentes a llamar get_stats para cada una.
+        Las celdas repetidas se consultan una sola vez, y las demás se consultan en paralelo. Los periodos ya cerrados no cambian, así que sus respuestas quedan en la caché de respuestas (y en la de disco, si está configurada) y no se vuelven a consultar.
+        Las celdas de un mismo programa y periodo cuyas oficinas tienen el mismo padre en el índice de comités (por ejemplo, todos los LCs de un MC, y el MC mismo) se resuelven con una sola consulta del padre, leyendo cada LC de sus 'children'. Conviene cargar antes el árbol con load_committee_tree.
+        params:
+            cells: An iterable of (officeID, program, start_date, end_date) tuples. end_date can be None, which means today.
+            records: If True, the stats of each cell are a records.StatsCell instead of a dict
+        returns: A dictionary whose keys are the given cells and whose values are the stats of each one, as returned by get_stats
+        """
+        keys, pending = self._stats_matrix_keys(cells)
+        calls = self._stats_batch_plan(pending)
+        results = concurrency.bounded_map(lambda call: self._fetch_analytics(*call[:4]), calls, self.max_workers)
+        answers, missing = self._stats_batch_answers(calls, results)
+        answers.update(zip(missing, concurrency.bounded_map(lambda key: self._fetch_stats(*key[1:]), missing, self.max_workers)))
+        return self._stats_matrix_result(keys, pending, [answers[key] for key in pending], records)
 
     def get_past_stats(self, days, program, officeID):
         """
@@ -312,23 +1080,28 @@ class ExpaApi(object):
         """
         Extrae el approved/realized de un mes específico, en un año específico, para un comité y uno de los 4 programas
         """
-        start_date = '%d-%02d-01' % (year, month)
-        end_date = '%d-%02d-%02d' % (year, month, calendar.monthrange(year, month)[1])
-
+        start_date, end_date = self._month_range(month, year)
         return self.get_stats(officeID, program, start_date, end_date)
 
     def getWeekStats(self, week, year, program, lc=1395):
         """
-            Extrae el ip/ma/re de un mes específico, en un año específico, para un comité y uno de los 4 programas
+            Extrae el ip/ma/re de una semana específica, en un año específico, para un comité y uno de los 4 programas
         """
-        if week == 0:
-            start_date = "%d-01-01" % year
-        else:
-            start_date = datetime.strptime('%d %d 1' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
-
-        end_date = datetime.strptime('%d %d 0' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
+        start_date, end_date = self._week_range(week, year)
+        return self.get_stats(lc, program, start_date, end_date)
 
-        return self.get_stats(officeID, program, start_date, end_date)
+    def get_performance_series(self, offices, programs, periods):
+        """
+        Extrae las estadísticas de varias oficinas, programas y periodos como una sola performance.PerformanceSeries, con las consultas hechas juntas mediante get_stats_matrix. Requiere NumPy.
+        Sus totales, sumas acumuladas, cambios entre periodos y la suma de todas las oficinas (por ejemplo, de una región) se calculan sobre el arreglo completo a la vez.
+        params:
+            offices: The ids of the offices
+            programs: The programs, such as 'ogv'
+            periods: The (start_date, end_date) tuples of the periods, in order
+        """
+        from .performance import PerformanceSeries
+        stats = self.get_stats_matrix(self._performance_cells(offices, programs, periods), records=True)
+        return PerformanceSeries.from_stats(stats, offices, programs, periods)
 
     def getLCWeeklyPerformance(self, lc=1395):
         """
@@ -336,15 +1109,12 @@ class ExpaApi(object):
 
         returns: A dictionary with the following structure:
         {
-            'igcdp': *weeklyPerformance for igcdp*,
+            'igv': *weeklyPerformance for igv*,
             ... and so on for all four programs
         }
         """
-        answer = {}
-        for io in ['i', 'o']:
-            for program in ['gv', 'get']:
-                answer[io+program] = self.getProgramWeeklyPerformance(io+program, lc)
-        return answer
+        series = self.get_performance_series([lc], self.weeklyPrograms, self._current_weeks())
+        return dict((program, self._program_performance(series, lc, program, 'weekly')) for program in self.weeklyPrograms)
 
     def getProgramWeeklyPerformance(self, program, office=1395):
         """
@@ -360,25 +1130,8 @@ class ExpaApi(object):
             'RE':[*realizations week 0*, *realizations week 1*, ...],
         }
         """
-        now = datetime.now()
-        currentWeek = int(now.strftime('%W'))
-        currentYear = int(now.strftime('%Y'))
-        ma = []
-        re = []
-        maTotal = 0
-        reTotal = 0
-        for i in range(currentWeek + 1):
-            try:
-                weekData = self.getWeekStats(i, currentYear, program, office)
-                ma.append(weekData['MA'])
-                maTotal += weekData['MA']
-                re.append(weekData['RE'])
-                reTotal += weekData['RE']
-            except TypeError:
-                break
-        totals = {'MATOTAL':maTotal, 'RETOTAL':reTotal}
-        weekly = {'MA': ma, 'RE': re}
-        return {'totals': totals, 'weekly': weekly}
+        series = self.get_performance_series([office], [program], self._current_weeks())
+        return self._program_performance(series, office, program, 'weekly')
 
     def getProgramMonthlyPerformance(self, program, office=1395):
         """
@@ -394,61 +1147,31 @@ class ExpaApi(object):
             'RE':[*realizations month 0*, *realizations month 1*, ...],
         }
         """
-        now = datetime.now()
-        currentMonth = int(now.strftime('%m'))
-        currentYear = int(now.strftime('%Y'))
-        ma = []
-        re = []
-        maTotal = 0
-        reTotal = 0
-        for i in range(currentMonth):
-            monthData = self.getMonthStats(i + 1, currentYear, program, office)
-            ma.append(monthData['MA'])
-            maTotal += monthData['MA']
-            re.append(monthData['RE'])
-            reTotal += monthData['RE']
-        totals = {'MATOTAL': maTotal, 'RETOTAL': reTotal}
-        monthly = {'MA': ma, 'RE': re}
-        return {'totals': totals, 'monthly': monthly}
+        series = self.get_performance_series([office], [program], self._current_months())
+        return self._program_performance(series, office, program, 'monthly')
 
     def getLCYearlyPerformance(self, year, lc=1395):
         """
         Returna el desempeño en matches y realizaciones de un LC en un año dado, separado por mes, para los cuatro programas
+        Las 48 consultas mensuales se hacen juntas mediante get_performance_series
         """
-        answer = {}
-        for io in ['i', 'o']:
-            for program in ['gcdp', 'gip']:
-                ma = []
-                re = []
-                for i in range(1, 13):
-                    monthData = self.getMonthStats(i, year, io+program, lc)
-                    ma.append(monthData['MA'])
-                    re.append(monthData['RE'])
-                answer[io+program] = {'MA': ma, 'RE': re}
-        return answer
+        periods = [self._month_range(i, year) for i in range(1, 13)]
+        series = self.get_performance_series([lc], self.yearlyPrograms, periods)
+        return self._yearly_performance(series, lc)
 
 #Métodos relacionados con el año actual
     def getCurrentYearStats(self, program, officeID=1395):
         """
         Extrae el ma/re de el año actual, para una oficina y uno de los 4 programas
         """
-        now = datetime.now()
-        currentYear = int(now.strftime('%Y'))
-        start_date = "%d-01-01" % currentYear
-        end_date = now.strftime('%Y-%m-%d')
+        start_date, end_date = self._year_start_range(1)
         return self.get_stats(officeID, program, start_date, end_date)
 
     def getCountryCurrentYearStats(self, program, lc):
         """
         Extrae el ma/re de el año actual, para un comité y uno de los 4 programas
         """
-        now = datetime.now()
-        current_year = int(now.strftime('%Y'))
-        if int(now.strftime('%m')) < 2:
-            current_year -= 1
-        start_date = "%d-02-01" % current_year
-
-        end_date = now.strftime('%Y-%m-%d')
+        start_date, end_date = self._year_start_range(2)
         return self.getCountryStats(program, lc, start_date, end_date)
 
     def getCountryStats(self, program, officeID, start_date, end_date):
@@ -457,192 +1180,133 @@ class ExpaApi(object):
         start_date: Una fecha de inicio en formato "%Y-%m-%d"
         """
 
-        queryArgs = {
-            'basic[home_office_id]':officeID,
-            'basic[type]':self.ioDict[program[0].lower()],
-            'end_date':end_date,
-            'programmes[]':self.programDict[program[1:].lower()],
-            'start_date':start_date
-        }
+        queryArgs = self._country_stats_query_args(program, officeID, start_date, end_date)
         mcData = self.make_query(['applications', 'analyze.json'], queryArgs)['analytics']
-        lcData = mcData['children']['buckets']
-        response = {
-            officeID:{
-                'approved': mcData['total_approvals']['doc_count'],
-                'realized': mcData['total_realized']['doc_count'],
-                'completed': mcData['total_completed']['doc_count'],
-            }
-        }
-        for lc in lcData:
-            #Guarda la respuesta en un diccionario cuya llave es el office_id del LC, y cuyo valor son los approved y las realizaciones
-            response[lc['key']] = {
-                'approved': lc['total_approvals']['doc_count'],
-                'realized': lc['total_realized']['doc_count'],
-                'completed': mcData['total_completed']['doc_count'],
-            }
-        return response
+        return self._parse_country_stats(officeID, mcData)
+
+    def get_national_stats(self, mcID, programs, start_date, end_date=None, records=False):
+        """
+        Extrae las estadísticas de un MC y de todos sus LCs, para varios programas y un mismo periodo, con una consulta por programa.
+        returns: A dictionary {program: {officeID: stats}}, with the stats of each office as returned by get_stats, or as a records.StatsCell if records is True
+        """
+        offices = [mcID] + [lc['id'] for lc in self.getSuboffices(mcID)]
+        cells = [(office, program, start_date, end_date) for program in programs for office in offices]
+        stats = self.get_stats_matrix(cells, records)
+        return dict((program, dict((office, stats[(office, program, start_date, end_date)]) for office in offices)) for program in programs)
 
 #Listas de MCs, LCs, regiones y similares
 
     def getRegions(self):
         """
             Gets the information of all AIESEC regions. 1626 is the EXPA id of AIESEC INTERNATIONAL; all regions appear as suboffices
+            Like getMCs and getSuboffices, it is answered from the committee index, which only asks the API for committees it has not seen recently
         """
-        query = self._buildQuery(['committees', '1626.json'])
-        return json.loads(requests.get(query).text)['suboffices']
+        return self.committees.suboffices(self, ROOT_ID)
 
     def getMCs(self, region):
         """
         Gets the information of all countries inside a given AIESEC region, whose ID enters as a parameter
         """
-        query = self._buildQuery(['committees', '%d.json' % region])
-        return json.loads(requests.get(query).text)['suboffices']
+        return self.committees.suboffices(self, region)
 
     def getSuboffices(self, subofficeID):
         """
         Gets the information of all countries inside a given AIESEC region, whose ID enters as a parameter
         """
-        query = self._buildQuery(['committees', '%d.json' % subofficeID])
-        return json.loads(requests.get(query).text)['suboffices']
+        return self.committees.suboffices(self, subofficeID)
+
+    def load_committee_tree(self, root=ROOT_ID, depth=3):
+        """
+        Loads the office tree under a committee into the committee index, so later lookups (ancestors, descendants, names) need no requests. By default it loads AI, its regions and their MCs, and with them every LC.
+        """
+        return self.committees.build(self, root, depth)
 
 ####################
 ############ Analytics sobre people, que permitan obtener personas que cumplen o no cumplen ciertos criterios
 ####################
 
-    def getUncontactedEPs(self, officeID):
+    def getUncontactedEPs(self, officeID, stream=False):
         """
-        Returns all EPs belonging to the office given as parameter who have not been contacted yet, up to 150. It also returns the total number.
+        Returns all EPs belonging to the office given as parameter who have not been contacted yet. It also returns the total number.
+        stream: If True, 'eps' is an iterator that requests the pages as they are read, instead of a list
         """
-        data = self.make_query(['people.json',], {
-            'filters[contacted]': 'false',
-            'filters[registered[from]]':'2016-01-01',
-            'filters[home_committee]':officeID,
-            'page':1,
-            'per_page':150
-        })
+        total, items = self._paginate(['people.json'], self._uncontacted_args(officeID), stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['eps'] = data['data']
+        totals['total'] = total
+        totals['eps'] = items
         return totals
 
-    def get_matchable_EPs(self, officeID):
+    def get_matchable_EPs(self, officeID, stream=False):
         """
-        Returns all EPs belonging to the office given as parameter who are available for match with other entities, up to 300. It also returns their total number.
+        Returns all EPs belonging to the office given as parameter who are available for match with other entities. It also returns their total number.
+        stream: If True, 'eps' is an iterator that requests the pages as they are read, instead of a list
         """
-        data = self.make_query(['people.json',], {
-            'filters[interviewed]': 'true',
-            'filters[home_committee]':officeID,
-            'filters[statuses][]':['open', 'applied'],
-            'page':1,
-            'per_page':300
-        })
+        total, items = self._paginate(['people.json'], self._matchable_args(officeID), stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['eps'] = data['data']
+        totals['total'] = total
+        totals['eps'] = items
         return totals
 
-    def getWeekRegistered(self, officeID, week=None, year=None):
+    def getWeekRegistered(self, officeID, week=None, year=None, stream=False):
         """
         Extrae a las personas, y el número de personas, que se registraron en EXPA desde el lunes anterior. If no week or year arguments are given, uses the current week
 
         returns: A dictionary with the following structure:
             {'total': *number of people who registered that week*,
              'eps': *the eps who registered*}
+        stream: If True, 'eps' is an iterator that requests the pages as they are read, instead of a list
         """
-        if week == None or year == None:
-            now = datetime.now()
-            week = int(now.strftime('%W'))
-            year = int(now.strftime('%Y'))
-
-        if week == 0:
-            weekStart = "%d-01-01" % year
-        else:
-            weekStart = datetime.strptime('%d %d 1' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
-
-        weekEnd = datetime.strptime('%d %d 0' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
-
-        data = self.make_query(['people.json',], {
-            'filters[registered[from]]':weekStart,
-            'filters[registered[to]]':weekEnd,
-            'page':1,
-            'per_page':150,
-            'filters[home_committee]':officeID,
-        })
+        total, items = self._paginate(['people.json'], self._week_people_args('registered', officeID, week, year), stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['eps'] = data['data']
+        totals['total'] = total
+        totals['eps'] = items
         return totals
 
-    def getWeekContacted(self, officeID, week=None, year=None):
+    def getWeekContacted(self, officeID, week=None, year=None, stream=False):
         """
         Extrae a las personas, y el número de personas, que han sido contactadas en EXPA desde el lunes anterior. If no week or year arguments are given, uses the current week
 
         returns: A dictionary with the following structure:
             {'total': *number of people who registered that week*,
              'eps': *the eps who registered*}
+        stream: If True, 'eps' is an iterator that requests the pages as they are read, instead of a list
         """
-        if week == None or year == None:
-            now = datetime.now()
-            week = int(now.strftime('%W'))
-            year = int(now.strftime('%Y'))
-
-        if week == 0:
-            weekStart = "%d-01-01" % year
-        else:
-            weekStart = datetime.strptime('%d %d 1' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
-
-        weekEnd = datetime.strptime('%d %d 0' % (year, week), '%Y %W %w').strftime('%Y-%m-%d')
-
-        data = self.make_query(['people.json',], {
-            'filters[contacted_at[from]]':weekStart,
-            'filters[contacted_at[to]]':weekEnd,
-            'filters[home_committee]':officeID,
-            'page':1,
-            'per_page':150
-        })
+        total, items = self._paginate(['people.json'], self._week_people_args('contacted_at', officeID, week, year), stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['eps'] = data['data']
+        totals['total'] = total
+        totals['eps'] = items
         return totals
 
 
 #################
 ###Utils for getting events that have happened past a certain amount of time. Useful for cronjobs, or other actions that require periodic updates
 ##############
-    def get_past_interactions(self, interaction, days, officeID, today=True, program='ogx', filters=None):
-        if not filters:
-            filters = {}
-        now = datetime.now()
-        start_date = (now - timedelta(days=days)).strftime('%Y-%m-%d')
-        if not today:
-            now = now - timedelta(days=1)
-        end_date = now.strftime('%Y-%m-%d')
-        return self.get_interactions(interaction, officeID, program, start_date, end_date, filters)
-
-    def get_interactions(self, interaction, officeID, program, start_date, end_date=None, filters=None):
-        if not filters:
-            filters = {}
-        inter_dict = {
-            'registered': 'person',
-            'contacted': 'person',
-            'applied': 'application',
-            'accepted': 'application',
-            'an_signed': 'application',
-            'approved': 'application',
-            'realized': 'application',
-            'finished': 'application',
-            }
-
-        interaction_type = inter_dict[interaction]
-        if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-            
-        if interaction_type == 'person':
-            return self.get_person_interactions(interaction, officeID, program, start_date, end_date, filters)
-        elif interaction_type == 'application':
-            return self.get_application_interactions(interaction, officeID, program, start_date, end_date, filters)
+    def get_past_interactions(self, interaction, days, officeID, today=True, program='ogx', filters=None, stream=False):
+        start_date, end_date = self._past_range(days, today)
+        return self.get_interactions(interaction, officeID, program, start_date, end_date, filters, stream)
+
+    def get_interactions(self, interaction, officeID, program, start_date, end_date=None, filters=None, stream=False, fields=None, records=False):
+        """
+        Returns the people or applications of an office that had an interaction between two dates, as a dict with their 'total' and the 'items' themselves
+        stream: If True, 'items' is an iterator that requests the pages as they are read and decodes their records one by one, instead of a list
+        fields: The fields of each item to keep, as accepted by jsonstream.project, i.e. ['id', {'person': ['id', 'email']}]. None keeps them whole
+        records: If True, the items are records.Person or records.Application records, and fields are the names of the fields they keep, i.e. ['id', 'email']
+        """
+        routes, query_args = self._interaction_query(interaction, officeID, program, start_date, end_date, filters)
+        if records:
+            record_class, record_fields = self._interaction_record(routes), fields
+            fields = record_class.payload_fields(record_fields)
+        total, items = self._paginate(routes, query_args, stream, fields)
+        if records:
+            items = iter_records(items, record_class, record_fields)
+            if not stream:
+                items = list(items)
+        totals = {}
+        totals['total'] = total
+        totals['items'] = items
+        return totals
 
-    def get_person_interactions(self, interaction, officeID, program, start_date, end_date, filters):
+    def get_person_interactions(self, interaction, officeID, program, start_date, end_date, filters, stream=False):
         """
         This method queries the API for the people who have interacted with EXPA and the OP in some way, such as signing in, being contacted or being interviewed.
         params:
@@ -650,32 +1314,20 @@ class ExpaApi(object):
             days: How many days further back you want to poll EXPA and get data from
             office: The AIESEC office you want to filter for
             today: Whether you want to include today's date or not
+            stream: If True, 'items' is an iterator that requests the pages as they are read, instead of a list
         """
-        if not filters:
-            filters = {}
-        inter_dict = {
-            'registered': 'registered',
-            'contacted': 'contacted_at',
-            }
-        query_args = {
-            'filters[%s[from]]' % inter_dict[interaction]:start_date,
-            'filters[%s[to]]' % inter_dict[interaction]:end_date,
-            'filters[home_committee]':officeID,
-            'page':1,
-            'per_page':500,
-        }
-        query_args.update(filters)
-        data = self.make_query(['people.json',], query_args)
+        query_args = self._person_interactions_args(interaction, officeID, program, start_date, end_date, filters)
+        total, items = self._paginate(['people.json'], query_args, stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['items'] = data['data']
+        totals['total'] = total
+        totals['items'] = items
         return totals
 
 
 ###########################
 #Methods that deal with extracting information from the applications API
 ###########################
-    def get_application_interactions(self, interaction, officeID, program, start_date, end_date, filters):
+    def get_application_interactions(self, interaction, officeID, program, start_date, end_date, filters, stream=False):
         """
         This method queries the API for the people who have interacted with EXPA and the OP in some way, such as signing in, being contacted or being interviewed.
         params:
@@ -683,34 +1335,13 @@ class ExpaApi(object):
             days: How many days further back you want to poll EXPA and get data from
             office: The AIESEC office you want to filter for
             today: Whether you want to include today's date or not
+            stream: If True, 'items' is an iterator that requests the pages as they are read, instead of a list
         """
-        if not filters:
-            filters = {}
-        inter_dict = {
-            'applied': 'created_at',
-            'accepted': 'date_matched',
-            'an_signed': 'date_an_signed',
-            'approved': 'date_approved',
-            'realized': 'date_realized',
-            'finished': 'experience_end_date',
-            }
-        query_args = {
-            'filters[%s[from]]' % inter_dict[interaction]: start_date,
-            'filters[%s[to]]' % inter_dict[interaction]: end_date,
-            'filters[programmes][]': self.programDict[program[1:]],
-            'page': 1,
-            'per_page': 500,
-        }
-        query_args.update(filters)
-        if program[0] == 'o':
-            query_args['filters[for]'] = 'people'
-            query_args['filters[person_committee]'] = officeID
-        elif program[0] == 'i':
-            query_args['filters[opportunity_committee]'] = officeID
-        data = self.make_query(['applications.json',], query_args)
+        query_args = self._application_interactions_args(interaction, officeID, program, start_date, end_date, filters)
+        total, items = self._paginate(['applications.json'], query_args, stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['items'] = data['data']
+        totals['total'] = total
+        totals['items'] = items
         return totals
 
 ### Utils para el MC. Mayor obtención de datos, y el año comienza desde julio
@@ -718,79 +1349,25 @@ class ExpaApi(object):
         """
         Extrae el ma/re de el año MC actual (comenzando el anterior 1 de Julio, para un comité y uno de los 4 programas
         """
-        now = datetime.now()
-        currentYear = int(now.strftime('%Y'))
-        if int(now.strftime('%m')) < 8:
-            currentYear -= 1
-        start_date = "%d-08-01" % currentYear
-        end_date = now.strftime('%Y-%m-%d')
-
+        start_date, end_date = self._year_start_range(8)
         return self.get_stats(office_id, program, start_date, end_date)
 
     def getCountryCurrentMCYearStats(self, program, mc=1551):
         """
         Extrae el ma/re de el año actual, para un comité y uno de los 4 programas
         """
-        now = datetime.now()
-        currentYear = int(now.strftime('%Y'))
-        if int(now.strftime('%m')) < 6:
-            currentYear -= 1
-        startDate = "%d-07-01" % currentYear
-
-        endDate = now.strftime('%Y-%m-%d')
-
-        queryArgs = {
-            'basic[home_office_id]':mc,
-            'basic[type]':self.ioDict[program[0].lower()],
-            'end_date':endDate,
-            'programmes[]':self.programDict[program[1:].lower()],
-            'start_date':startDate
-        }
-        query = self._buildQuery(['applications', 'analyze.json'], queryArgs)
-        try:
-            mcData = json.loads(requests.get(query).text)['analytics']
-            lcData = mcData['children']['buckets']
-            response = {}
-            for lc in lcData:
-                response[lc['key']] = {
-                    'applications': lc['total_applications']['doc_count'],
-                    'accepted': lc['total_matched']['doc_count'],
-                    'approved': lc['total_approvals']['doc_count'],
-                    'realized': lc['total_realized']['doc_count'],
-                    'completed': lc['total_completed']['doc_count'],
-		}
-            response[mc] = {
-                    'applications': mcData['total_applications']['doc_count'],
-                    'accepted': mcData['total_matched']['doc_count'],
-                    'approved': mcData['total_approvals']['doc_count'],
-                    'realized': mcData['total_realized']['doc_count'],
-                    'completed': mcData['total_completed']['doc_count'],
-                }
-
-        except KeyError as e:
-            print("Error de llave:")
-            print(e)
-            print(json.loads(requests.get(query).text))
-            raise e
-        return response
+        data = self.make_query(['applications', 'analyze.json'], self._country_mc_year_args(program, mc))
+        return self._parse_country_mc_year(mc, data)
 
-    def get_companies(self, officeID, program, start_date, end_date):
+    def get_companies(self, officeID, program, start_date, end_date, stream=False):
         """
         This method is still on progress
         TODO: FInish it
         """
-        query_args = {
-            'filters[registered[from]]':start_date,
-            'filters[registered[to]]':end_date,
-            'page':1,
-            'per_page':500,
-        }
-        if program is not None:
-            query_args['filters[programmes][]']=self.programDict[program],
-        data = self.make_query(['organisations.json'], query_args)
+        total, items = self._paginate(['organisations.json'], self._companies_args(program, start_date, end_date), stream)
         totals = {}
-        totals['total'] = data['paging']['total_items']
-        totals['items'] = data['data']
+        totals['total'] = total
+        totals['items'] = items
         return totals
 
     def lda_report(self, id, id_type, *args, **kwargs):
@@ -802,35 +1379,8 @@ class ExpaApi(object):
         """
         Este método extrae las estadísticas, para una oficina dada y un periodo de tiempo dado. Es un método maestro, y todos los otros métodos que obtengan dichas estadísticas deberían llamar a este.
         """
-        query_args = {
-            'entity_to_entity[person_committee]': home_office_id,
-            'entity_to_entity[opportunity_committee]': host_office_id,
-            'programmes[]': self.programDict[program[1:].lower()],
-            'start_date': start_date,
-        }
-        if end_date is None:
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        query_args['end_date'] = end_date
+        query_args = self._e2e_query_args(home_office_id, host_office_id, program, start_date, end_date)
         try:
-            response = self.make_query(['applications', 'analyze.json'], query_args)['analytics']
-            return {
-                'applications': response['total_applications']['doc_count'],
-                'applied': response['total_applications']['applicants']['value'],
-                'acceptances': response['total_matched']['doc_count'],
-                'accepted': response['total_matched']['unique_profiles']['value'],
-                'approved': response['total_approvals']['doc_count'],
-                'realized': response['total_realized']['doc_count'],
-                'finished': response['total_finished']['doc_count'],
-                'completed': response['total_completed']['doc_count'],
-            }
+            return self._parse_e2e(self.make_query(['applications', 'analyze.json'], query_args)['analytics'])
         except APIUnavailableException:
-            return {
-                'applications': "EXPA ERROR",
-                'applied': "EXPA ERROR",
-                'acceptances': "EXPA ERROR",
-                'accepted': "EXPA ERROR",
-                'approved':" EXPA ERROR",
-                'realized': "EXPA ERROR",
-                'finished': "EXPA ERROR",
-                'completed': "EXPA ERROR",
-            }
+            return self._e2e_error()
@@ -0,0 +1,72 @@
+# coding=utf-8
+"""
+Module containing the builders of the GraphQL documents sent to the GIS API, and the readers of their responses
+"""
+from __future__ import unicode_literals
+
+# Fields of a person requested when none are given
+PERSON_FIELDS = ['id', 'full_name', {'lc_alignment': ['keywords']}]
+PAGING_FIELDS = ['total_pages', 'current_page', 'total_items']
+
+
+def selection(fields):
+    """
+    Builds a GraphQL selection set from a list of field names. A dict in the list selects the subfields of each of its keys, i.e. ['id', {'home_lc': ['id', 'name']}] gives 'id home_lc { id name }'
+    """
+    parts = []
+    for field in fields:
+        if isinstance(field, dict):
+            for name, subfields in field.items():
+                parts.append('%s { %s }' % (name, selection(subfields)))
+        else:
+            parts.append(field)
+    return ' '.join(parts)
+
+
+def people_query(person_ids, fields=None):
+    """
+    Builds a single document which looks up several people at once, with one aliased getPerson per id: p0, p1...
+    """
+    fields = selection(fields or PERSON_FIELDS)
+    aliases = ['p%d' % i for i in range(len(person_ids))]
+    return {
+        'query': 'query PeopleQuery(%s) { %s }' % (
+            ' '.join('$%s: ID' % alias for alias in aliases),
+            ' '.join('%s: getPerson(id: $%s) { %s }' % (alias, alias, fields) for alias in aliases)),
+        'variables': dict((alias, str(person_id)) for alias, person_id in zip(aliases, person_ids)),
+    }
+
+
+def parse_people(payload, count):
+    """
+    Returns the people of a people_query response, in the order of their ids; None for those which were not found.
+    The objects are taken as they are from the decoded response, without copying them.
+    """
+    data = payload.get('data') or {}
+    return [data.get('p%d' % i) for i in range(count)]
+
+
+def all_people_query(fields=None, page=1, per_page=100, filters=None, q=None, sort='-created_at'):
+    """
+    Builds the document of a page of allPeople, with the given fields of each person and its paging
+    """
+    return {
+        'query': 'query PeopleIndexQuery($page: Int $perPage: Int $filters: PeopleFilter $q: String $sort: String) { allPeople(page: $page, per_page: $perPage, q: $q, filters: $filters, sort: $sort) { data { %s } paging { %s } } }' % (
+            selection(fields or PERSON_FIELDS), selection(PAGING_FIELDS)),
+        'variables': {'page': page, 'perPage': per_page, 'filters': filters or {}, 'q': q, 'sort': sort},
+    }
+
+
+def parse_all_people(payload):
+    """
+    Returns the people and the paging of an all_people_query response
+    """
+    people = payload['data']['allPeople']
+    return people['data'], people['paging']
+
+
+def errors(payload):
+    """
+    Returns the messages of the errors of a GraphQL response, which can come along with partial data
+    """
+    return [error.get('message', '') for error in payload.get('errors') or []]
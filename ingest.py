@@ -0,0 +1,98 @@
+# coding=utf-8
+"""
+Module containing the bulk writing of EXPA records into local models
+"""
+from __future__ import unicode_literals
+import time
+from itertools import islice
+
+
+def batches(iterable, size):
+    """
+    Yields lists of up to size consecutive items of an iterable, without reading more than one list ahead
+    """
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class BulkWriter(object):
+    """
+    Inserts or updates rows of a model, given as dicts of fields that include its primary key,
+    with a few queries per batch and inside one transaction per batch.
+    On Django 4.1 and later every batch is a single INSERT ... ON CONFLICT DO UPDATE
+    (bulk_create with update_conflicts). On earlier versions the existing rows are looked up
+    first, and the batch is split into one bulk_create and one bulk_update.
+
+    model: The model the rows belong to
+    using: The database alias where they are written
+    """
+    def __init__(self, model, using=None):
+        import django
+        self.model = model
+        self.using = using
+        self.pk_name = model._meta.pk.name
+        self.update_conflicts = django.VERSION >= (4, 1)
+
+    def write(self, rows):
+        """
+        Writes a batch of rows. If a row appears several times, the last one wins.
+        Returns a (created, updated) tuple, or (None, None) when the database does not tell them apart.
+        """
+        from django.db import transaction
+        rows = list(dict((row[self.pk_name], row) for row in rows).values())
+        if not rows:
+            return 0, 0
+        fields = [field for field in rows[0] if field != self.pk_name]
+        manager = self.model._default_manager.db_manager(self.using)
+        with transaction.atomic(using=self.using):
+            if self.update_conflicts:
+                manager.bulk_create(
+                    [self.model(**row) for row in rows],
+                    update_conflicts=True, unique_fields=[self.pk_name], update_fields=fields)
+                return None, None
+            existing = manager.in_bulk([row[self.pk_name] for row in rows])
+            new = []
+            changed = []
+            for row in rows:
+                instance = existing.get(row[self.pk_name])
+                if instance is None:
+                    new.append(self.model(**row))
+                else:
+                    for field in fields:
+                        setattr(instance, field, row[field])
+                    changed.append(instance)
+            if new:
+                manager.bulk_create(new)
+            if changed:
+                manager.bulk_update(changed, fields)
+            return len(new), len(changed)
+
+
+def ingest(records, model, mapper, batch_size=500, using=None, on_batch=None):
+    """
+    Writes a stream of EXPA records, such as the items of a listing requested with stream=True, into a model.
+    Records are mapped to rows with mapper(record) and written in batches of batch_size, so only one batch is kept in memory at a time.
+    on_batch: A function called with the stats after every batch, to follow long ingestions
+    returns: A dict with how many rows were read, created and updated (these two are None when the database does not tell them apart), how many seconds it took and how many rows per second were written
+    """
+    writer = BulkWriter(model, using)
+    stats = {'rows': 0, 'batches': 0, 'created': 0, 'updated': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+    start = time.time()
+    for batch in batches((mapper(record) for record in records), batch_size):
+        created, updated = writer.write(batch)
+        stats['rows'] += len(batch)
+        stats['batches'] += 1
+        if created is None or stats['created'] is None:
+            stats['created'] = stats['updated'] = None
+        else:
+            stats['created'] += created
+            stats['updated'] += updated
+        stats['seconds'] = time.time() - start
+        stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0.0
+        if on_batch is not None:
+            on_batch(stats)
+    return stats
@@ -0,0 +1,229 @@
+# coding=utf-8
+"""
+Module containing the instrumentation of the calls to EXPA: every request sent by ExpaApi and AsyncExpaApi,
+and every GET query answered by the response cache, is reported as an event to a set of hooks, such as a logger,
+Prometheus-style counters or a Django signal
+"""
+from __future__ import unicode_literals
+import logging
+import re
+import threading
+
+try:
+    from urllib.parse import urlsplit
+except ImportError:
+    from urlparse import urlsplit
+
+logger = logging.getLogger('django_expa.requests')
+
+_TOKEN_RE = re.compile(r'((?:access_token|authenticity_token|password)[^=&]*=)[^&\s]*')
+_ID_RE = re.compile(r'/\d+(?=[/.]|$)')
+
+
+def redact(url):
+    """
+    Replaces the value of the access tokens, and of any other secret, in a URL
+    """
+    return _TOKEN_RE.sub(r'\1[REDACTED]', url)
+
+
+def route_template(url):
+    """
+    Returns the path of a URL with its numeric ids replaced by {id}, i.e. /v2/people/{id}.json, so all the requests to the same endpoint share it
+    """
+    return _ID_RE.sub('/{id}', urlsplit(url).path) or '/'
+
+
+def request_event(method, url, status=None, size=None, connect=None, ttfb=None, total=None, retries=0, cache=None, error=None):
+    """
+    Builds the event of a call to EXPA, as received by the hooks. Its keys are:
+    method, route (the route_template of the URL), url (with its tokens redacted), status (None if no answer was received),
+    bytes (the size of the body, as sent over the network), connect (the seconds spent opening a new connection, including
+    the DNS lookup and the TLS handshake; 0 if an open one was reused), ttfb (the seconds until the headers of the answer
+    arrived), total (the seconds the whole call took, including its retries), retries, cache ('hit', 'stale', 'coalesced',
+    'miss', or None when the response cache is not involved) and error (the description of the failure, if any).
+    The times that could not be measured are None.
+    """
+    return {
+        'method': method.upper(),
+        'route': route_template(url),
+        'url': redact(url),
+        'status': status,
+        'bytes': size,
+        'connect': connect,
+        'ttfb': ttfb,
+        'total': total,
+        'retries': retries,
+        'cache': cache,
+        'error': redact(error) if error else error,
+    }
+
+
+def response_size(response):
+    """
+    Returns the size of the body of a requests or httpx response, as sent over the network when the server tells it.
+    It is None for a requests response sent with stream=True whose body has not been read, as reading it here would
+    take it away from whoever streams it
+    """
+    length = response.headers.get('Content-Length')
+    if length is not None:
+        try:
+            return int(length)
+        except ValueError:
+            pass
+    if getattr(response, '_content', None) is False:
+        return None
+    try:
+        return len(response.content)
+    except Exception:
+        return None
+
+
+def log_hook(event):
+    """
+    Logs every event to the 'django_expa.requests' logger: successful calls at DEBUG level, failed ones at WARNING level
+    """
+    level = logging.WARNING if event['error'] else logging.DEBUG
+    if not logger.isEnabledFor(level):
+        return
+    milliseconds = event['total'] * 1000 if event['total'] is not None else 0
+    logger.log(level, "%s %s %s %sB %.1fms retries=%d cache=%s%s",
+               event['method'], event['route'], event['status'], event['bytes'], milliseconds,
+               event['retries'], event['cache'], ' error=' + event['error'] if event['error'] else '',
+               extra={'expa_event': event})
+
+
+def signal_hook(event):
+    """
+    Sends the signals.expa_request signal with every event
+    """
+    from .signals import expa_request
+    expa_request.send(sender=Instrumentation, event=event)
+
+
+class Metrics(object):
+    """
+    Prometheus-style counters and a latency histogram of the calls to EXPA, by route, method, status and cache status.
+    It is a hook itself; render() returns the metrics in the Prometheus text format, so they can be served to a scraper.
+    """
+    buckets = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}
+        self.bytes = {}
+        self.retries = {}
+        self.durations = {}
+
+    def __call__(self, event):
+        route = (event['route'], event['method'])
+        with self._lock:
+            labels = route + (str(event['status']), str(event['cache']))
+            self.requests[labels] = self.requests.get(labels, 0) + 1
+            if event['bytes']:
+                self.bytes[route] = self.bytes.get(route, 0) + event['bytes']
+            if event['retries']:
+                self.retries[route] = self.retries.get(route, 0) + event['retries']
+            if event['total'] is not None:
+                counts, total = self.durations.get(route, ([0] * (len(self.buckets) + 1), 0.0))
+                for i, bound in enumerate(self.buckets):
+                    if event['total'] <= bound:
+                        counts[i] += 1
+                counts[-1] += 1
+                self.durations[route] = (counts, total + event['total'])
+
+    def clear(self):
+        with self._lock:
+            self.requests.clear()
+            self.bytes.clear()
+            self.retries.clear()
+            self.durations.clear()
+
+    def render(self):
+        def labels(**values):
+            return '{%s}' % ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                                     for name, value in sorted(values.items()))
+        lines = ['# TYPE expa_requests_total counter']
+        with self._lock:
+            for (route, method, status, cache), count in sorted(self.requests.items()):
+                lines.append('expa_requests_total%s %d' % (labels(route=route, method=method, status=status, cache=cache), count))
+            lines.append('# TYPE expa_response_bytes_total counter')
+            for (route, method), size in sorted(self.bytes.items()):
+                lines.append('expa_response_bytes_total%s %d' % (labels(route=route, method=method), size))
+            lines.append('# TYPE expa_retries_total counter')
+            for (route, method), count in sorted(self.retries.items()):
+                lines.append('expa_retries_total%s %d' % (labels(route=route, method=method), count))
+            lines.append('# TYPE expa_request_duration_seconds histogram')
+            for (route, method), (counts, total) in sorted(self.durations.items()):
+                for bound, count in zip(self.buckets + ('+Inf',), counts):
+                    lines.append('expa_request_duration_seconds_bucket%s %d' % (labels(route=route, method=method, le=bound), count))
+                lines.append('expa_request_duration_seconds_sum%s %f' % (labels(route=route, method=method), total))
+                lines.append('expa_request_duration_seconds_count%s %d' % (labels(route=route, method=method), counts[-1]))
+        return '\n'.join(lines) + '\n'
+
+
+class Instrumentation(object):
+    """
+    Passes the events of the calls to EXPA to every registered hook. A hook is any function that takes the event;
+    if it fails, the error is logged and the call it reports is not affected.
+    """
+    def __init__(self, hooks=None):
+        self.hooks = list(hooks or [])
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    @property
+    def enabled(self):
+        return bool(self.hooks)
+
+    def emit(self, event):
+        for hook in self.hooks:
+            try:
+                hook(event)
+            except Exception:
+                logger.exception("The instrumentation hook %r has failed", hook)
+
+
+_metrics = None
+_instrumentation = None
+_lock = threading.Lock()
+
+
+def get_metrics():
+    """
+    Returns the Metrics shared by the whole process, which the 'metrics' hook feeds
+    """
+    global _metrics
+    with _lock:
+        if _metrics is None:
+            _metrics = Metrics()
+        return _metrics
+
+
+def get_instrumentation():
+    """
+    Returns the Instrumentation shared by the whole process, with the hooks named in the INSTRUMENTATION_HOOKS setting:
+    'logging', 'metrics', 'signal', or the dotted path of any other function
+    """
+    global _instrumentation
+    if _instrumentation is None:
+        from . import settings
+        hooks = []
+        for name in getattr(settings, 'INSTRUMENTATION_HOOKS', ['logging']):
+            if name == 'logging':
+                hooks.append(log_hook)
+            elif name == 'metrics':
+                hooks.append(get_metrics())
+            elif name == 'signal':
+                hooks.append(signal_hook)
+            else:
+                from django.utils.module_loading import import_string
+                hooks.append(import_string(name))
+        with _lock:
+            if _instrumentation is None:
+                _instrumentation = Instrumentation(hooks)
+    return _instrumentation
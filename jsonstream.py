@@ -0,0 +1,187 @@
+# coding=utf-8
+"""
+Module containing the incremental decoding of the JSON responses of the GIS API, which reads the records of
+their 'data' array one by one, as the response arrives, instead of decoding the whole page at once
+"""
+from __future__ import unicode_literals
+import codecs
+import json
+from collections import deque
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = ' \t\n\r'
+
+
+def project(item, fields):
+    """
+    Returns a copy of a record with only the given fields. As in graphql.selection, a dict in the list of fields projects the subfields of each of its keys,
+    i.e. ['id', {'person': ['id', 'full_name']}]. Lists of records are projected record by record. Fields the record does not have are left out.
+    """
+    if fields is None or not isinstance(item, dict):
+        return item
+    projected = {}
+    for field in fields:
+        if isinstance(field, dict):
+            for name, subfields in field.items():
+                if name in item:
+                    value = item[name]
+                    if isinstance(value, list):
+                        projected[name] = [project(element, subfields) for element in value]
+                    else:
+                        projected[name] = project(value, subfields)
+        elif field in item:
+            projected[field] = item[field]
+    return projected
+
+
+class JSONArrayStream(object):
+    """
+    Iterates over the records of an array of a JSON object, such as the 'data' of a listing page, decoding them
+    one by one from the chunks of text of the response. Only the text of the record being decoded is kept in
+    memory, and each record is projected to the given fields as soon as it is decoded.
+    The other keys of the object, such as 'paging', are kept in 'meta'. If one of them is asked for with get()
+    before the records that come ahead of it have been read, those records are kept until they are.
+
+    chunks: An iterable of text chunks, i.e. response.iter_content(decode_unicode=True)
+    key: The key of the array whose records are streamed
+    fields: The fields each record is projected to, as accepted by project. None keeps them whole
+    close: A function called once the object has been read, or when the iteration is abandoned
+    """
+    def __init__(self, chunks, key='data', fields=None, close=None):
+        self.key = key
+        self.fields = fields
+        self.meta = {}
+        self._chunks = iter(chunks)
+        self._close = close
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._pending = deque()
+        self._events = self._parse()
+
+    def _more(self):
+        """
+        Appends the next chunk to the buffer, dropping the text already decoded. Returns False at the end of the response
+        """
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            if chunk:
+                self._buffer = self._buffer[self._pos:] + chunk
+                self._pos = 0
+                return True
+        self._eof = True
+        return False
+
+    def _peek(self):
+        """
+        Skips the whitespace and returns the next character, or '' at the end of the response
+        """
+        while True:
+            while self._pos < len(self._buffer) and self._buffer[self._pos] in _WHITESPACE:
+                self._pos += 1
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._more():
+                return ''
+
+    def _expect(self, characters):
+        character = self._peek()
+        if character not in characters:
+            raise ValueError("Expected one of %r at position %d of the JSON stream, found %r" % (characters, self._pos, character))
+        self._pos += 1
+        return character
+
+    def _value(self):
+        """
+        Decodes the next value, reading more chunks until it is complete
+        """
+        self._peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except ValueError:
+                if not self._more():
+                    raise
+                continue
+            # A number at the end of the buffer may go on in the next chunk
+            if end == len(self._buffer) and not self._eof and self._more():
+                continue
+            self._pos = end
+            return value
+
+    def _parse(self):
+        """
+        Yields ('item', record) for every record of the array, and ('meta', key) after reading any other key
+        """
+        try:
+            self._expect('{')
+            if self._peek() == '}':
+                return
+            while True:
+                name = self._value()
+                self._expect(':')
+                if name == self.key and self._peek() == '[':
+                    self._pos += 1
+                    if self._peek() == ']':
+                        self._pos += 1
+                    else:
+                        while True:
+                            yield 'item', project(self._value(), self.fields)
+                            if self._expect(',]') == ']':
+                                break
+                else:
+                    self.meta[name] = self._value()
+                    yield 'meta', name
+                if self._expect(',}') == '}':
+                    return
+        finally:
+            self.close()
+
+    def get(self, name, default=None):
+        """
+        Returns the value of another key of the object, such as 'paging', reading ahead until it is found.
+        A key that comes after the array, as 'paging' does in the listings of the GIS API, can only be found by decoding the whole array,
+        so if it is asked for before the records have been iterated, all of them are kept in memory until they are. Ask for it once they have been read.
+        """
+        while name not in self.meta:
+            try:
+                kind, value = next(self._events)
+            except StopIteration:
+                break
+            if kind == 'item':
+                self._pending.append(value)
+        return self.meta.get(name, default)
+
+    def __iter__(self):
+        while self._pending:
+            yield self._pending.popleft()
+        for kind, value in self._events:
+            if kind == 'item':
+                yield value
+
+    def close(self):
+        if self._close is not None:
+            close, self._close = self._close, None
+            close()
+
+
+def stream_response(response, key='data', fields=None, chunk_size=64 * 1024, on_close=None):
+    """
+    Returns a JSONArrayStream over the body of a requests response sent with stream=True, which is closed once it is read
+    on_close: A function called with the number of bytes of the body that were read, once the response is closed
+    """
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    read = [0]
+
+    def chunks():
+        for chunk in response.iter_content(chunk_size=chunk_size):
+            read[0] += len(chunk)
+            yield decoder.decode(chunk)
+        yield decoder.decode(b'', final=True)
+
+    def close():
+        response.close()
+        if on_close is not None:
+            on_close(read[0])
+    return JSONArrayStream(chunks(), key, fields, close)
@@ -0,0 +1,26 @@
+# coding=utf-8
+from __future__ import unicode_literals
+from django.core.management.base import BaseCommand
+from django_expa.expaApi import ExpaApi
+from django_expa.sync import SyncEngine, PERSON_INTERACTIONS, APPLICATION_INTERACTIONS
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza con la base de datos local las personas y aplicaciones de EXPA que han tenido interacciones desde la última ejecución'
+
+    def add_arguments(self, parser):
+        parser.add_argument('office_ids', nargs='+', type=int, help='EXPA ids of the offices to synchronize')
+        parser.add_argument('--interaction', action='append', dest='interactions', choices=sorted(list(PERSON_INTERACTIONS) + list(APPLICATION_INTERACTIONS)), help='Interactions to synchronize. By default, all of them')
+        parser.add_argument('--program', action='append', dest='programs', help='Programs of the application interactions, such as ogv or igt. By default, ogx')
+        parser.add_argument('--account', default=None, help='EXPA account used to query the API. By default, DEFAULT_ACCOUNT')
+
+    def handle(self, *args, **options):
+        engine = SyncEngine(ExpaApi(options['account']))
+        interactions = options['interactions'] or list(PERSON_INTERACTIONS) + list(APPLICATION_INTERACTIONS)
+        programs = options['programs'] or ['ogx']
+        for office_id in options['office_ids']:
+            for interaction in interactions:
+                # People are not split by program
+                for program in (programs if interaction in APPLICATION_INTERACTIONS else ['ogx']):
+                    result = engine.sync(interaction, office_id, program)
+                    self.stdout.write('%(office_id)s %(interaction)s %(program)s %(start_date)s..%(end_date)s: %(fetched)s fetched, %(created)s created, %(updated)s updated, %(rows_per_second).0f rows/s' % result)
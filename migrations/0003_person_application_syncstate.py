@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_expa', '0002_accesstoken'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Person',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('full_name', models.CharField(blank=True, max_length=255)),
+                ('email', models.CharField(blank=True, max_length=255)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('home_lc_id', models.IntegerField(db_index=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, null=True)),
+                ('contacted_at', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(null=True)),
+                ('raw', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Application',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(blank=True, max_length=50)),
+                ('person_id', models.IntegerField(db_index=True, null=True)),
+                ('opportunity_id', models.IntegerField(db_index=True, null=True)),
+                ('programme_id', models.IntegerField(null=True)),
+                ('home_lc_id', models.IntegerField(db_index=True, null=True)),
+                ('host_lc_id', models.IntegerField(db_index=True, null=True)),
+                ('created_at', models.DateTimeField(db_index=True, null=True)),
+                ('date_matched', models.DateTimeField(null=True)),
+                ('date_an_signed', models.DateTimeField(null=True)),
+                ('date_approved', models.DateTimeField(null=True)),
+                ('date_realized', models.DateTimeField(null=True)),
+                ('experience_end_date', models.DateTimeField(null=True)),
+                ('updated_at', models.DateTimeField(null=True)),
+                ('raw', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SyncState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('office_id', models.IntegerField()),
+                ('interaction', models.CharField(max_length=20)),
+                ('program', models.CharField(max_length=10)),
+                ('high_water_mark', models.DateField(null=True)),
+                ('last_run', models.DateTimeField(null=True)),
+                ('last_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='syncstate',
+            unique_together=set([('office_id', 'interaction', 'program')]),
+        ),
+    ]
@@ -1,6 +1,7 @@
 #coding:utf-8
 from __future__ import unicode_literals
 import base64
+import json
 from django.db import models
 from django.utils.encoding import python_2_unicode_compatible
 
@@ -13,7 +14,71 @@ class LoginData(models.Model):
     def save(self, *args, **kwargs):
         self.password = base64.b64encode(self.password.encode())
         super(LoginData, self).save(*args, **kwargs)
-        
-        
+
+@python_2_unicode_compatible
+class AccessToken(models.Model):
+    """Último token de acceso obtenido para una cuenta, usado cuando TOKEN_CACHE_BACKEND es 'database'"""
+    account = models.EmailField(primary_key=True)
+    token = models.CharField(max_length=255)
+    expires_at = models.DateTimeField()
+    def __str__(self):
+        return self.account
+
+@python_2_unicode_compatible
+class Person(models.Model):
+    """Copia local de una persona de EXPA (people.json), mantenida por sync.SyncEngine"""
+    id = models.IntegerField(primary_key=True)
+    full_name = models.CharField(max_length=255, blank=True)
+    email = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=50, blank=True)
+    home_lc_id = models.IntegerField(null=True, db_index=True)
+    created_at = models.DateTimeField(null=True, db_index=True)
+    contacted_at = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(null=True)
+    raw = models.TextField(blank=True)
+    def __str__(self):
+        return self.full_name or str(self.id)
+    @property
+    def payload(self):
+        return json.loads(self.raw) if self.raw else {}
+
+@python_2_unicode_compatible
+class Application(models.Model):
+    """Copia local de una aplicación de EXPA (applications.json), mantenida por sync.SyncEngine"""
+    id = models.IntegerField(primary_key=True)
+    status = models.CharField(max_length=50, blank=True)
+    person_id = models.IntegerField(null=True, db_index=True)
+    opportunity_id = models.IntegerField(null=True, db_index=True)
+    programme_id = models.IntegerField(null=True)
+    home_lc_id = models.IntegerField(null=True, db_index=True)
+    host_lc_id = models.IntegerField(null=True, db_index=True)
+    created_at = models.DateTimeField(null=True, db_index=True)
+    date_matched = models.DateTimeField(null=True)
+    date_an_signed = models.DateTimeField(null=True)
+    date_approved = models.DateTimeField(null=True)
+    date_realized = models.DateTimeField(null=True)
+    experience_end_date = models.DateTimeField(null=True)
+    updated_at = models.DateTimeField(null=True)
+    raw = models.TextField(blank=True)
+    def __str__(self):
+        return str(self.id)
+    @property
+    def payload(self):
+        return json.loads(self.raw) if self.raw else {}
+
+@python_2_unicode_compatible
+class SyncState(models.Model):
+    """Hasta qué fecha se han sincronizado las interacciones de un tipo, para una oficina y un programa"""
+    office_id = models.IntegerField()
+    interaction = models.CharField(max_length=20)
+    program = models.CharField(max_length=10)
+    high_water_mark = models.DateField(null=True)
+    last_run = models.DateTimeField(null=True)
+    last_count = models.IntegerField(default=0)
+    class Meta:
+        unique_together = ('office_id', 'interaction', 'program')
+    def __str__(self):
+        return '%s %s %s' % (self.office_id, self.interaction, self.program)
+
 
 # Create your models here.
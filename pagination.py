@@ -0,0 +1,163 @@
+# coding=utf-8
+"""
+Module containing the Paginator, which walks through all the pages of the GIS API listing endpoints
+"""
+from __future__ import unicode_literals
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from . import concurrency
+from .jsonstream import project
+
+
+class Paginator(object):
+    """
+    Iterates lazily over all the records of a listing endpoint, such as people.json or
+    applications.json. Pages are requested as they are needed, and only the pages being
+    read or prefetched are kept in memory. When streaming, not even those: the records of each
+    page are decoded one by one as its response arrives, and are not kept in the response cache.
+
+    api: The ExpaApi instance used to make the queries
+    routes: The route of the listing, as given to make_query
+    query_params: The filters of the listing. 'page' and 'per_page' are set by the paginator
+    per_page: How many records are requested per page
+    prefetch: How many of the following pages are requested in the background while the current one is being read. Ignored when streaming
+    fields: The fields each record is projected to, as accepted by jsonstream.project. None keeps them whole
+    streaming: Whether the records are decoded one by one, with ExpaApi.stream_query, instead of a page at a time
+    """
+    def __init__(self, api, routes, query_params=None, per_page=500, prefetch=0, fields=None, streaming=False):
+        self.api = api
+        self.routes = routes
+        self.query_params = dict(query_params or {})
+        self.per_page = per_page
+        self.prefetch = prefetch
+        self.fields = fields
+        self.streaming = streaming
+        self._paging = None
+        self._first_data = None
+
+    def _page_params(self, page):
+        query_params = dict(self.query_params)
+        query_params['page'] = page
+        query_params['per_page'] = self.per_page
+        return query_params
+
+    def fetch_page(self, page):
+        """
+        Returns the raw response of one of the pages of the listing
+        """
+        return self.api.make_query(self.routes, self._page_params(page))
+
+    def stream_page(self, page):
+        """
+        Returns a jsonstream.JSONArrayStream over the records of one of the pages of the listing
+        """
+        return self.api.stream_query(self.routes, self._page_params(page), self.fields)
+
+    def _page_data(self, page):
+        """
+        Returns the records of a page, projected to the paginator's fields: an iterator over them when streaming, and a list otherwise
+        """
+        if self.streaming:
+            return self.stream_page(page)
+        data = self.fetch_page(page)['data']
+        if self.fields is None:
+            return data
+        return [project(item, self.fields) for item in data]
+
+    def _load_first_page(self):
+        if self.streaming:
+            # Its paging comes after its records, so it is only read once they have been
+            return self.stream_page(1)
+        response = self.fetch_page(1)
+        self._paging = response['paging']
+        data = response['data']
+        return data if self.fields is None else [project(item, self.fields) for item in data]
+
+    @property
+    def paging(self):
+        """
+        The paging block of the listing, as returned in its first page.
+        When streaming, if it is needed before the first page has been read, only its total_items is known: it is taken from a separate
+        request of a single record, as reading the paging of the first page would mean keeping all of its records until they are iterated
+        """
+        if self._paging is None:
+            if self.streaming:
+                paging = self.api.make_query(self.routes, dict(self._page_params(1), per_page=1))['paging']
+                # Its total_pages counts pages of a single record, so it is left for total_pages to compute
+                self._paging = {'total_items': paging['total_items']}
+            else:
+                self._first_data = self._load_first_page()
+        return self._paging
+
+    @property
+    def total_items(self):
+        return self.paging['total_items']
+
+    @property
+    def total_pages(self):
+        paging = self.paging
+        if paging.get('total_pages') is not None:
+            return paging['total_pages']
+        return -(-paging['total_items'] // self.per_page)
+
+    def pages(self):
+        """
+        Yields the records of every page, in order: a list per page or, when streaming, an iterator
+        """
+        if self._first_data is not None:
+            data, self._first_data = self._first_data, None
+        else:
+            data = self._load_first_page()
+        yield data
+        if self._paging is None:
+            # Streaming: the first page has been read by now, its paging included
+            self._paging = data.get('paging') or {}
+        remaining = range(2, self.total_pages + 1)
+        if not self.prefetch or self.streaming:
+            for page in remaining:
+                yield self._page_data(page)
+            return
+        executor = ThreadPoolExecutor(max_workers=self.prefetch)
+        pending = deque()
+        remaining = iter(remaining)
+        try:
+            for page in remaining:
+                pending.append(executor.submit(self.fetch_page, page))
+                if len(pending) == self.prefetch:
+                    break
+            while pending:
+                data = pending.popleft().result()['data']
+                if self.fields is not None:
+                    data = [project(item, self.fields) for item in data]
+                for page in remaining:
+                    pending.append(executor.submit(self.fetch_page, page))
+                    break
+                yield data
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    def fetch_all(self, max_workers=8):
+        """
+        Returns a list with all the records of the listing, in order. Once the first page tells how many pages there are, the rest of them are requested in parallel, using at most max_workers threads, so the whole listing takes about as long as its slowest page.
+        If any page fails, its error is raised.
+        """
+        if self._first_data is not None:
+            data, self._first_data = self._first_data, None
+        else:
+            data = self._load_first_page()
+        items = list(data)
+        if self._paging is None:
+            self._paging = data.get('paging') or {}
+        results = concurrency.bounded_map(lambda page: list(self._page_data(page)), range(2, self.total_pages + 1), max_workers)
+        for data, error in results:
+            if error is not None:
+                raise error
+            items.extend(data)
+        return items
+
+    def __iter__(self):
+        for data in self.pages():
+            for item in data:
+                yield item
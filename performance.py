@@ -0,0 +1,139 @@
+# coding=utf-8
+"""
+Module containing PerformanceSeries, the stats of several offices, programs and periods kept in a single NumPy array,
+so totals, cumulative sums, period-over-period deltas and the aggregation of several offices are array operations.
+NumPy is only imported when a series is built, so the rest of django_expa works without it.
+"""
+from __future__ import unicode_literals
+from .records import StatsCell
+
+AXES = ('office', 'program', 'period', 'metric')
+
+
+def numpy():
+    """
+    Returns the numpy module, which the performance series need
+    """
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("The performance series of django_expa require NumPy, install it using pip install numpy")
+    return numpy
+
+
+class PerformanceSeries(object):
+    """
+    The stats of every office, program and period given, as an array of integers whose axes are
+    office × program × period × metric, in the order of the lists of labels of each axis.
+    The cells whose query failed are 0 in 'values' and True in 'missing', whose axes are office × program × period.
+
+    offices: The ids of the offices
+    programs: The programs, such as 'ogv'
+    periods: The (start_date, end_date) tuples of the periods, in order
+    metrics: The metrics kept, out of StatsCell.METRICS
+    """
+    def __init__(self, offices, programs, periods, metrics=StatsCell.METRICS, values=None, missing=None):
+        np = numpy()
+        self.offices = list(offices)
+        self.programs = list(programs)
+        self.periods = [tuple(period) for period in periods]
+        self.metrics = list(metrics)
+        shape = (len(self.offices), len(self.programs), len(self.periods), len(self.metrics))
+        self.values = np.zeros(shape, dtype=np.int64) if values is None else np.asarray(values, dtype=np.int64).reshape(shape)
+        self.missing = np.zeros(shape[:3], dtype=bool) if missing is None else np.asarray(missing, dtype=bool).reshape(shape[:3])
+
+    @classmethod
+    def from_stats(cls, stats, offices, programs, periods, metrics=StatsCell.METRICS):
+        """
+        Builds a series from the answer of get_stats_matrix for every (office, program, start_date, end_date) cell of the given labels.
+        Its values may be StatsCells, as returned with records=True, or the dicts of get_stats
+        """
+        np = numpy()
+        columns = [StatsCell.METRICS.index(metric) for metric in metrics]
+        rows = []
+        missing = []
+        for office in offices:
+            for program in programs:
+                for start_date, end_date in periods:
+                    cell = stats[(office, program, start_date, end_date)]
+                    if not isinstance(cell, StatsCell):
+                        cell = StatsCell.from_stats(cell)
+                    rows.append(cell.values if not cell.error else [0] * len(StatsCell.METRICS))
+                    missing.append(cell.error)
+        values = np.array(rows, dtype=np.int64).reshape(-1, len(StatsCell.METRICS))[:, columns]
+        return cls(offices, programs, periods, metrics, values, missing)
+
+    def _copy(self, values, missing, **labels):
+        return type(self)(labels.get('offices', self.offices), labels.get('programs', self.programs), labels.get('periods', self.periods),
+                          self.metrics, values, missing)
+
+    def _index(self, axis, label):
+        labels = getattr(self, axis + 's')
+        try:
+            return labels.index(label)
+        except ValueError:
+            raise KeyError("The series has no %s %r" % (axis, label))
+
+    def get(self, office=None, program=None, period=None, metric=None):
+        """
+        Returns the values of the given labels, as an array which keeps the axes whose label was not given, in their order.
+        i.e. get(office=1395, program='ogv', metric='accepted') is the array of its values in every period
+        """
+        labels = (office, program, period, metric)
+        index = tuple(slice(None) if label is None else self._index(axis, label) for axis, label in zip(AXES, labels))
+        return self.values[index]
+
+    def tolist(self, office, program, metric, missing=None):
+        """
+        Returns the values of an office, program and metric in every period, as a list of ints in which the missing ones are replaced by the given value
+        """
+        values = self.get(office, program, metric=metric).tolist()
+        gaps = self.missing[self._index('office', office), self._index('program', program)]
+        return [missing if gap else value for value, gap in zip(values, gaps)]
+
+    def complete_periods(self, office=None, program=None):
+        """
+        Returns how many periods there are before the first one with a missing cell, for the given office and program or for all of them
+        """
+        np = numpy()
+        index = (slice(None) if office is None else [self._index('office', office)],
+                 slice(None) if program is None else [self._index('program', program)])
+        gaps = self.missing[index].any(axis=(0, 1))
+        return int(np.argmax(gaps)) if gaps.any() else len(self.periods)
+
+    def head(self, count):
+        """
+        Returns a series with only the first count periods
+        """
+        return self._copy(self.values[:, :, :count], self.missing[:, :, :count], periods=self.periods[:count])
+
+    def total(self):
+        """
+        Returns a series with a single period, from the start of the first period to the end of the last one, whose values are the sums of all of them
+        """
+        periods = [(self.periods[0][0], self.periods[-1][1])] if self.periods else [(None, None)]
+        return self._copy(self.values.sum(axis=2, keepdims=True), self.missing.any(axis=2, keepdims=True), periods=periods)
+
+    def cumulative(self):
+        """
+        Returns a series whose values in each period are the sums of all the periods up to it
+        """
+        return self._copy(self.values.cumsum(axis=2), self.missing.cumsum(axis=2) > 0)
+
+    def deltas(self):
+        """
+        Returns a series whose values in each period are their change since the previous period. Those of the first period are its values
+        """
+        np = numpy()
+        missing = self.missing.copy()
+        missing[:, :, 1:] |= self.missing[:, :, :-1]
+        return self._copy(np.diff(self.values, axis=2, prepend=0), missing)
+
+    def aggregate(self, office=None):
+        """
+        Returns a series with a single office, labelled with the given id, whose values are the sums of all the offices
+        """
+        return self._copy(self.values.sum(axis=0, keepdims=True), self.missing.any(axis=0, keepdims=True), offices=[office])
+
+    def __repr__(self):
+        return '<PerformanceSeries %d offices x %d programs x %d periods x %d metrics>' % self.values.shape
@@ -0,0 +1,255 @@
+# coding=utf-8
+"""
+Module containing the client-side rate limiter shared by every request sent to the GIS API
+"""
+from __future__ import unicode_literals
+import re
+import sqlite3
+import threading
+import time
+
+# Requests per second, how many of them may be sent at once after a quiet period, and how many
+# may be waiting for an answer at the same time, for each budget
+DEFAULT_LIMITS = {
+    'analytics': {'rate': 20, 'burst': 60, 'max_in_flight': 8},
+    'listing': {'rate': 10, 'burst': 20, 'max_in_flight': 8},
+    'graphql': {'rate': 10, 'burst': 20, 'max_in_flight': 8},
+    'default': {'rate': 20, 'burst': 50, 'max_in_flight': 10},
+}
+
+# The budget of a request is the one of the first pattern that matches its URL
+DEFAULT_ROUTES = [
+    (r'/graphql', 'graphql'),
+    (r'/applications/analyze\.json', 'analytics'),
+    (r'/(people|applications|organisations)\.json', 'listing'),
+]
+
+
+class MemoryBackend(object):
+    """
+    Keeps the state of the buckets in memory, so it is only shared by the threads of this process
+    """
+    # Whether update may block on I/O
+    blocking = False
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def update(self, name, func):
+        """
+        Atomically replaces the stored value of a bucket, or None if there is none, by func(value)[0], and returns func(value)[1]
+        """
+        with self._lock:
+            value, result = func(self._values.get(name))
+            self._values[name] = value
+            return result
+
+
+class SQLiteBackend(object):
+    """
+    Keeps the state of the buckets in a SQLite file, so all the processes of a host that
+    use the same file share the same budgets
+    """
+    blocking = True
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        connection = self._connection()
+        with connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, value REAL)')
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def update(self, name, func):
+        connection = self._connection()
+        # Takes the write lock of the database before reading, so no other process can update the bucket in between
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute('SELECT value FROM buckets WHERE name = ?', (name,)).fetchone()
+            value, result = func(row[0] if row is not None else None)
+            connection.execute('INSERT OR REPLACE INTO buckets (name, value) VALUES (?, ?)', (name, value))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return result
+
+
+class DjangoCacheBackend(object):
+    """
+    Keeps the state of the buckets inside one of the caches configured in the Django settings,
+    so they are shared by every process that uses it. Updates are serialized with a lock key,
+    which makes them atomic as long as cache.add is, like in memcached and Redis.
+    """
+    blocking = True
+    key_prefix = 'django_expa:ratelimit:'
+
+    def __init__(self, alias='default', lock_timeout=5):
+        self.alias = alias
+        self.lock_timeout = lock_timeout
+
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def update(self, name, func):
+        cache = self._cache()
+        key = self.key_prefix + name
+        lock_key = key + ':lock'
+        deadline = time.time() + self.lock_timeout
+        while not cache.add(lock_key, 1, self.lock_timeout):
+            if time.time() > deadline:
+                # Whoever held the lock is gone; its key expires by itself
+                break
+            time.sleep(0.001)
+        try:
+            value, result = func(cache.get(key))
+            cache.set(key, value, None)
+            return result
+        finally:
+            cache.delete(lock_key)
+
+
+class Budget(object):
+    """
+    A token bucket plus a cap on the requests in flight. The bucket is implemented as a GCRA,
+    whose whole state is the moment in which it will be full again, so it can be kept in a
+    shared backend.
+
+    rate: How many requests per second can be sent in the long run
+    burst: How many requests can be sent at once after the budget has not been used for a while
+    max_in_flight: How many requests of this budget can be waiting for an answer at the same time in this process. None means no limit.
+    """
+    def __init__(self, name, rate, burst=1, max_in_flight=None, backend=None):
+        self.name = name
+        self.interval = 1.0 / rate
+        self.burst = max(burst, 1)
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._in_flight = threading.BoundedSemaphore(max_in_flight) if max_in_flight else None
+        self._lock = threading.Lock()
+        self._exit_callbacks = []
+        self.requests = 0
+        self.throttled = 0
+        self.wait_time = 0.0
+
+    def reserve(self):
+        """
+        Takes a token from the bucket and returns how many seconds the caller must wait before sending its request
+        """
+        now = time.time()
+
+        def take(full_at):
+            full_at = max(full_at or 0, now) + self.interval
+            return full_at, max(full_at - self.burst * self.interval - now, 0)
+        wait = self.backend.update(self.name, take)
+        with self._lock:
+            self.requests += 1
+            if wait > 0:
+                self.throttled += 1
+                self.wait_time += wait
+        return wait
+
+    def try_enter(self):
+        """
+        Takes a place among the requests in flight if there is a free one, without waiting
+        """
+        return self._in_flight is None or self._in_flight.acquire(False)
+
+    def enter(self):
+        """
+        Waits for the bucket to allow the request and for a free place among the requests in flight
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        if self._in_flight is not None:
+            self._in_flight.acquire()
+
+    def on_exit(self, callback):
+        """
+        Calls callback, once, the next time a request of this budget finishes, so whoever is waiting for a place among the requests in flight
+        can wait for it without blocking a thread, i.e. an event loop
+        """
+        with self._lock:
+            self._exit_callbacks.append(callback)
+
+    def exit(self):
+        if self._in_flight is not None:
+            self._in_flight.release()
+            with self._lock:
+                callbacks, self._exit_callbacks = self._exit_callbacks, []
+            for callback in callbacks:
+                callback()
+
+    def __enter__(self):
+        self.enter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.exit()
+
+    def stats(self):
+        return {'requests': self.requests, 'throttled': self.throttled, 'wait_time': self.wait_time}
+
+
+class RateLimiter(object):
+    """
+    Assigns every request to one of several budgets according to its URL, so that, for
+    example, a batch of analytics requests does not use up the budget of listings.
+
+    limits: A dict with the rate, burst and max_in_flight of every budget. It must include 'default', used for the URLs that match no route
+    routes: A list of (URL regex, budget name) pairs
+    backend: Where the state of the buckets is kept; by default, in memory
+    """
+    def __init__(self, limits=None, routes=None, backend=None):
+        limits = limits if limits is not None else DEFAULT_LIMITS
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.budgets = dict((name, Budget(name, backend=self.backend, **limit)) for name, limit in limits.items())
+        self.routes = [(re.compile(pattern), name) for pattern, name in (routes if routes is not None else DEFAULT_ROUTES)]
+
+    def budget_for(self, url):
+        path = url.split('?', 1)[0]
+        for pattern, name in self.routes:
+            if pattern.search(path) and name in self.budgets:
+                return self.budgets[name]
+        return self.budgets['default']
+
+    def stats(self):
+        return dict((name, budget.stats()) for name, budget in self.budgets.items())
+
+
+_default_limiter = None
+_default_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """
+    Returns the process-wide rate limiter, built from the RATE_LIMIT_* settings the first time it is used, or None if RATE_LIMIT_BACKEND is None
+    """
+    global _default_limiter
+    with _default_limiter_lock:
+        if _default_limiter is None:
+            from . import settings
+            backend = getattr(settings, 'RATE_LIMIT_BACKEND', 'memory')
+            if backend is None:
+                return None
+            if backend == 'sqlite':
+                store = SQLiteBackend(getattr(settings, 'RATE_LIMIT_PATH', 'django_expa_ratelimit.sqlite3'))
+            elif backend == 'cache':
+                store = DjangoCacheBackend(getattr(settings, 'RATE_LIMIT_ALIAS', 'default'))
+            else:
+                store = MemoryBackend()
+            # A whole wave of a fan-out, such as the requests of getCountryEBs, fits in the default bursts and in-flight caps. Past the
+            # burst, the rate of each budget is what caps a fan-out, whatever FANOUT_WORKERS is; it is raised with RATE_LIMITS
+            workers = getattr(settings, 'FANOUT_WORKERS', 8)
+            limits = dict((name, dict(limit, burst=max(limit['burst'], workers), max_in_flight=max(limit['max_in_flight'], workers)))
+                          for name, limit in DEFAULT_LIMITS.items())
+            for name, limit in (getattr(settings, 'RATE_LIMITS', None) or {}).items():
+                limits[name] = dict(limits.get(name, {}), **limit)
+            _default_limiter = RateLimiter(limits, backend=store)
+        return _default_limiter
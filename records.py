@@ -0,0 +1,249 @@
+# coding=utf-8
+"""
+Module containing compact record types for the people and applications returned by EXPA,
+and for the stats of get_stats. They keep only the fields that are asked for, in __slots__ instead of nested dicts,
+so lists of tens of thousands of them fit in a fraction of the memory of the raw responses.
+"""
+from __future__ import unicode_literals
+from array import array
+
+# Values repeated in many records, such as statuses, are shared by all of them instead of being kept once per record.
+# Only the first MAX_SHARED distinct values are, so a long-running process does not keep every office id it ever read
+MAX_SHARED = 4096
+_shared = {}
+
+
+def _share(value):
+    if value is None:
+        return None
+    shared = _shared.get(value)
+    if shared is not None:
+        return shared
+    if len(_shared) >= MAX_SHARED:
+        return value
+    return _shared.setdefault(value, value)
+
+
+def _lookup(payload, path):
+    """
+    Follows a path of keys into a record of the API. Lists along the way are read through their first element,
+    and a nested object which comes as its id alone is read as that id
+    """
+    value = payload
+    for key in path:
+        if isinstance(value, list):
+            value = value[0] if value else None
+        if isinstance(value, dict):
+            value = value.get(key)
+        elif key == 'id':
+            return value
+        else:
+            return None
+        if value is None:
+            return None
+    return value
+
+
+def _selection(paths):
+    """
+    Turns a list of paths into the fields accepted by jsonstream.project, i.e. [('id',), ('home_lc', 'id')] into ['id', {'home_lc': ['id']}]
+    """
+    tree = {}
+    for path in paths:
+        node = tree
+        for key in path:
+            node = node.setdefault(key, {})
+    def build(node):
+        return [{key: build(subtree)} if subtree else key for key, subtree in sorted(node.items())]
+    return build(tree)
+
+
+class Record(object):
+    """
+    Base of the record types. Each one lists in SOURCES its fields and the path of keys where each of them is read
+    from the records of the API, and in SHARED the fields whose values repeat across records.
+    The fields that were not asked for are not set; reading one of them raises an AttributeError, and get() returns its default.
+    """
+    __slots__ = ()
+    SOURCES = ()
+    SHARED = ()
+
+    @classmethod
+    def field_names(cls, fields=None):
+        """
+        Returns the names of the given fields, or of all of them if fields is None. Raises a ValueError if any of them is unknown
+        """
+        names = [name for name, path in cls.SOURCES]
+        if fields is None:
+            return names
+        unknown = [name for name in fields if name not in names]
+        if unknown:
+            raise ValueError("%s has no fields %s" % (cls.__name__, ', '.join(unknown)))
+        return list(fields)
+
+    @classmethod
+    def payload_fields(cls, fields=None):
+        """
+        Returns the fields of the API records that are needed to build records with the given fields, as accepted by jsonstream.project,
+        so the listings can be decoded keeping only them
+        """
+        sources = dict(cls.SOURCES)
+        return _selection(sources[name] for name in cls.field_names(fields))
+
+    @classmethod
+    def from_payload(cls, payload, fields=None):
+        """
+        Builds a record from a record of the API, reading only the given fields. None reads all of them
+        """
+        record = cls.__new__(cls)
+        sources = dict(cls.SOURCES)
+        for name in cls.field_names(fields):
+            value = _lookup(payload, sources[name])
+            setattr(record, name, _share(value) if name in cls.SHARED else value)
+        return record
+
+    def get(self, name, default=None):
+        return getattr(self, name, default)
+
+    def to_dict(self):
+        """
+        Returns the fields that were read, as a dict, i.e. to be rendered by a template or serialized to JSON
+        """
+        return dict((name, getattr(self, name)) for name, path in self.SOURCES if hasattr(self, name))
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.to_dict() == other.to_dict()
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<%s %s>' % (type(self).__name__, self.get('id'))
+
+
+class Person(Record):
+    """
+    A person, as returned by people.json or people/<id>.json
+    """
+    SOURCES = (
+        ('id', ('id',)),
+        ('full_name', ('full_name',)),
+        ('email', ('email',)),
+        ('status', ('status',)),
+        ('phone', ('contact_info', 'phone')),
+        ('contact_info', ('contact_info',)),
+        ('home_lc_id', ('home_lc', 'id')),
+        ('created_at', ('created_at',)),
+        ('contacted_at', ('contacted_at',)),
+    )
+    SHARED = ('status', 'home_lc_id')
+    __slots__ = tuple(name for name, path in SOURCES)
+
+
+class Application(Record):
+    """
+    An application, as returned by applications.json or applications/<id>.json
+    """
+    SOURCES = (
+        ('id', ('id',)),
+        ('status', ('status',)),
+        ('person_id', ('person', 'id')),
+        ('opportunity_id', ('opportunity', 'id')),
+        ('programme_id', ('opportunity', 'programmes', 'id')),
+        ('home_lc_id', ('person', 'home_lc', 'id')),
+        ('host_lc_id', ('opportunity', 'office', 'id')),
+        ('created_at', ('created_at',)),
+        ('date_matched', ('date_matched',)),
+        ('date_an_signed', ('date_an_signed',)),
+        ('date_approved', ('date_approved',)),
+        ('date_realized', ('date_realized',)),
+        ('experience_end_date', ('experience_end_date',)),
+    )
+    SHARED = ('status', 'programme_id', 'home_lc_id', 'host_lc_id')
+    __slots__ = tuple(name for name, path in SOURCES)
+
+
+def iter_records(items, record_class, fields=None):
+    """
+    Builds a record from each of the items of a listing as it is read, so a streamed listing is never held whole in memory
+    """
+    for item in items:
+        yield record_class.from_payload(item, fields)
+
+
+class StatsCell(object):
+    """
+    The stats of an office, program and period, as returned by get_stats, kept in a single array of integers instead of a dict.
+    They are read as in a dict, i.e. cell['accepted']. A cell of a query that failed has no values, and all of them read as "EXPA ERROR".
+    """
+    METRICS = ('applications', 'applicants', 'accepted', 'approved', 'realized', 'completed')
+    ERROR = "EXPA ERROR"
+    __slots__ = ('_values',)
+
+    def __init__(self, values=None):
+        self._values = array('l', values) if values is not None else None
+
+    @classmethod
+    def from_stats(cls, stats):
+        """
+        Builds a cell from the dict returned by get_stats
+        """
+        try:
+            return cls([int(stats[metric]) for metric in cls.METRICS])
+        except (TypeError, ValueError):
+            return cls()
+
+    @classmethod
+    def from_payload(cls, analytics):
+        """
+        Builds a cell from the 'analytics' of an applications/analyze.json response, or from one of its 'children' buckets
+        """
+        # The cardinality aggregations, such as applicants, may come as JSON floats, which the array of integers does not take
+        return cls([int(value) for value in (
+            analytics['total_applications']['doc_count'],
+            analytics['total_applications']['applicants']['value'],
+            analytics['total_matched']['unique_profiles']['value'],
+            analytics['total_approvals']['doc_count'],
+            analytics['total_realized']['doc_count'],
+            analytics['total_completed']['doc_count'],
+        )])
+
+    @property
+    def error(self):
+        return self._values is None
+
+    @property
+    def values(self):
+        """
+        The array with the value of each of METRICS, in their order, or None if the query failed
+        """
+        return self._values
+
+    def __getitem__(self, metric):
+        index = self.METRICS.index(metric)
+        return self.ERROR if self._values is None else self._values[index]
+
+    def get(self, metric, default=None):
+        try:
+            return self[metric]
+        except ValueError:
+            return default
+
+    def keys(self):
+        return list(self.METRICS)
+
+    def to_dict(self):
+        return dict((metric, self[metric]) for metric in self.METRICS)
+
+    def __eq__(self, other):
+        return isinstance(other, StatsCell) and self._values == other._values
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '<StatsCell %s>' % (self.ERROR if self._values is None else ' '.join('%s=%d' % item for item in zip(self.METRICS, self._values)))
@@ -0,0 +1,103 @@
+# coding=utf-8
+"""
+Module containing the policy that decides when and how failed GIS API requests are retried
+"""
+from __future__ import unicode_literals
+import random
+import threading
+import time
+from email.utils import parsedate_tz, mktime_tz
+
+
+class RetryPolicy(object):
+    """
+    Retries failed requests with exponential backoff and full jitter.
+
+    - Server errors (5xx), 408, 429 and network errors are retried; other 4xx errors are
+      client errors, so they fail right away.
+    - The Retry-After header of 429 and 503 answers is honoured, up to max_delay.
+    - Retries are limited by a budget: every request adds budget_ratio retries to it, up to
+      max_budget, and every retry spends one. When the API keeps failing the budget runs out
+      and requests fail at their first error, instead of piling up retries.
+
+    attempts: How many times a request is tried in total, counting the first one
+    base_delay: The longest wait, in seconds, before the first retry; it doubles with every retry
+    max_delay: The longest wait, in seconds, before any retry
+    """
+    retry_statuses = (408, 429, 500, 502, 503, 504)
+
+    def __init__(self, attempts=1, base_delay=10, max_delay=60, budget_ratio=0.2, max_budget=10):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.max_budget = max_budget
+        self._budget = float(max_budget)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retries = 0
+        self.sleep_time = 0.0
+        self.budget_exhausted = 0
+
+    def record_request(self):
+        with self._lock:
+            self.requests += 1
+            self._budget = min(self._budget + self.budget_ratio, self.max_budget)
+
+    def should_retry(self, status=None):
+        """
+        Whether a request that failed with the given status, or with a network error if status is None, may be retried
+        """
+        return status is None or status in self.retry_statuses or status >= 500
+
+    def take_retry(self, attempt):
+        """
+        Returns True and spends one retry of the budget if the request may be tried again after its attempt-th failure
+        """
+        if attempt >= self.attempts:
+            return False
+        with self._lock:
+            if self._budget < 1:
+                self.budget_exhausted += 1
+                return False
+            self._budget -= 1
+            self.retries += 1
+            return True
+
+    def delay(self, attempt, response=None):
+        """
+        Returns how many seconds to wait before retrying a request after its attempt-th failure
+        """
+        if response is not None and response.status_code in (429, 503):
+            retry_after = self._retry_after(response.headers.get('Retry-After'))
+            if retry_after is not None:
+                return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def _retry_after(self, value):
+        if not value:
+            return None
+        try:
+            return max(float(value), 0)
+        except ValueError:
+            date = parsedate_tz(value)
+            if date is None:
+                return None
+            return max(mktime_tz(date) - time.time(), 0)
+
+    def record_sleep(self, seconds):
+        with self._lock:
+            self.sleep_time += seconds
+
+    def sleep(self, attempt, response=None):
+        seconds = self.delay(attempt, response)
+        self.record_sleep(seconds)
+        time.sleep(seconds)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'retries': self.retries,
+            'sleep_time': self.sleep_time,
+            'budget_exhausted': self.budget_exhausted,
+        }
@@ -0,0 +1,9 @@
+# coding=utf-8
+"""
+Module containing the signals sent by django_expa
+"""
+from __future__ import unicode_literals
+from django.dispatch import Signal
+
+# Sent after every call to EXPA when the 'signal' instrumentation hook is enabled. Its only argument, event, is the dict described in instrumentation.request_event
+expa_request = Signal()
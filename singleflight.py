@@ -0,0 +1,110 @@
+# coding=utf-8
+"""
+Module containing the coalescing of identical GIS API queries sent at the same time
+"""
+from __future__ import unicode_literals
+import threading
+import weakref
+
+
+class SingleFlight(object):
+    """
+    Lets concurrent threads which need the result of the same call share a single execution of
+    it: the first one runs it, and the others wait for it and get the same result, or the same
+    exception. Results are shared, so they must not be modified by their users.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.saved = 0
+
+    def do(self, key, func):
+        """
+        Returns func(), unless a call with the same key is already running, in which case its result is returned instead
+        """
+        with self._lock:
+            self.calls += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self.saved += 1
+        if leader:
+            try:
+                call['result'] = func()
+            except Exception as e:
+                call['error'] = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call['done'].set()
+        else:
+            call['done'].wait()
+        if call['error'] is not None:
+            raise call['error']
+        return call['result']
+
+    def stats(self):
+        """
+        Returns how many calls have been made, and how many of them did not have to be executed because they joined an identical one
+        """
+        return {'calls': self.calls, 'upstream': self.calls - self.saved, 'saved': self.saved}
+
+
+class AsyncSingleFlight(object):
+    """
+    The asyncio version of SingleFlight, for coroutines running in the same event loop. It requires Python 3.
+    """
+    def __init__(self):
+        # The calls of each event loop are kept apart, as their tasks can only be awaited from it
+        self._calls = weakref.WeakKeyDictionary()
+        self.calls = 0
+        self.saved = 0
+
+    def do(self, key, func):
+        """
+        Returns an awaitable with the result of func(), a coroutine function, unless a call with the same key is already running, in which case the awaitable gives its result instead. Cancelling one of the callers does not cancel the call for the others.
+        """
+        import asyncio
+        loop = asyncio.get_event_loop()
+        calls = self._calls.setdefault(loop, {})
+        self.calls += 1
+        task = calls.get(key)
+        if task is not None:
+            self.saved += 1
+        else:
+            task = calls[key] = asyncio.ensure_future(func())
+            task.add_done_callback(lambda _: calls.pop(key, None))
+        return asyncio.shield(task)
+
+    def stats(self):
+        return {'calls': self.calls, 'upstream': self.calls - self.saved, 'saved': self.saved}
+
+
+_default_flight = None
+_default_async_flight = None
+_default_flight_lock = threading.Lock()
+
+
+def get_single_flight():
+    """
+    Returns the SingleFlight shared by every ExpaApi instance of the process
+    """
+    global _default_flight
+    with _default_flight_lock:
+        if _default_flight is None:
+            _default_flight = SingleFlight()
+        return _default_flight
+
+
+def get_async_single_flight():
+    """
+    Returns the AsyncSingleFlight shared by every AsyncExpaApi instance of the process
+    """
+    global _default_async_flight
+    with _default_flight_lock:
+        if _default_async_flight is None:
+            _default_async_flight = AsyncSingleFlight()
+        return _default_async_flight
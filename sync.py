@@ -0,0 +1,177 @@
+# coding=utf-8
+"""
+Module containing the incremental synchronization of EXPA people and applications into the local Person and Application models
+"""
+from __future__ import unicode_literals
+import json
+from datetime import datetime, timedelta, time as dtime
+from .ingest import ingest
+
+try:
+    from datetime import timezone as dt_timezone
+    utc = dt_timezone.utc
+except ImportError:
+    # Python 2
+    from django.utils.timezone import utc
+
+# Date field of each model that every interaction of get_interactions filters on
+PERSON_INTERACTIONS = {
+    'registered': 'created_at',
+    'contacted': 'contacted_at',
+}
+APPLICATION_INTERACTIONS = {
+    'applied': 'created_at',
+    'accepted': 'date_matched',
+    'an_signed': 'date_an_signed',
+    'approved': 'date_approved',
+    'realized': 'date_realized',
+    'finished': 'experience_end_date',
+}
+
+
+def _id(value):
+    """
+    Returns the id of a nested EXPA object, which may come as a dict or as the id itself
+    """
+    if isinstance(value, dict):
+        return value.get('id')
+    return value
+
+
+def _datetime(value):
+    """
+    Parses an EXPA date or datetime into a datetime as the database expects it, depending on USE_TZ
+    """
+    if not value:
+        return None
+    from django.conf import settings
+    from django.utils import dateparse, timezone
+    parsed = dateparse.parse_datetime(value)
+    if parsed is None:
+        date = dateparse.parse_date(value[:10])
+        if date is None:
+            return None
+        parsed = datetime.combine(date, dtime())
+    if settings.USE_TZ and timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, utc)
+    elif not settings.USE_TZ and timezone.is_aware(parsed):
+        parsed = timezone.make_naive(parsed, utc)
+    return parsed
+
+
+def person_fields(item):
+    """
+    Maps a record of people.json to the fields of a Person
+    """
+    return {
+        'id': int(item['id']),
+        'full_name': item.get('full_name') or '',
+        'email': item.get('email') or '',
+        'status': item.get('status') or '',
+        'home_lc_id': _id(item.get('home_lc')),
+        'created_at': _datetime(item.get('created_at')),
+        'contacted_at': _datetime(item.get('contacted_at')),
+        'updated_at': _datetime(item.get('updated_at')),
+        'raw': json.dumps(item),
+    }
+
+
+def application_fields(item):
+    """
+    Maps a record of applications.json to the fields of an Application
+    """
+    person = item.get('person') or {}
+    opportunity = item.get('opportunity') or {}
+    programmes = opportunity.get('programmes') or {}
+    if isinstance(programmes, list):
+        programmes = programmes[0] if programmes else {}
+    return {
+        'id': int(item['id']),
+        'status': item.get('status') or '',
+        'person_id': _id(person),
+        'opportunity_id': _id(opportunity),
+        'programme_id': _id(programmes),
+        'home_lc_id': _id(person.get('home_lc')),
+        'host_lc_id': _id(opportunity.get('office')),
+        'created_at': _datetime(item.get('created_at')),
+        'date_matched': _datetime(item.get('date_matched')),
+        'date_an_signed': _datetime(item.get('date_an_signed')),
+        'date_approved': _datetime(item.get('date_approved')),
+        'date_realized': _datetime(item.get('date_realized')),
+        'experience_end_date': _datetime(item.get('experience_end_date')),
+        'updated_at': _datetime(item.get('updated_at')),
+        'raw': json.dumps(item),
+    }
+
+
+class SyncEngine(object):
+    """
+    Keeps the Person and Application tables up to date with EXPA. For every office, interaction
+    and program it remembers, in a SyncState, up to which day the interactions have been
+    synchronized, so every run only requests the ones since then.
+
+    api: The ExpaApi used to query EXPA. By default, a new one with the default account
+    initial_days: How many days back the first synchronization of an office and interaction goes
+    batch_size: How many records are written at once, in one transaction
+    """
+    def __init__(self, api=None, initial_days=None, batch_size=None):
+        from . import settings
+        if api is None:
+            from .expaApi import ExpaApi
+            api = ExpaApi()
+        self.api = api
+        self.initial_days = initial_days if initial_days is not None else getattr(settings, 'SYNC_INITIAL_DAYS', 30)
+        self.batch_size = batch_size if batch_size is not None else getattr(settings, 'SYNC_BATCH_SIZE', 500)
+
+    def _model(self, interaction):
+        from .models import Person, Application
+        if interaction in PERSON_INTERACTIONS:
+            return Person, person_fields
+        elif interaction in APPLICATION_INTERACTIONS:
+            return Application, application_fields
+        raise ValueError("Unknown interaction: %s" % interaction)
+
+    def _date_field(self, interaction):
+        return PERSON_INTERACTIONS.get(interaction) or APPLICATION_INTERACTIONS[interaction]
+
+    def sync(self, interaction, office_id, program='ogx', today=None):
+        """
+        Requests the interactions of an office since its last synchronization, and writes them to the local database.
+        The next synchronization starts on the day of the latest interaction received, which is requested again, as it may have new interactions since then; writing a record twice just updates it.
+        If none was received, it starts on the day before this one.
+        returns: A dict with the synchronized period, how many records were fetched, created and updated (None if the database does not tell them apart), and how many were written per second
+        """
+        from django.utils import timezone
+        from .models import SyncState
+        model, fields = self._model(interaction)
+        today = today or datetime.now().date()
+        state, _ = SyncState.objects.get_or_create(office_id=office_id, interaction=interaction, program=program)
+        start_date = state.high_water_mark or today - timedelta(days=self.initial_days)
+        result = {'interaction': interaction, 'office_id': office_id, 'program': program,
+                  'start_date': start_date.strftime('%Y-%m-%d'), 'end_date': today.strftime('%Y-%m-%d')}
+        items = self.api.get_interactions(interaction, office_id, program, result['start_date'], result['end_date'], stream=True)['items']
+        date_field = self._date_field(interaction)
+        latest = []
+
+        def observed(items):
+            # Remembers the latest date of the interaction among the records written
+            for item in items:
+                value = item.get(date_field)
+                if value and (not latest or value > latest[0]):
+                    latest[:] = [value]
+                yield item
+        stats = ingest(observed(items), model, fields, self.batch_size)
+        result.update(fetched=stats['rows'], created=stats['created'], updated=stats['updated'], rows_per_second=stats['rows_per_second'])
+        high_water_mark = _datetime(latest[0]).date() if latest else today - timedelta(days=1)
+        state.high_water_mark = max(high_water_mark, start_date)
+        state.last_run = timezone.now()
+        state.last_count = result['fetched']
+        state.save()
+        return result
+
+    def sync_all(self, interactions, office_ids, programs=('ogx',)):
+        """
+        Synchronizes every combination of the given interactions, offices and programs, one after the other, and returns the result of each one
+        """
+        return [self.sync(interaction, office_id, program)
+                for office_id in office_ids for interaction in interactions for program in programs]
@@ -1,3 +1,1172 @@
-from django.test import TestCase
+# coding=utf-8
+from __future__ import unicode_literals
+import json
+from datetime import date, datetime
 
-# Create your tests here.
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from .benchmarks.mock_server import MockGISServer, use_mock_server
+from .instrumentation import Instrumentation, log_hook
+from .jsonstream import JSONArrayStream
+
+
+class MockServerTestCase(SimpleTestCase):
+    """
+    Runs its tests against a mock GIS API server, with an ExpaApi pointed to it
+    """
+    server_options = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super(MockServerTestCase, cls).setUpClass()
+        cls.server = MockGISServer(latency=0, **cls.server_options).start()
+        cls.mock = use_mock_server(cls.server)
+        cls.mock.__enter__()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.mock.__exit__(None, None, None)
+        cls.server.stop()
+        super(MockServerTestCase, cls).tearDownClass()
+
+    def setUp(self):
+        from .benchmarks.run import reset_caches
+        super(MockServerTestCase, self).setUp()
+        reset_caches()
+
+    def api(self):
+        from .expaApi import ExpaApi
+        from . import settings
+        return ExpaApi(settings.DEFAULT_ACCOUNT, pwd='x')
+
+
+class JSONArrayStreamTests(SimpleTestCase):
+    document = {
+        'data': [{'id': i, 'person': {'id': i, 'full_name': 'Persona "%d"' % i}, 'score': 10 ** i} for i in range(20)],
+        'paging': {'total_items': 20, 'total_pages': 1},
+    }
+
+    def chunks(self, size):
+        text = json.dumps(self.document)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def test_decodes_any_chunking(self):
+        for size in (1, 2, 7, 64, 100000):
+            stream = JSONArrayStream(self.chunks(size))
+            self.assertEqual(list(stream), self.document['data'])
+            self.assertEqual(stream.get('paging'), self.document['paging'])
+
+    def test_projects_records(self):
+        stream = JSONArrayStream(self.chunks(5), fields=['id', {'person': ['full_name']}])
+        self.assertEqual(next(iter(stream)), {'id': 0, 'person': {'full_name': 'Persona "0"'}})
+
+    def test_get_after_the_array_keeps_the_records(self):
+        stream = JSONArrayStream(self.chunks(16))
+        self.assertEqual(stream.get('paging'), self.document['paging'])
+        self.assertEqual(len(stream._pending), 20)
+        self.assertEqual(list(stream), self.document['data'])
+
+    def test_get_once_read_keeps_nothing(self):
+        stream = JSONArrayStream(self.chunks(16))
+        self.assertEqual(len(list(stream)), 20)
+        self.assertEqual(stream.get('paging'), self.document['paging'])
+        self.assertEqual(len(stream._pending), 0)
+
+    def test_truncated_document(self):
+        with self.assertRaises(ValueError):
+            list(JSONArrayStream(['{"data": [{"id": 1}, {"id"']))
+
+    def test_closes_once_read(self):
+        closed = []
+        list(JSONArrayStream(self.chunks(10), close=lambda: closed.append(True)))
+        self.assertEqual(closed, [True])
+
+
+class ChunkedStreamingTests(MockServerTestCase):
+    server_options = {'listing_size': 60, 'chunked': True, 'chunk_size': 512}
+
+    def test_stream_query_of_a_chunked_response(self):
+        api = self.api()
+        events = []
+        api.instrumentation = Instrumentation([log_hook, events.append])
+        stream = api.stream_query(['people.json'], {'page': 1, 'per_page': 50})
+        self.assertEqual(events, [])
+        self.assertEqual(len(list(stream)), 50)
+        self.assertEqual(len(events), 1)
+        self.assertGreater(events[0]['bytes'], 0)
+        self.assertIsNone(events[0]['error'])
+
+    def test_streaming_paginator_does_not_keep_the_first_page(self):
+        api = self.api()
+        paginator = api.paginate(['people.json'], per_page=30, streaming=True)
+        self.assertEqual(paginator.total_items, 60)
+        pages = paginator.pages()
+        first = next(pages)
+        self.assertEqual(len(first._pending), 0)
+        self.assertEqual(len(list(first)), 30)
+        self.assertEqual(sum(len(list(page)) for page in pages), 30)
+
+    def test_streamed_interactions_match_the_whole_listing(self):
+        api = self.api()
+        whole = api.get_interactions('approved', 1589, 'ogv', '2017-01-01', '2017-01-31')
+        streamed = api.get_interactions('approved', 1589, 'ogv', '2017-01-01', '2017-01-31', stream=True)
+        self.assertEqual(streamed['total'], whole['total'])
+        self.assertEqual(list(streamed['items']), whole['items'])
+
+
+class ContactDataTests(SimpleTestCase):
+
+    def test_does_not_modify_the_person(self):
+        from . import tools
+        person = {'id': 1, 'full_name': 'Persona 1', 'email': 'persona1@example.org', 'contact_info': {'phone': '+507 6000-0000'}}
+        data = tools.getContactData(person)
+        self.assertEqual(data['contactData'], {'phone': '+507 6000-0000', 'altMail': 'persona1@example.org'})
+        self.assertEqual(person['contact_info'], {'phone': '+507 6000-0000'})
+        self.assertEqual(tools.getContactData({'id': 2, 'full_name': 'X', 'email': 'x@example.org', 'contact_info': None})['contactData'], {'altMail': 'x@example.org'})
+
+
+class SyncTests(MockServerTestCase, TestCase):
+    server_options = {'listing_size': 40}
+
+    def test_parses_dates_with_and_without_time_zones(self):
+        from .sync import _datetime
+        with override_settings(USE_TZ=False):
+            self.assertEqual(_datetime('2016-01-01T00:00:00Z'), datetime(2016, 1, 1))
+            self.assertEqual(_datetime('2016-01-01'), datetime(2016, 1, 1))
+        with override_settings(USE_TZ=True):
+            parsed = _datetime('2016-01-01T00:00:00')
+            self.assertEqual(parsed.utcoffset().total_seconds(), 0)
+        self.assertIsNone(_datetime(None))
+
+    def test_high_water_mark_is_the_latest_interaction(self):
+        from .models import Application, SyncState
+        from .sync import SyncEngine
+        engine = SyncEngine(self.api(), batch_size=15)
+        result = engine.sync('approved', 1589, 'ogv', today=date(2017, 1, 31))
+        self.assertEqual(result['fetched'], 40)
+        self.assertEqual(Application.objects.count(), 40)
+        state = SyncState.objects.get(office_id=1589, interaction='approved', program='ogv')
+        # Every application of the mock server was approved on 2017-01-25
+        self.assertEqual(state.high_water_mark, date(2017, 1, 25))
+        result = engine.sync('approved', 1589, 'ogv', today=date(2017, 2, 10))
+        self.assertEqual(result['start_date'], '2017-01-25')
+        self.assertEqual(Application.objects.count(), 40)
+
+
+class CountryEBsTests(MockServerTestCase):
+    server_options = {'mcs_per_region': 1, 'lcs_per_mc': 6}
+
+    def test_boards_are_queried_with_one_pool_at_a_time(self):
+        import threading
+        import time
+        api = self.api()
+        api.max_workers = 3
+        lock = threading.Lock()
+        running = [0]
+        peak = [0]
+        contact_data = api._contact_data
+
+        def counted(person):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            try:
+                time.sleep(0.01)
+                return contact_data(person)
+            finally:
+                with lock:
+                    running[0] -= 1
+        api._contact_data = counted
+        boards = api.getCountryEBs(1589)
+        self.assertEqual(len(boards), 6)
+        for board in boards:
+            self.assertNotIn('error', board)
+            self.assertEqual(board['cargos'], api.getLCEBContactList(str(board['expaID'])))
+        self.assertTrue(0 < peak[0] <= api.max_workers)
+
+    def test_transports_share_the_limit_of_requests_in_flight(self):
+        from .transport import Transport
+        self.assertIs(Transport.from_settings()._in_flight, Transport.from_settings()._in_flight)
+
+
+class TransportTests(MockServerTestCase):
+
+    def test_instances_share_the_process_transport(self):
+        from .transport import Transport, get_transport
+        first, second = self.api(), self.api()
+        self.assertIs(first.transport, get_transport())
+        self.assertIs(second.transport, first.transport)
+        first.getPerson('1')
+        before = get_transport().stats()
+        second.getPerson('2')
+        after = get_transport().stats()
+        self.assertEqual(after['requests'] - before['requests'], 1)
+        # The second instance reuses the connection opened by the first one
+        self.assertEqual(after['connections_opened'], before['connections_opened'])
+        own = Transport.from_settings()
+        try:
+            self.assertIs(self.api().__class__(transport=own, pwd='x').transport, own)
+        finally:
+            own.close()
+
+
+class AsyncApiTests(MockServerTestCase):
+
+    def test_throttle_waits_for_a_place_without_polling(self):
+        import asyncio
+        import threading
+        from .async_api import throttle
+        from .ratelimit import RateLimiter
+        limiter = RateLimiter({'default': {'rate': 1000, 'burst': 1000, 'max_in_flight': 1}})
+        budget = limiter.budget_for('/v2/people/1.json')
+        budget.enter()
+        entered = []
+
+        async def wait():
+            async with throttle(limiter, '/v2/people/1.json'):
+                entered.append(True)
+        async def main():
+            task = asyncio.ensure_future(wait())
+            await asyncio.sleep(0.05)
+            self.assertEqual(entered, [])
+            self.assertEqual(len(budget._exit_callbacks), 1)
+            # A request of another thread finishes and wakes up the coroutine
+            threading.Thread(target=budget.exit).start()
+            await asyncio.wait_for(task, 1)
+        asyncio.run(main())
+        self.assertEqual(entered, [True])
+        self.assertTrue(budget.try_enter())
+
+    def test_queries_do_not_use_the_blocking_token_property(self):
+        import asyncio
+        from . import settings
+        from .async_api import AsyncExpaApi, close_async_client, _clients
+
+        class Api(AsyncExpaApi):
+            @property
+            def token(self):
+                raise AssertionError("The token property logs in blocking the event loop")
+
+        async def main():
+            api = Api(settings.DEFAULT_ACCOUNT, pwd='x')
+            person = await api.getPerson('1')
+            client = api.client
+            await close_async_client()
+            self.assertTrue(client.is_closed)
+            self.assertNotIn(asyncio.get_running_loop(), _clients)
+            return person
+        self.assertEqual(asyncio.run(main()), self.api().getPerson('1'))
+
+
+class DiskStoreTests(SimpleTestCase):
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+
+    def files(self):
+        import os
+        return sorted(os.path.join(directory, name) for directory, subdirectories, names in os.walk(self.path) for name in names if name.endswith('.json'))
+
+    def test_keys_share_the_files_of_identical_responses(self):
+        from .diskstore import DiskStore
+        store = DiskStore(self.path)
+        store.set('a', {'value': 1})
+        store.set('b', {'value': 1})
+        self.assertEqual(len(self.files()), 1)
+        self.assertEqual(store.get('b'), (True, {'value': 1}))
+        store.set('a', {'value': 2})
+        self.assertEqual(len(self.files()), 2)
+        self.assertEqual(store.stats()['bytes'], len('{"value":1}') + len('{"value":2}'))
+        self.assertEqual(DiskStore(self.path).get('a'), (True, {'value': 2}))
+
+    def test_evicts_the_least_recently_used_keys(self):
+        import time
+        from .diskstore import DiskStore
+        size = len('{"value":0}')
+        store = DiskStore(self.path, max_bytes=3 * size, touch_interval=0)
+        for value in range(3):
+            store.set('key%d' % value, {'value': value})
+            time.sleep(0.01)
+        store.get('key0')
+        store.set('key3', {'value': 3})
+        self.assertEqual(store.get('key1'), (False, None))
+        for key in ('key0', 'key2', 'key3'):
+            self.assertTrue(store.get(key)[0])
+        self.assertEqual(store.stats()['bytes'], 3 * size)
+        self.assertEqual(len(self.files()), 3)
+
+    def test_reads_only_record_the_use_of_a_key_once_per_interval(self):
+        from . import diskstore
+        clock = Clock(self, diskstore)
+        store = diskstore.DiskStore(self.path, touch_interval=60)
+        store.set('a', {'value': 1})
+
+        def used_at():
+            return store._connection().execute('SELECT used_at FROM entries').fetchone()[0]
+        clock.sleep(59)
+        self.assertEqual(store.get('a'), (True, {'value': 1}))
+        self.assertEqual(used_at(), 1000000.0)
+        clock.sleep(1)
+        store.get('a')
+        self.assertEqual(used_at(), 1000060.0)
+
+    def test_forgets_the_keys_whose_files_are_gone(self):
+        import os
+        from .diskstore import DiskStore
+        store = DiskStore(self.path)
+        store.set('a', {'value': 1})
+        os.remove(self.files()[0])
+        self.assertEqual(store.get('a'), (False, None))
+        self.assertEqual(store.stats(), {'hits': 0, 'misses': 1, 'entries': 0, 'bytes': 0})
+
+
+class StatsMatrixTests(MockServerTestCase):
+
+    def test_closed_periods_are_served_by_the_response_cache(self):
+        api = self.api()
+        cells = [(1589, program, '2017-01-01', '2017-01-31') for program in ('ogv', 'igv')]
+        first = api.get_stats_matrix(cells)
+        requests = api.transport.stats()['requests']
+        self.assertEqual(api.get_stats_matrix(cells), first)
+        self.assertEqual(api.transport.stats()['requests'], requests)
+        self.assertFalse(hasattr(api, '_closed_stats'))
+
+
+class LoginTests(MockServerTestCase):
+    server_options = {'login_redirects': 2}
+
+    def test_every_response_of_the_login_is_closed(self):
+        from .auth import Authenticator
+        from .transport import Transport
+        transport = Transport.from_settings()
+        self.addCleanup(transport.close)
+        responses = []
+        closed = []
+        send = transport.request
+
+        def request(*args, **kwargs):
+            response = send(*args, **kwargs)
+            close = response.close
+
+            def counted_close():
+                closed.append(response)
+                close()
+            response.close = counted_close
+            responses.append(response)
+            return response
+        transport.request = request
+        api = self.api()
+        api.authenticator = Authenticator(transport)
+        token, expires = api._login()
+        self.assertTrue(token)
+        # The login page, the sign in and its two redirects
+        self.assertEqual(len(responses), 4)
+        for response in responses[1:]:
+            self.assertIn(response, closed)
+
+
+class CommitteeIndexTests(SimpleTestCase):
+
+    class Api(object):
+        max_workers = 1
+
+        def __init__(self, failures):
+            self.failures = failures
+            self.tree = {1: [2, 3], 2: [20], 3: [30]}
+
+        def make_query(self, routes):
+            from .expaApi import APIUnavailableException
+            committee_id = int(routes[1].split('.')[0])
+            if self.failures.get(committee_id):
+                self.failures[committee_id] -= 1
+                raise APIUnavailableException(None, "The request has failed with error code 503")
+            return {'id': committee_id, 'name': 'C%d' % committee_id, 'parent': None,
+                    'suboffices': [{'id': child, 'name': 'C%d' % child} for child in self.tree.get(committee_id, [])]}
+
+    def test_retries_the_committees_that_failed(self):
+        from .committees import CommitteeIndex
+        index = CommitteeIndex().build(self.Api({2: 1}), root=1, depth=2)
+        self.assertTrue(index.is_loaded(2))
+        self.assertEqual(index.descendants(1), [2, 3, 20, 30])
+
+    def test_logs_the_committees_that_still_fail_and_loads_them_later(self):
+        from .committees import CommitteeIndex
+        api = self.Api({2: 2})
+        index = CommitteeIndex()
+        with self.assertLogs('django_expa.committees', 'WARNING') as logs:
+            index.build(api, root=1, depth=2)
+        self.assertIn('The committee 2 could not be loaded', logs.output[0])
+        self.assertFalse(index.is_loaded(2))
+        self.assertEqual(index.descendants(1), [2, 3, 30])
+        index.build(api, root=1, depth=2)
+        self.assertEqual(index.descendants(1), [2, 3, 20, 30])
+
+
+    def test_walks_the_tree_without_racing_a_clear(self):
+        import threading
+        from .committees import CommitteeIndex
+
+        class Index(CommitteeIndex):
+            clearing = None
+
+            def children(self, committee_id):
+                # A clear from another thread, once the walk has started, waits until it is over
+                if self.clearing is False:
+                    self.clearing = threading.Thread(target=self.clear)
+                    self.clearing.start()
+                    self.clearing.join(0.1)
+                return super(Index, self).children(committee_id)
+        api = self.Api({})
+        index = Index().build(api, root=1, depth=2)
+        index.clearing = False
+        self.assertEqual([summary['name'] for summary in index.suboffices(api, 1)], ['C2', 'C3'])
+        index.clearing.join()
+        self.assertIsNone(index.get(1))
+        index = Index().build(api, root=1, depth=2)
+        index.clearing = False
+        self.assertEqual(index.descendants(1), [2, 3, 20, 30])
+        index.clearing.join()
+        self.assertEqual(index.descendants(1), [])
+
+
+class Clock(object):
+    """
+    Replaces the time module of the given modules, so the tests decide when time passes
+    """
+    def __init__(self, test, *modules):
+        self.now = 1000000.0
+        for module in modules:
+            original = module.time
+            module.time = self
+            test.addCleanup(setattr, module, 'time', original)
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class Answer(object):
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class RetryPolicyTests(SimpleTestCase):
+
+    def test_only_transient_errors_are_retried(self):
+        from .retry import RetryPolicy
+        policy = RetryPolicy()
+        for status in (None, 408, 429, 500, 503, 599):
+            self.assertTrue(policy.should_retry(status), status)
+        for status in (400, 401, 403, 404, 422):
+            self.assertFalse(policy.should_retry(status), status)
+
+    def test_retries_are_limited_by_attempts_and_budget(self):
+        from .retry import RetryPolicy
+        policy = RetryPolicy(attempts=3, budget_ratio=0.5, max_budget=2)
+        self.assertTrue(policy.take_retry(1))
+        self.assertTrue(policy.take_retry(2))
+        self.assertFalse(policy.take_retry(3))
+        self.assertFalse(policy.take_retry(1))
+        self.assertEqual(policy.stats()['budget_exhausted'], 1)
+        policy.record_request()
+        self.assertFalse(policy.take_retry(1))
+        policy.record_request()
+        self.assertTrue(policy.take_retry(1))
+        self.assertEqual(policy.stats()['retries'], 3)
+
+    def test_delays(self):
+        from .retry import RetryPolicy
+        policy = RetryPolicy(attempts=5, base_delay=2, max_delay=5)
+        for attempt in range(1, 5):
+            self.assertTrue(0 <= policy.delay(attempt) <= min(2 * 2 ** (attempt - 1), 5))
+        self.assertEqual(policy.delay(1, Answer(503, {'Retry-After': '3'})), 3)
+        self.assertEqual(policy.delay(1, Answer(429, {'Retry-After': '120'})), 5)
+        self.assertTrue(policy.delay(1, Answer(500, {'Retry-After': '3'})) <= 2)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+
+    def test_state_machine(self):
+        from . import breaker
+        from .breaker import CircuitBreaker, CLOSED, OPEN, HALF_OPEN
+        clock = Clock(self, breaker)
+        changes = []
+        circuit = CircuitBreaker('rest', failure_threshold=2, recovery_timeout=30, half_open_calls=1)
+        circuit.add_listener(lambda circuit, old, new: changes.append((old, new)))
+        circuit.record_failure()
+        circuit.record_success()
+        circuit.record_failure()
+        self.assertEqual(circuit.state, CLOSED)
+        circuit.record_failure()
+        self.assertEqual(circuit.state, OPEN)
+        self.assertFalse(circuit.allow_request())
+        self.assertEqual(circuit.retry_after(), 30)
+        clock.sleep(30)
+        self.assertEqual(circuit.state, HALF_OPEN)
+        self.assertTrue(circuit.allow_request())
+        self.assertFalse(circuit.allow_request())
+        circuit.record_failure()
+        self.assertEqual(circuit.state, OPEN)
+        clock.sleep(30)
+        self.assertTrue(circuit.allow_request())
+        circuit.record_success()
+        self.assertEqual(circuit.state, CLOSED)
+        self.assertTrue(circuit.allow_request())
+        self.assertEqual(changes, [(CLOSED, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, OPEN), (OPEN, HALF_OPEN), (HALF_OPEN, CLOSED)])
+        self.assertEqual(circuit.stats()['rejected'], 2)
+
+
+class BudgetTests(SimpleTestCase):
+
+    def test_gcra_allows_a_burst_and_then_the_rate(self):
+        from . import ratelimit
+        from .ratelimit import Budget
+        clock = Clock(self, ratelimit)
+        budget = Budget('listing', rate=10, burst=3)
+        waits = [budget.reserve() for _ in range(5)]
+        for wait, expected in zip(waits, [0, 0, 0, 0.1, 0.2]):
+            self.assertAlmostEqual(wait, expected)
+        self.assertEqual(budget.stats()['throttled'], 2)
+        # Once the requests that waited are sent, the bucket refills at the rate
+        clock.sleep(0.2 + 0.1)
+        self.assertAlmostEqual(budget.reserve(), 0)
+        self.assertAlmostEqual(budget.reserve(), 0.1)
+        clock.sleep(10)
+        self.assertEqual([budget.reserve() for _ in range(3)], [0, 0, 0])
+
+    def test_budgets_share_their_backend_by_name(self):
+        from . import ratelimit
+        from .ratelimit import MemoryBackend, RateLimiter
+        Clock(self, ratelimit)
+        backend = MemoryBackend()
+        first = RateLimiter({'default': {'rate': 1, 'burst': 1}}, backend=backend)
+        second = RateLimiter({'default': {'rate': 1, 'burst': 1}}, backend=backend)
+        self.assertEqual(first.budget_for('/v2/people/1.json').reserve(), 0)
+        self.assertAlmostEqual(second.budget_for('/v2/people/1.json').reserve(), 1)
+
+    def test_caps_the_requests_in_flight(self):
+        from .ratelimit import Budget
+        budget = Budget('graphql', rate=1000, burst=1000, max_in_flight=1)
+        self.assertTrue(budget.try_enter())
+        self.assertFalse(budget.try_enter())
+        budget.exit()
+        self.assertTrue(budget.try_enter())
+
+
+class ResponseCacheTests(SimpleTestCase):
+
+    def test_ttl_depends_on_the_route(self):
+        from .cache import ResponseCache
+        cache = ResponseCache()
+        self.assertEqual(cache.ttl_for(['committees', '1589.json']), 3 * 60 * 60)
+        self.assertEqual(cache.ttl_for(['people.json'], {'page': 2}), 30)
+        self.assertEqual(cache.ttl_for(['people', '1.json']), 5 * 60)
+        self.assertEqual(cache.ttl_for(['ldm', 'report']), 0)
+        # The analytics of closed periods never change, while those of open ones do
+        self.assertIsNone(cache.ttl_for(['applications', 'analyze.json'], {'end_date': '2017-01-31'}))
+        self.assertEqual(cache.ttl_for(['applications', 'analyze.json'], {'end_date': '2999-01-31'}), 60)
+        self.assertEqual(cache.ttl_for(['applications', 'analyze.json']), 60)
+
+    def test_expiration(self):
+        from . import cache as cache_module
+        from .cache import ResponseCache
+        clock = Clock(self, cache_module)
+        cache = ResponseCache()
+        cache.set('listing', [1], 30)
+        cache.set('closed', [2], None)
+        cache.set('uncached', [3], 0)
+        self.assertEqual(cache.get('listing'), (True, [1]))
+        self.assertEqual(cache.get('uncached'), (False, None))
+        clock.sleep(31)
+        self.assertEqual(cache.get('listing'), (False, None))
+        self.assertEqual(cache.get_stale('listing'), (True, [1]))
+        self.assertEqual(cache.get('closed'), (True, [2]))
+
+    def test_keeps_the_most_recently_used(self):
+        from .cache import ResponseCache
+        cache = ResponseCache(max_entries=2)
+        cache.set('a', 1, None)
+        cache.set('b', 2, None)
+        cache.get('a')
+        cache.set('c', 3, None)
+        self.assertEqual(cache.get('b'), (False, None))
+        self.assertEqual(cache.get('a'), (True, 1))
+        self.assertEqual(cache.get('c'), (True, 3))
+
+    def test_keys_leave_the_access_token_out(self):
+        from .cache import ResponseCache
+        cache = ResponseCache()
+        self.assertEqual(cache.make_key('a@b.c', 'v2', ['people.json'], {'page': 1, 'access_token': 'x'}),
+                         cache.make_key('a@b.c', 'v2', ['people.json'], {'page': 1, 'access_token': 'y'}))
+
+
+class StatsBatchPlanTests(SimpleTestCase):
+
+    def test_groups_offices_by_parent(self):
+        from . import settings
+        from .committees import CommitteeIndex
+        from .expaApi import ExpaApi
+        api = ExpaApi(settings.DEFAULT_ACCOUNT, pwd='x')
+        api.committees = CommitteeIndex()
+        api.committees.add_committee({'id': 10, 'parent': None, 'suboffices': [{'id': 11}, {'id': 12}, {'id': 13}]})
+        api.committees.add_committee({'id': 20, 'parent': None, 'suboffices': [{'id': 21}]})
+
+        def key(office, program='ogv'):
+            return (api.account, str(office), program, '2017-01-01', '2017-01-31')
+        pending = [key(11), key(12), key(10), key(21), key(30), key(12, 'igv')]
+        calls = dict(((call[0], call[1]), sorted(call[4])) for call in api._stats_batch_plan(pending))
+        self.assertEqual(calls, {
+            # The LCs asked for and their MC, with a single query of the MC
+            ('10', 'ogv'): sorted([key(11), key(12), key(10)]),
+            # Offices whose parent has no other office asked for, or is unknown, are queried on their own
+            ('21', 'ogv'): [key(21)],
+            ('30', 'ogv'): [key(30)],
+            ('12', 'igv'): [key(12, 'igv')],
+        })
+
+
+class BulkWriterTests(TestCase):
+
+    def test_inserts_and_updates(self):
+        from .ingest import BulkWriter
+        from .models import Person
+        for update_conflicts in (True, False):
+            Person.objects.all().delete()
+            writer = BulkWriter(Person)
+            writer.update_conflicts = update_conflicts and writer.update_conflicts
+            writer.write([{'id': 1, 'full_name': 'Uno', 'status': 'open'}, {'id': 2, 'full_name': 'Dos', 'status': 'open'}])
+            created, updated = writer.write([
+                {'id': 2, 'full_name': 'Dos', 'status': 'applied'},
+                {'id': 3, 'full_name': 'Tres', 'status': 'open'},
+                {'id': 3, 'full_name': 'Tres', 'status': 'accepted'},
+            ])
+            if not writer.update_conflicts:
+                self.assertEqual((created, updated), (1, 1))
+            self.assertEqual(dict(Person.objects.values_list('id', 'status')), {1: 'open', 2: 'applied', 3: 'accepted'})
+            self.assertEqual(Person.objects.get(id=1).full_name, 'Uno')
+        self.assertEqual(writer.write([]), (0, 0))
+
+
+class AsyncParityTests(MockServerTestCase):
+    server_options = {'listing_size': 45, 'mcs_per_region': 1, 'lcs_per_mc': 3}
+
+    def run_async(self, name, *args, **kwargs):
+        import asyncio
+        from . import settings
+        from .async_api import AsyncExpaApi, close_async_client
+
+        async def main():
+            api = AsyncExpaApi(settings.DEFAULT_ACCOUNT, pwd='x')
+            api.page_size = 20
+            try:
+                return await getattr(api, name)(*args, **kwargs)
+            finally:
+                await close_async_client()
+        return asyncio.run(main())
+
+    def test_methods_answer_as_the_sync_ones(self):
+        api = self.api()
+        api.page_size = 20
+        calls = [
+            ('getUncontactedEPs', (1589,)),
+            ('get_matchable_EPs', (1589,)),
+            ('getWeekRegistered', (1589, 3, 2017)),
+            ('getWeekContacted', (1589, 3, 2017)),
+            ('get_companies', (1589, None, '2017-01-01', '2017-01-31')),
+            ('getWeekStats', (3, 2017, 'ogv', 1589)),
+            ('getCurrentYearStats', ('ogv', 1589)),
+            ('getCountryCurrentYearStats', ('ogv', 1589)),
+            ('getCurrentMCYearStats', ('ogv', 1589)),
+            ('getCountryCurrentMCYearStats', ('ogv', 1589)),
+        ]
+        for name, args in calls:
+            self.assertEqual(self.run_async(name, *args), getattr(api, name)(*args), name)
+        self.assertEqual(self.run_async('test', testArg=1), 1)
+
+    def test_paginator(self):
+        import asyncio
+        from . import settings
+        from .async_api import AsyncExpaApi, close_async_client
+        whole = self.api().getUncontactedEPs(1589)['eps']
+
+        async def main():
+            api = AsyncExpaApi(settings.DEFAULT_ACCOUNT, pwd='x')
+            paginator = api.paginate(['people.json'], api._uncontacted_args(1589), per_page=10, prefetch=2, fields=['id'])
+            self.assertEqual(await paginator.total_items(), 45)
+            self.assertEqual(await paginator.total_pages(), 5)
+            records = [item async for item in paginator]
+            stats = api.connection_stats()
+            await close_async_client()
+            return records, stats
+        records, stats = asyncio.run(main())
+        self.assertEqual(records, [{'id': item['id']} for item in whole])
+        self.assertEqual(stats['requests'], 5)
+        self.assertEqual(stats['connections_opened'] + stats['connections_reused'], 5)
+        with self.assertRaises(NotImplementedError):
+            self.run_async('stream_query', ['people.json'])
+
+    def test_load_committee_tree(self):
+        from .committees import get_committee_index
+        self.run_async('load_committee_tree')
+        index = get_committee_index()
+        self.assertEqual(len(index.descendants(1626)), 2 + 2 + 2 * 3)
+        self.assertTrue(index.is_loaded(1589))
+
+    def test_blocking_response_caches_are_used_from_a_thread(self):
+        import asyncio
+        import shutil
+        import tempfile
+        import threading
+        from . import settings
+        from .async_api import AsyncExpaApi, close_async_client
+        from .cache import ResponseCache
+        from .diskstore import DiskStore
+        self.assertFalse(ResponseCache().blocking)
+        path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, path)
+        disk = DiskStore(path)
+        threads = []
+
+        def spy(method):
+            def call(*args, **kwargs):
+                threads.append(threading.current_thread())
+                return method(*args, **kwargs)
+            return call
+        disk.get, disk.set = spy(disk.get), spy(disk.set)
+        cache = ResponseCache(disk=disk)
+        self.assertTrue(cache.blocking)
+
+        async def main():
+            api = AsyncExpaApi(settings.DEFAULT_ACCOUNT, pwd='x', response_cache=cache)
+            try:
+                await api.get_stats(1589, 'ogv', '2017-01-01', '2017-01-31')
+                await api.get_stats(1589, 'ogv', '2017-01-01', '2017-01-31')
+            finally:
+                await close_async_client()
+        asyncio.run(main())
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+
+class TokenRenewalTests(MockServerTestCase):
+
+    def test_a_late_401_keeps_the_token_renewed_by_another_request(self):
+        import time
+        from . import settings
+        from .expaApi import ExpaApi
+        from .benchmarks.mock_server import TOKEN
+        from .tokens import CachedToken, TokenCache
+        cache = TokenCache()
+        api = ExpaApi(settings.DEFAULT_ACCOUNT, pwd='x', token_cache=cache)
+        logins = []
+        login = api._login
+        api._login = lambda: logins.append(True) or login()
+        cache._tokens[api.account] = CachedToken('stale', time.time() + 3600)
+        get = api.transport.get
+
+        class Rejected(object):
+            status_code = 401
+
+            def close(self):
+                pass
+
+        def rejecting_get(url, **kwargs):
+            if 'access_token=stale' in url:
+                # Another request got its 401 first and already renewed the token
+                cache._tokens[api.account] = CachedToken(TOKEN, time.time() + 3600)
+                return Rejected()
+            self.assertIn('access_token=' + TOKEN, url)
+            return get(url, **kwargs)
+        api.transport = type(str('Transport'), (object,), {'get': staticmethod(rejecting_get), 'rate_limiter': None})()
+        self.assertEqual(api.getPerson('1'), self.api().getPerson('1'))
+        self.assertEqual(cache.peek(api.account), TOKEN)
+        self.assertEqual(logins, [])
+
+    def test_async_a_late_401_keeps_the_token_renewed_by_another_request(self):
+        import asyncio
+        import time
+        import httpx
+        from . import settings
+        from .async_api import AsyncExpaApi
+        from .tokens import CachedToken, TokenCache
+        cache = TokenCache()
+        cache._tokens[settings.DEFAULT_ACCOUNT] = CachedToken('stale', time.time() + 3600)
+
+        def handler(request):
+            if request.url.params['access_token'] == 'stale':
+                # Another request got its 401 first and already renewed the token
+                cache._tokens[settings.DEFAULT_ACCOUNT] = CachedToken('fresh', time.time() + 3600)
+                return httpx.Response(401, json={'error': 'invalid access token'})
+            return httpx.Response(200, json={'id': 1, 'token': request.url.params['access_token']})
+
+        async def main():
+            async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+                api = AsyncExpaApi(settings.DEFAULT_ACCOUNT, pwd='x', token_cache=cache, client=client)
+                api._login = lambda: self.fail("The account was logged in again")
+                return await api.getPerson('1')
+        self.assertEqual(asyncio.run(main()), {'id': 1, 'token': 'fresh'})
+        self.assertEqual(cache.peek(settings.DEFAULT_ACCOUNT), 'fresh')
+
+
+class StatsCellTests(SimpleTestCase):
+
+    def analytics(self, applicants=3.0, unique_profiles=2.0):
+        return {
+            'total_applications': {'doc_count': 10, 'applicants': {'value': applicants}},
+            'total_matched': {'doc_count': 4, 'unique_profiles': {'value': unique_profiles}},
+            'total_approvals': {'doc_count': 3},
+            'total_realized': {'doc_count': 2},
+            'total_completed': {'doc_count': 1},
+        }
+
+    def test_cardinalities_may_be_floats(self):
+        from .records import StatsCell
+        cell = StatsCell.from_payload(self.analytics())
+        self.assertEqual(cell.to_dict(), {'applications': 10, 'applicants': 3, 'accepted': 2, 'approved': 3, 'realized': 2, 'completed': 1})
+        self.assertFalse(cell.error)
+
+    def test_errors_read_as_expa_error(self):
+        from .records import StatsCell
+        cell = StatsCell.from_stats({'applications': "EXPA ERROR"})
+        self.assertTrue(cell.error)
+        self.assertEqual(cell['accepted'], StatsCell.ERROR)
+        self.assertEqual(cell.get('unknown', 0), 0)
+        self.assertEqual(StatsCell.from_stats(StatsCell.from_payload(self.analytics()).to_dict()), StatsCell.from_payload(self.analytics()))
+
+
+class RecordTests(SimpleTestCase):
+    payload = {
+        'id': 7, 'status': 'approved', 'created_at': '2017-01-02T00:00:00Z',
+        'person': {'id': 70, 'home_lc': {'id': 158900}},
+        'opportunity': {'id': 700, 'programmes': [{'id': 1}], 'office': 300100},
+    }
+
+    def test_reads_only_the_fields_asked_for(self):
+        from .records import Application
+        record = Application.from_payload(self.payload, ['id', 'status', 'programme_id', 'host_lc_id'])
+        self.assertEqual(record.to_dict(), {'id': 7, 'status': 'approved', 'programme_id': 1, 'host_lc_id': 300100})
+        self.assertIsNone(record.get('person_id'))
+        with self.assertRaises(AttributeError):
+            record.person_id
+        with self.assertRaises(ValueError):
+            Application.from_payload(self.payload, ['unknown'])
+        self.assertEqual(Application.payload_fields(['id', 'home_lc_id']), ['id', {'person': [{'home_lc': ['id']}]}])
+        self.assertEqual(Application.from_payload(self.payload), Application.from_payload(dict(self.payload)))
+
+    def test_shares_a_bounded_number_of_values(self):
+        from . import records
+        from .records import Person
+        self.addCleanup(setattr, records, 'MAX_SHARED', records.MAX_SHARED)
+        records._shared.clear()
+        self.addCleanup(records._shared.clear)
+        records.MAX_SHARED = 2
+        people = [Person.from_payload({'id': i, 'status': ''.join(['open', str(i % 3)]), 'home_lc': {'id': 1}}, ['status', 'home_lc_id']) for i in range(6)]
+        self.assertEqual(len(records._shared), 2)
+        self.assertIs(people[0].status, people[3].status)
+        self.assertEqual(people[2].status, people[5].status)
+
+
+    def test_iter_records_reads_a_listing_as_it_goes(self):
+        from .records import Person, iter_records
+        read = []
+
+        def listing():
+            for i in range(3):
+                read.append(i)
+                yield {'id': i, 'full_name': 'Persona %d' % i, 'contact_info': {'phone': '555-000%d' % i}, 'home_lc': 158900 + i}
+        people = iter_records(listing(), Person, ['id', 'phone', 'home_lc_id'])
+        self.assertEqual(next(people).to_dict(), {'id': 0, 'phone': '555-0000', 'home_lc_id': 158900})
+        self.assertEqual(read, [0])
+        self.assertEqual([person.home_lc_id for person in people], [158901, 158902])
+
+
+class RateLimiterSettingsTests(SimpleTestCase):
+
+    def test_default_budgets_fit_a_wave_of_the_fan_out(self):
+        from . import ratelimit, settings
+        self.addCleanup(setattr, ratelimit, '_default_limiter', ratelimit._default_limiter)
+        ratelimit._default_limiter = None
+        for name, value in (('FANOUT_WORKERS', 32), ('RATE_LIMITS', {'graphql': {'max_in_flight': 4}})):
+            self.addCleanup(setattr, settings, name, getattr(settings, name))
+            setattr(settings, name, value)
+        limiter = ratelimit.get_rate_limiter()
+        self.assertEqual(limiter.budgets['analytics'].burst, 60)
+        self.assertEqual(limiter.budgets['listing'].burst, 32)
+        self.assertEqual(limiter.budgets['listing']._in_flight._initial_value, 32)
+        # Explicit RATE_LIMITS are kept as they are
+        self.assertEqual(limiter.budgets['graphql']._in_flight._initial_value, 4)
+
+
+class TokenCacheTests(SimpleTestCase):
+
+    def test_renews_ahead_of_expiration(self):
+        from . import tokens
+        clock = Clock(self, tokens)
+        cache = tokens.TokenCache(lifetime=3600, refresh_margin=600)
+        self.assertEqual(cache.get_token('a@aiesec.net', lambda: ('first', None)), 'first')
+        self.assertEqual(cache.peek('a@aiesec.net'), 'first')
+        clock.sleep(3000)
+        # Within the margin it is not handed out without trying to renew it, but it is still valid
+        self.assertIsNone(cache.peek('a@aiesec.net'))
+
+        def failing_login():
+            raise IOError("EXPA is down")
+        self.assertEqual(cache.get_token('a@aiesec.net', failing_login), 'first')
+        self.assertEqual(cache.get_token('a@aiesec.net', lambda: ('second', clock.now + 3600)), 'second')
+        self.assertEqual(cache.peek('a@aiesec.net'), 'second')
+        clock.sleep(3600)
+        with self.assertRaises(IOError):
+            cache.get_token('a@aiesec.net', failing_login)
+
+    def test_a_single_caller_logs_in_per_account(self):
+        import threading
+        import time
+        from .tokens import TokenCache
+        cache = TokenCache()
+        logins = []
+
+        def login(account):
+            def login():
+                logins.append(account)
+                time.sleep(0.05)
+                return 'token of ' + account, None
+            return login
+        results = []
+        threads = [threading.Thread(target=lambda account=account: results.append(cache.get_token(account, login(account))))
+                   for account in ['a@aiesec.net'] * 8 + ['b@aiesec.net'] * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(logins), ['a@aiesec.net', 'b@aiesec.net'])
+        self.assertEqual(sorted(results), ['token of a@aiesec.net'] * 8 + ['token of b@aiesec.net'] * 2)
+
+    def test_invalidate_only_discards_the_rejected_token(self):
+        from .tokens import TokenCache
+        cache = TokenCache()
+        cache.get_token('a@aiesec.net', lambda: ('current', None))
+        cache.invalidate('a@aiesec.net', 'rejected')
+        self.assertEqual(cache.peek('a@aiesec.net'), 'current')
+        cache.invalidate('a@aiesec.net', 'current')
+        self.assertIsNone(cache.peek('a@aiesec.net'))
+        self.assertEqual(cache.get_token('a@aiesec.net', lambda: ('new', None)), 'new')
+
+
+class SingleFlightTests(SimpleTestCase):
+
+    def test_concurrent_calls_share_one_execution(self):
+        import threading
+        import time
+        from .singleflight import SingleFlight
+        flight = SingleFlight()
+        release = threading.Event()
+        executions = []
+
+        def call(value):
+            def call():
+                executions.append(value)
+                release.wait()
+                if isinstance(value, Exception):
+                    raise value
+                return value
+            return call
+        for value in ([1], ValueError("Failed")):
+            results = []
+
+            def run():
+                try:
+                    results.append(flight.do('key', call(value)))
+                except ValueError as e:
+                    results.append(e)
+            release.clear()
+            threads = [threading.Thread(target=run) for _ in range(4)]
+            calls = flight.calls
+            for thread in threads:
+                thread.start()
+            while flight.calls < calls + 4:
+                time.sleep(0.001)
+            release.set()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(executions[-1:], [value])
+            self.assertEqual(len(results), 4)
+            for result in results:
+                self.assertIs(result, value)
+        self.assertEqual(flight.stats(), {'calls': 8, 'upstream': 2, 'saved': 6})
+        # Once a call is over, the next one with its key runs again
+        self.assertEqual(flight.do('key', call(2)), 2)
+        self.assertEqual(executions[-1], 2)
+
+    def test_async_calls_share_one_task(self):
+        import asyncio
+        from .singleflight import AsyncSingleFlight, get_async_single_flight
+        flight = AsyncSingleFlight()
+        executions = []
+
+        async def call():
+            executions.append(True)
+            await asyncio.sleep(0.01)
+            return {'id': 1}
+
+        async def main():
+            first = asyncio.ensure_future(flight.do('key', call))
+            others = [flight.do('key', call) for _ in range(2)]
+            await asyncio.sleep(0)
+            # Cancelling one of the callers leaves the call running for the rest
+            first.cancel()
+            results = await asyncio.gather(*others)
+            self.assertTrue(first.cancelled())
+            return results
+        results = asyncio.run(main())
+        self.assertEqual(executions, [True])
+        self.assertIs(results[0], results[1])
+        self.assertEqual(flight.stats(), {'calls': 3, 'upstream': 1, 'saved': 2})
+        self.assertIs(get_async_single_flight(), get_async_single_flight())
+
+
+class GraphQLTests(SimpleTestCase):
+
+    def test_people_query(self):
+        from .graphql import parse_people, people_query, selection
+        self.assertEqual(selection(['id', {'home_lc': ['id', 'name']}]), 'id home_lc { id name }')
+        document = people_query([10, 20], ['id'])
+        self.assertEqual(document['query'], 'query PeopleQuery($p0: ID $p1: ID) { p0: getPerson(id: $p0) { id } p1: getPerson(id: $p1) { id } }')
+        self.assertEqual(document['variables'], {'p0': '10', 'p1': '20'})
+        self.assertEqual(parse_people({'data': {'p1': {'id': '20'}}}, 2), [None, {'id': '20'}])
+        self.assertEqual(parse_people({'data': None, 'errors': [{'message': 'Unauthorized'}]}, 2), [None, None])
+
+    def test_all_people_query(self):
+        from .graphql import all_people_query, errors, parse_all_people
+        document = all_people_query(['id'], page=3, per_page=50, q='ana')
+        self.assertIn('allPeople(page: $page, per_page: $perPage, q: $q, filters: $filters, sort: $sort) { data { id } paging { total_pages current_page total_items } }', document['query'])
+        self.assertEqual(document['variables'], {'page': 3, 'perPage': 50, 'filters': {}, 'q': 'ana', 'sort': '-created_at'})
+        paging = {'total_pages': 1, 'current_page': 1, 'total_items': 1}
+        self.assertEqual(parse_all_people({'data': {'allPeople': {'data': [{'id': 1}], 'paging': paging}}}), ([{'id': 1}], paging))
+        self.assertEqual(errors({'data': {}, 'errors': [{'message': 'Not found'}, {}]}), ['Not found', ''])
+        self.assertEqual(errors({'data': {}}), [])
+
+
+class InstrumentationTests(SimpleTestCase):
+
+    def test_redact(self):
+        from .instrumentation import redact
+        self.assertEqual(redact('https://gis-api.aiesec.org/v2/people.json?access_token=abc123&page=2'),
+                         'https://gis-api.aiesec.org/v2/people.json?access_token=[REDACTED]&page=2')
+        self.assertEqual(redact('user%5Bemail%5D=a%40aiesec.net&user%5Bpassword%5D=secret&authenticity_token=xyz'),
+                         'user%5Bemail%5D=a%40aiesec.net&user%5Bpassword%5D=[REDACTED]&authenticity_token=[REDACTED]')
+        self.assertEqual(redact('https://gis-api.aiesec.org/v2/committees/1626.json'), 'https://gis-api.aiesec.org/v2/committees/1626.json')
+
+    def test_route_template(self):
+        from .instrumentation import route_template
+        self.assertEqual(route_template('https://gis-api.aiesec.org/v2/people/123.json?access_token=abc'), '/v2/people/{id}.json')
+        self.assertEqual(route_template('https://gis-api.aiesec.org/v2/committees/1626/suboffices'), '/v2/committees/{id}/suboffices')
+        self.assertEqual(route_template('https://gis-api.aiesec.org/v2/applications/analyze.json'), '/v2/applications/analyze.json')
+        self.assertEqual(route_template('https://auth.aiesec.org'), '/')
+
+
+class PerformanceSeriesTests(SimpleTestCase):
+
+    def setUp(self):
+        try:
+            import numpy
+        except ImportError:
+            self.skipTest("NumPy is not installed")
+
+    def series(self):
+        from .performance import PerformanceSeries
+        from .records import StatsCell
+        periods = [('2017-01-01', '2017-01-31'), ('2017-02-01', '2017-02-28'), ('2017-03-01', '2017-03-31')]
+        stats = {}
+        for office in (1, 2):
+            for month, period in enumerate(periods):
+                stats[(office, 'ogv') + period] = StatsCell([office * 10 + month] * len(StatsCell.METRICS))
+        # The query of the last month of office 2 failed
+        stats[(2, 'ogv') + periods[2]] = {'applications': StatsCell.ERROR}
+        return PerformanceSeries.from_stats(stats, [1, 2], ['ogv'], periods, metrics=['applications', 'approved'])
+
+    def test_from_stats(self):
+        series = self.series()
+        self.assertEqual(series.values.shape, (2, 1, 3, 2))
+        self.assertEqual(series.tolist(1, 'ogv', 'approved'), [10, 11, 12])
+        self.assertEqual(series.tolist(2, 'ogv', 'approved', missing='-'), [20, 21, '-'])
+        self.assertEqual(series.get(office=2, program='ogv', metric='applications').tolist(), [20, 21, 0])
+        self.assertEqual(series.complete_periods(), 2)
+        self.assertEqual(series.complete_periods(office=1), 3)
+        with self.assertRaises(KeyError):
+            series.get(office=3)
+
+    def test_operations(self):
+        series = self.series()
+        total = series.total()
+        self.assertEqual(total.periods, [('2017-01-01', '2017-03-31')])
+        self.assertEqual(total.tolist(1, 'ogv', 'applications'), [33])
+        self.assertEqual(total.tolist(2, 'ogv', 'applications'), [None])
+        self.assertEqual(series.cumulative().tolist(1, 'ogv', 'applications'), [10, 21, 33])
+        self.assertEqual(series.deltas().tolist(1, 'ogv', 'applications'), [10, 1, 1])
+        self.assertEqual(series.deltas().tolist(2, 'ogv', 'applications'), [20, 1, None])
+        aggregate = series.aggregate(office=1589)
+        self.assertEqual(aggregate.offices, [1589])
+        self.assertEqual(aggregate.tolist(1589, 'ogv', 'applications'), [30, 32, None])
+        self.assertEqual(series.head(2).aggregate(office=1589).tolist(1589, 'ogv', 'applications'), [30, 32])
+
+
+class PaginatorTests(SimpleTestCase):
+
+    class Api(object):
+        """
+        Answers a listing of 45 records, 10 per page, with the first pages taking the longest, so they are the last to finish
+        """
+        def __init__(self, failing_page=None):
+            self.failing_page = failing_page
+
+        def make_query(self, routes, query_params):
+            import time
+            from .expaApi import APIUnavailableException
+            page, per_page = query_params['page'], query_params['per_page']
+            time.sleep(0.002 * (5 - page))
+            if page == self.failing_page:
+                raise APIUnavailableException(None, "The request has failed with error code 503")
+            ids = range((page - 1) * per_page, min(page * per_page, 45))
+            return {'data': [{'id': i, 'status': 'open'} for i in ids], 'paging': {'total_items': 45, 'total_pages': 5}}
+
+    def test_fetch_all_keeps_the_order_of_the_pages(self):
+        from .pagination import Paginator
+        paginator = Paginator(self.Api(), ['people.json'], per_page=10, fields=['id'])
+        self.assertEqual(paginator.fetch_all(max_workers=4), [{'id': i} for i in range(45)])
+        self.assertEqual(paginator.total_items, 45)
+
+    def test_fetch_all_raises_the_error_of_a_page(self):
+        from .expaApi import APIUnavailableException
+        from .pagination import Paginator
+        with self.assertRaises(APIUnavailableException):
+            Paginator(self.Api(failing_page=3), ['people.json'], per_page=10).fetch_all(max_workers=4)
+
+
+class AsyncViewsTests(MockServerTestCase):
+
+    def setUp(self):
+        import time
+        from . import settings
+        from .benchmarks.mock_server import TOKEN
+        from .tokens import CachedToken, get_token_cache
+        super(AsyncViewsTests, self).setUp()
+        # The async views use the default account, whose password would be read from the database
+        cache = get_token_cache()
+        cache._tokens[settings.DEFAULT_ACCOUNT] = CachedToken(TOKEN, time.time() + 3600)
+        self.addCleanup(cache.invalidate, settings.DEFAULT_ACCOUNT)
+
+    def test_opportunity(self):
+        response = self.client.get('/async/opportunity/5/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content.decode('utf-8')), self.api().getOpportunity(5))
+
+    def test_token(self):
+        from .benchmarks.mock_server import TOKEN
+        self.assertEqual(self.client.get('/async/token/').content.decode('utf-8'), TOKEN)
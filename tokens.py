@@ -0,0 +1,194 @@
+# coding=utf-8
+"""
+Module containing the access token cache shared by all ExpaApi instances
+"""
+from __future__ import unicode_literals
+import threading
+import time
+from datetime import timedelta
+
+# EXPA access tokens expire two hours after being obtained
+TOKEN_LIFETIME = 2 * 60 * 60
+# A token is renewed this many seconds before it expires, so no request
+# ever gets to use an expired one
+REFRESH_MARGIN = 10 * 60
+
+
+class CachedToken(object):
+    """
+    An access token together with the moment, as a unix timestamp, in which it expires
+    """
+    def __init__(self, token, expires_at):
+        self.token = token
+        self.expires_at = expires_at
+
+    def is_valid(self, now=None):
+        if now is None:
+            now = time.time()
+        return now < self.expires_at
+
+    def needs_refresh(self, margin, now=None):
+        if now is None:
+            now = time.time()
+        return now >= self.expires_at - margin
+
+
+class DjangoCacheTokenStore(object):
+    """
+    Keeps the tokens inside one of the caches configured in the Django settings, so
+    they can be shared between processes and survive restarts
+    """
+    key_prefix = 'django_expa:token:'
+
+    def __init__(self, alias='default'):
+        self.alias = alias
+
+    def _cache(self):
+        from django.core.cache import caches
+        return caches[self.alias]
+
+    def get(self, account):
+        data = self._cache().get(self.key_prefix + account)
+        if data is None:
+            return None
+        return CachedToken(data['token'], data['expires_at'])
+
+    def set(self, account, cached):
+        timeout = max(int(cached.expires_at - time.time()), 1)
+        self._cache().set(self.key_prefix + account, {'token': cached.token, 'expires_at': cached.expires_at}, timeout)
+
+    def delete(self, account):
+        self._cache().delete(self.key_prefix + account)
+
+
+class DatabaseTokenStore(object):
+    """
+    Keeps the tokens in the AccessToken table, next to the LoginData of every account
+    """
+    def get(self, account):
+        from django.utils import timezone
+        from .models import AccessToken
+        try:
+            row = AccessToken.objects.get(account=account)
+        except AccessToken.DoesNotExist:
+            return None
+        remaining = (row.expires_at - timezone.now()).total_seconds()
+        return CachedToken(row.token, time.time() + remaining)
+
+    def set(self, account, cached):
+        from django.utils import timezone
+        from .models import AccessToken
+        expires_at = timezone.now() + timedelta(seconds=cached.expires_at - time.time())
+        AccessToken.objects.update_or_create(account=account, defaults={'token': cached.token, 'expires_at': expires_at})
+
+    def delete(self, account):
+        from .models import AccessToken
+        AccessToken.objects.filter(account=account).delete()
+
+
+class TokenCache(object):
+    """
+    Keeps one access token per account in memory, and optionally in a persistent store.
+    Tokens are renewed ahead of their expiration by a single caller per account; the other
+    callers keep using the current token meanwhile, and only wait if it has already expired.
+    """
+    def __init__(self, store=None, lifetime=TOKEN_LIFETIME, refresh_margin=REFRESH_MARGIN):
+        self.store = store
+        self.lifetime = lifetime
+        self.refresh_margin = refresh_margin
+        self._tokens = {}
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock_for(self, account):
+        with self._locks_lock:
+            if account not in self._locks:
+                self._locks[account] = threading.Lock()
+            return self._locks[account]
+
+    def _lookup(self, account):
+        cached = self._tokens.get(account)
+        if cached is None and self.store is not None:
+            cached = self.store.get(account)
+            if cached is not None:
+                self._tokens[account] = cached
+        return cached
+
+    def _refresh(self, account, login):
+        token, expires_at = login()
+        if expires_at is None:
+            expires_at = time.time() + self.lifetime
+        cached = CachedToken(token, expires_at)
+        self._tokens[account] = cached
+        if self.store is not None:
+            self.store.set(account, cached)
+        return cached
+
+    def peek(self, account):
+        """
+        Returns the token of an account if it is in memory and does not need to be renewed yet, or None otherwise. It never blocks.
+        """
+        cached = self._tokens.get(account)
+        if cached is not None and not cached.needs_refresh(self.refresh_margin):
+            return cached.token
+        return None
+
+    def get_token(self, account, login):
+        """
+        Returns a valid access token for the given account.
+        login: A callable which authenticates against EXPA and returns a (token, expires_at) tuple. expires_at may be None, in which case the default lifetime is assumed. It is only called when there is no usable token for the account.
+        """
+        cached = self._lookup(account)
+        now = time.time()
+        if cached is not None and not cached.needs_refresh(self.refresh_margin, now):
+            return cached.token
+        lock = self._lock_for(account)
+        if cached is not None and cached.is_valid(now):
+            # The token is about to expire; if someone else is already renewing it, keep using the current one
+            if not lock.acquire(False):
+                return cached.token
+            try:
+                return self._refresh(account, login).token
+            except Exception:
+                return cached.token
+            finally:
+                lock.release()
+        with lock:
+            cached = self._lookup(account)
+            if cached is not None and cached.is_valid():
+                return cached.token
+            return self._refresh(account, login).token
+
+    def invalidate(self, account, token=None):
+        """
+        Discards the cached token of an account, i.e. because the API rejected it. If a token is given, it is only discarded if it is still the cached one.
+        """
+        cached = self._tokens.get(account)
+        if token is not None and cached is not None and cached.token != token:
+            return
+        self._tokens.pop(account, None)
+        if self.store is not None:
+            self.store.delete(account)
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_token_cache():
+    """
+    Returns the process-wide token cache, built from the TOKEN_CACHE_BACKEND setting the first time it is used
+    """
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            from . import settings
+            backend = getattr(settings, 'TOKEN_CACHE_BACKEND', 'memory')
+            if backend == 'cache':
+                store = DjangoCacheTokenStore(getattr(settings, 'TOKEN_CACHE_ALIAS', 'default'))
+            elif backend == 'database':
+                store = DatabaseTokenStore()
+            else:
+                store = None
+            _default_cache = TokenCache(store)
+        return _default_cache
@@ -0,0 +1,204 @@
+# coding=utf-8
+"""
+Module containing the pooled HTTP transport used by ExpaApi for every request to EXPA
+"""
+from __future__ import unicode_literals
+import atexit
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connection import HTTPConnection, HTTPSConnection
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from requests.packages.urllib3.exceptions import InsecureRequestWarning
+requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
+
+# Seconds each thread has spent opening connections during its current request
+_connect_times = threading.local()
+
+_in_flight = None
+_in_flight_lock = threading.Lock()
+_transport = None
+_transport_lock = threading.Lock()
+
+
+def get_in_flight_limit():
+    """
+    Returns the semaphore shared by the whole process which keeps at most MAX_IN_FLIGHT_REQUESTS requests waiting for an answer at the same time, whatever transport sends them. None if there is no limit
+    """
+    global _in_flight
+    with _in_flight_lock:
+        if _in_flight is None:
+            from . import settings
+            limit = getattr(settings, 'MAX_IN_FLIGHT_REQUESTS', 10)
+            _in_flight = threading.BoundedSemaphore(limit) if limit else False
+        return _in_flight or None
+
+
+class TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        start = time.time()
+        try:
+            return super(TimedHTTPConnection, self).connect()
+        finally:
+            _connect_times.seconds = getattr(_connect_times, 'seconds', 0.0) + time.time() - start
+
+
+class TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        start = time.time()
+        try:
+            return super(TimedHTTPSConnection, self).connect()
+        finally:
+            _connect_times.seconds = getattr(_connect_times, 'seconds', 0.0) + time.time() - start
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+
+class Transport(object):
+    """
+    Wraps a requests Session whose connections are kept alive and reused between
+    requests, instead of opening a new TCP+TLS connection for every call.
+    A single Transport can be shared by several ExpaApi instances.
+    Every response it returns has a 'timings' dict with the seconds spent opening a connection
+    for it (connect, including the DNS lookup and the TLS handshake), until its headers arrived (ttfb)
+    and until its body was read (total).
+
+    pool_connections: How many hosts keep a pool of connections at the same time
+    pool_maxsize: How many connections are kept open to each host
+    pool_block: Whether a request should wait for a free connection when all of a host's connections are in use, instead of opening a throwaway one
+    keep_alive: Whether connections are kept open after a request
+    gzip: Whether responses are requested compressed
+    max_in_flight: How many requests can be waiting for an answer at the same time, no matter how many threads use the transport. None means no limit
+    rate_limiter: The ratelimit.RateLimiter which every request must go through before being sent. None means no limit
+    in_flight: A semaphore shared with other transports, such as get_in_flight_limit(), which limits their requests in flight all together, instead of max_in_flight
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False, keep_alive=True, gzip=True, max_in_flight=None, rate_limiter=None, in_flight=None):
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block, max_retries=0)
+        self.adapter.poolmanager.pool_classes_by_scheme = {'http': TimedHTTPConnectionPool, 'https': TimedHTTPSConnectionPool}
+        self.headers = {}
+        if gzip:
+            self.headers['Accept-Encoding'] = 'gzip, deflate'
+        if not keep_alive:
+            self.headers['Connection'] = 'close'
+        self.session = self.new_session()
+        if in_flight is None and max_in_flight:
+            in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._in_flight = in_flight
+        self.rate_limiter = rate_limiter
+        # Counters of the pools that urllib3 has already discarded
+        self._closed_connections = 0
+        self._closed_requests = 0
+        pools = self.adapter.poolmanager.pools
+        dispose = pools.dispose_func
+
+        def dispose_pool(pool):
+            self._closed_connections += pool.num_connections
+            self._closed_requests += pool.num_requests
+            if dispose is not None:
+                dispose(pool)
+        pools.dispose_func = dispose_pool
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Builds a transport configured with the HTTP_* values of the settings file, which goes through the rate limiter and the limit of requests in flight shared by the whole process
+        """
+        from . import settings
+        from .ratelimit import get_rate_limiter
+        return cls(
+            pool_connections=getattr(settings, 'HTTP_POOL_CONNECTIONS', 10),
+            pool_maxsize=getattr(settings, 'HTTP_POOL_MAXSIZE', 10),
+            pool_block=getattr(settings, 'HTTP_POOL_BLOCK', False),
+            keep_alive=getattr(settings, 'HTTP_KEEP_ALIVE', True),
+            gzip=getattr(settings, 'HTTP_GZIP', True),
+            in_flight=get_in_flight_limit(),
+            rate_limiter=get_rate_limiter(),
+        )
+
+    def new_session(self):
+        """
+        Returns a new session with its own cookies, but which shares this transport's connection pool
+        """
+        session = requests.Session()
+        session.mount('https://', self.adapter)
+        session.mount('http://', self.adapter)
+        session.headers.update(self.headers)
+        return session
+
+    def request(self, method, url, session=None, **kwargs):
+        """
+        Sends a request through the transport's session or, if given, through another session returned by new_session
+        """
+        if self.rate_limiter is None:
+            return self._send(method, url, session, **kwargs)
+        with self.rate_limiter.budget_for(url):
+            return self._send(method, url, session, **kwargs)
+
+    def _send(self, method, url, session, **kwargs):
+        if self._in_flight is None:
+            return self._timed(method, url, session, **kwargs)
+        with self._in_flight:
+            return self._timed(method, url, session, **kwargs)
+
+    def _timed(self, method, url, session, **kwargs):
+        _connect_times.seconds = 0.0
+        start = time.time()
+        response = (session or self.session).request(method, url, **kwargs)
+        response.timings = {
+            'connect': _connect_times.seconds,
+            'ttfb': response.elapsed.total_seconds(),
+            'total': time.time() - start,
+        }
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('PATCH', url, **kwargs)
+
+    def stats(self):
+        """
+        Returns how many HTTP requests have been sent through this transport, how many connections were opened for them and how many requests reused an already open connection
+        """
+        connections = self._closed_connections
+        sent = self._closed_requests
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            try:
+                pool = pools[key]
+            except KeyError:
+                continue
+            connections += pool.num_connections
+            sent += pool.num_requests
+        return {
+            'requests': sent,
+            'connections_opened': connections,
+            'connections_reused': max(sent - connections, 0),
+        }
+
+    def close(self):
+        self.session.close()
+
+
+def get_transport():
+    """
+    Returns the Transport shared by the whole process, built from the settings file the first time it is needed, so every
+    ExpaApi reuses the same open connections, even when a new instance is created for every page view. It is closed when the process exits
+    """
+    global _transport
+    with _transport_lock:
+        if _transport is None:
+            _transport = Transport.from_settings()
+            atexit.register(_transport.close)
+        return _transport
@@ -1,4 +1,5 @@
 # coding=utf-8
+import sys
 from django.conf.urls import url, include
 from django.conf import settings
 from django.conf.urls.static import static
@@ -18,3 +19,18 @@ urlpatterns = [
     url(r'^opportunity/(?P<opID>\d+)/managers$', views.GetOPManagersDataView.as_view(), name='managersOportunidad'),
 
     ]
+
+# Versiones asíncronas de las vistas anteriores, para despliegues con ASGI. Requieren Python 3 y httpx, que sólo se importa al servir la primera de ellas
+async_views = None
+if sys.version_info[0] >= 3:
+    from importlib.util import find_spec
+    if find_spec('httpx') is not None:
+        from . import async_views
+if async_views is not None:
+    urlpatterns += [
+        url(r'^async/token/$', async_views.GetTokenView.as_view(), name='async_get_token'),
+        url(r'^async/ebs/(?P<mcID>\d+)/$', async_views.GetCountryEBs.as_view(), name='async_country_ebs'),
+        url(r'^async/performance/2015$', async_views.GetYearlyPerformance.as_view(), name='async_yearly_performance'),
+        url(r'^async/opportunity/(?P<opID>\d+)/$', async_views.GetOpportunityView.as_view(), name='async_get_opportunity'),
+        url(r'^async/opportunity/(?P<opID>\d+)/managers$', async_views.GetOPManagersDataView.as_view(), name='async_managersOportunidad'),
+    ]
@@ -1,4 +1,5 @@
 # coding=utf-8
+import json
 from django.http import HttpResponseRedirect, HttpResponse
 from django.shortcuts import render
 from django.views.generic.base import TemplateView
@@ -10,7 +11,7 @@ def get_token(request):
 
 def get_opportunity(request, opID):
     api = ExpaApi()
-    return HttpResponse(api.getOpportunity(opID))
+    return HttpResponse(json.dumps(api.getOpportunity(opID)), content_type='application/json')
 
 class GetOPManagersDataView(TemplateView):
     """Class based view que permite ver los datos de contacto de todos los managers de una oportunidad cuya ID entra como parámetro dentro de la URL"""